@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""Benchmark of the read-only gitlib queries under each query policy.
+
+Times each query in a repository, by default this checkout, once with the user's own
+git settings and once with the tuned `QueryPolicy` gitlib uses by default:
+
+    $ python benchmarks/queries.py [REPO_DIR]
+
+Timings are best-of-N, and the repository is left as it was found. Exits with a
+non-zero return code when the tuned policy makes the queries slower in total by more
+than `SLOWDOWN_BUDGET`, so it can gate a build.
+"""
+
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from githelpers import gitlib  # noqa: E402
+from githelpers.runcmd import QueryPolicy  # noqa: E402
+
+# --- fraction by which the tuned policy may exceed the user's settings in total ---
+SLOWDOWN_BUDGET = 0.25
+
+REPEAT = 20
+
+QUERIES: Dict[str, Callable[[], object]] = {
+    "branch_names": gitlib.branch_names,
+    "current_branch_name": gitlib.current_branch_name,
+    "head": gitlib.head,
+    "is_clean": gitlib.is_clean,
+    "ref_commit_hashes": gitlib.ref_commit_hashes,
+}
+
+
+def main(argv: List[str] = None) -> int:
+    """Run the query benchmark, returning 0 when within budget, 1 otherwise."""
+    argv = sys.argv if argv is None else argv
+    repo_dir = argv[1] if len(argv) > 1 else REPO_ROOT
+
+    totals = {"user": 0.0, "tuned": 0.0}
+    print("%-22s %10s %10s" % ("query", "user (ms)", "tuned (ms)"))
+    with gitlib.Repo(repo_dir):
+        for name, query in QUERIES.items():
+            user_ms = _best_ms(query, QueryPolicy.user())
+            tuned_ms = _best_ms(query, QueryPolicy.tuned())
+            totals["user"] += user_ms
+            totals["tuned"] += tuned_ms
+            print("%-22s %10.2f %10.2f" % (name, user_ms, tuned_ms))
+    print("%-22s %10.2f %10.2f" % ("total", totals["user"], totals["tuned"]))
+
+    if totals["tuned"] > totals["user"] * (1 + SLOWDOWN_BUDGET):
+        print(
+            "REGRESSION: tuned query policy is slower than the user's settings",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+def _best_ms(query: Callable[[], object], policy: QueryPolicy) -> float:
+    """Return best-of-REPEAT wall time of `query` under `policy` in milliseconds."""
+    best = float("inf")
+    with policy:
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            query()
+            best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    sys.exit(main())
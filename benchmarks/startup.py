@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""Startup-latency benchmark for the console-script entry points.
+
+Imports each entry module in a fresh interpreter under `python -X importtime` and
+checks the result against a startup budget, then times `git lawg -1` (the `gh` alias)
+end-to-end in the current repository. Exits with a non-zero return code when any
+budget is exceeded so it can gate a build:
+
+    $ python benchmarks/startup.py
+
+Timings are best-of-N to keep scheduler noise out of the comparison.
+"""
+
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+ENTRY_MODULES = [
+    "githelpers.scripts.cli",
+    "githelpers.scripts.drop",
+    "githelpers.scripts.fix",
+    "githelpers.scripts.lawg",
+    "githelpers.scripts.next",
+    "githelpers.scripts.prev",
+    "githelpers.scripts.restack",
+]
+
+# --- modules that must never be imported while an entry point starts up ---
+FORBIDDEN_MODULES = {"pkg_resources", "typing_extensions"}
+
+# --- cumulative import time allowed for any one entry module, in microseconds ---
+IMPORT_BUDGET_US = 35000
+
+# --- modules (beyond bare interpreter startup) any one entry module may pull in ---
+MODULE_BUDGET = 48
+
+# --- wall-clock budget for `git lawg -1`, interpreter startup included ---
+GH_LATENCY_BUDGET_MS = 120
+
+REPEAT = 5
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    """Run the startup benchmark, returning 0 when all budgets are met, 1 otherwise."""
+    failures: List[str] = []
+
+    print("%-28s %12s %8s" % ("entry module", "import (us)", "modules"))
+    for module_name in ENTRY_MODULES:
+        import_us, imported = _import_profile(module_name)
+        print("%-28s %12d %8d" % (module_name, import_us, len(imported)))
+        for forbidden in sorted(FORBIDDEN_MODULES & set(imported)):
+            failures.append("%s imports %s" % (module_name, forbidden))
+        if import_us > IMPORT_BUDGET_US:
+            failures.append(
+                "%s takes %dus to import, budget is %dus"
+                % (module_name, import_us, IMPORT_BUDGET_US)
+            )
+        if len(imported) > MODULE_BUDGET:
+            failures.append(
+                "%s imports %d modules, budget is %d"
+                % (module_name, len(imported), MODULE_BUDGET)
+            )
+
+    gh_ms = _gh_latency_ms()
+    print("%-28s %12.1f ms" % ("git lawg -1", gh_ms))
+    if gh_ms > GH_LATENCY_BUDGET_MS:
+        failures.append(
+            "`git lawg -1` takes %.1fms, budget is %dms" % (gh_ms, GH_LATENCY_BUDGET_MS)
+        )
+
+    for failure in failures:
+        print("REGRESSION: %s" % failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+def _env() -> Dict[str, str]:
+    """Return environment for child interpreters, importing from this checkout."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [REPO_ROOT] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+    return env
+
+
+def _import_profile(module_name: str) -> Tuple[int, Dict[str, int]]:
+    """Return (cumulative_us, {module: cumulative_us}) for importing `module_name`.
+
+    Only modules imported on top of bare interpreter startup are included, so `site`
+    and friends do not count against the budget. The best of REPEAT runs is reported.
+    """
+    baseline = set(_importtime(["-c", "pass"]))
+    best: Dict[str, int] = {}
+    for _ in range(REPEAT):
+        imported = {
+            name: us
+            for name, us in _importtime(["-c", "import %s" % module_name]).items()
+            if name not in baseline
+        }
+        if not best or imported[module_name] < best[module_name]:
+            best = imported
+    return best[module_name], best
+
+
+def _importtime(args: List[str]) -> Dict[str, int]:
+    """Return {module_name: cumulative_us} parsed from `python -X importtime` output."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        env=_env(),
+        check=True,
+    )
+    imported: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        imported[name.strip()] = int(cumulative)
+    return imported
+
+
+def _gh_latency_ms() -> float:
+    """Return best-of-REPEAT wall time of `git lawg -1` in milliseconds."""
+    code = (
+        "import sys; from githelpers.scripts.lawg import main; "
+        "sys.argv = ['git-lawg', '-1']; sys.exit(main())"
+    )
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            stdout=subprocess.DEVNULL,
+            env=_env(),
+            cwd=REPO_ROOT,
+            check=True,
+        )
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,38 @@ Feature: Drop a commit from revision history
       And the current branch is 'fixit'
 
 
+  Scenario: Drop a commit shared by several branches
+    Given the working directory is a Git repo
+      And the current branch is 'fixit'
+      And rev 36c9fec is reachable
+     When I issue the command `drop --all 36c9fec`
+     Then the return code is 0
+      And rev 36c9fec is not reachable
+      And rev c4b6209 is not reachable
+      And the current branch is 'fixit'
+
+
+  Scenario: Error exit on a shared commit's branch checked out in another worktree
+    Given the working directory is a Git repo
+      And the current branch is 'fixit'
+      And 'spike' is checked out in another worktree
+     When I issue the command `drop --all 36c9fec`
+     Then the return code is 10
+      And stderr output starts with 'Branch spike is checked out in worktree'
+      And rev 36c9fec is still reachable
+
+
+  Scenario: Drop a commit below a merge the rebase flattens
+    Given the working directory is a Git repo
+      And the current branch is 'spike'
+      And a commit and a merge of a change beside it are added
+     When I issue the command `drop HEAD^`
+     Then the return code is 0
+      And the current branch is 'spike'
+      And shared.txt reads 'a b C'
+      And the working tree is clean
+
+
   Scenario: Error exit when not in Git repository
     Given the working directory is not in a Git repository
      When I issue the command `drop c4b6209`
@@ -55,3 +87,22 @@ Feature: Drop a commit from revision history
      When I issue the command `drop f67ea7e`
      Then the return code is 7
       And stderr output starts with 'Commit f67ea7e has more than one parent'
+
+
+  Scenario: Error exit when a later commit conflicts without the commit
+    Given the working directory is a Git repo
+      And the current branch is 'spike'
+      And a commit changing barbaz.txt is added
+     When I issue the command `drop b7bcd32`
+     Then the return code is 9
+      And stderr output starts with 'Commit '
+      And rev b7bcd32 is still reachable
+      And the working tree is clean
+
+
+  Scenario: Error exit on commit merged in from another branch
+    Given the working directory is a Git repo
+     When I issue the command `drop --all d22201e`
+     Then the return code is 8
+      And stderr output starts with 'Commit f67ea7e merges in commit d22201e'
+      And rev d22201e is still reachable
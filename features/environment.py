@@ -1,14 +1,47 @@
 # encoding: utf-8
 
-"""Setup and teardown logic for scenarios."""
+"""Setup and teardown logic for scenarios.
+
+Each template repository (a zip in `steps/test_files/`) is extracted once per run into
+a snapshot directory, and each scenario gets its own copy of that snapshot. A copy is
+made with `cp --reflink=always` where the filesystem supports copy-on-write, and
+otherwise by hardlinking the object store and copying the rest. Git never modifies an
+object file in place, so scenarios can share those links safely.
+
+The snapshot directory is `$GITHELPERS_SNAPSHOT_DIR` when set, as it is by
+`features/parallel.py`, so behave processes running in parallel extract each template
+only once between them. Otherwise it is a temp directory removed after the run.
+"""
 
 import os
+import shutil
+import subprocess
 import tempfile
 
 from zipfile import ZipFile
 
 import py
 
+SNAPSHOT_DIR_ENV = "GITHELPERS_SNAPSHOT_DIR"
+
+# -- whether `cp --reflink=always` works here, |None| until first tried --
+_reflink_works = None
+
+
+def before_all(context):
+    """Locate the snapshot directory, creating a temp one when none is provided."""
+    snapshot_dir = os.environ.get(SNAPSHOT_DIR_ENV)
+    context.owns_snapshot_dir = snapshot_dir is None
+    if snapshot_dir is None:
+        snapshot_dir = tempfile.mkdtemp(prefix="githelpers-snapshots-")
+    context.snapshot_dir = py.path.local(snapshot_dir)
+
+
+def after_all(context):
+    """Remove the snapshot directory when this process created it."""
+    if context.owns_snapshot_dir:
+        context.snapshot_dir.remove(rec=1)
+
 
 def before_scenario(context, scenario):
     """Initialize fresh copy of the test repository in temp directory.
@@ -17,16 +50,15 @@ def before_scenario(context, scenario):
     working directory in `context.original_working_dir` so it can be restored after the
     feature is run.
     """
-    test_repo_dir = py.path.local(tempfile.mkdtemp())
+    test_repo_dir = py.path.local(tempfile.mkdtemp()).join("repo")
     empty_dir = py.path.local(tempfile.mkdtemp())
 
     if "linear-repo" in scenario.tags:
-        repo_zip = _test_file("linear-repo.zip")
+        template = "linear-repo"
     else:
-        repo_zip = _test_file("test-repo.zip")
+        template = "test-repo"
 
-    zip_file = ZipFile(repo_zip)
-    zip_file.extractall(str(test_repo_dir))
+    _restore(_snapshot(context.snapshot_dir, template), test_repo_dir)
 
     context.original_working_dir = test_repo_dir.chdir()
     context.repo_dir, context.empty_dir = test_repo_dir, empty_dir
@@ -35,10 +67,55 @@ def before_scenario(context, scenario):
 def after_scenario(context, scenario):
     """Restore original working directory and remove test-repo temp-directory."""
     context.original_working_dir.chdir()
-    context.repo_dir.remove(rec=1)
+    context.repo_dir.dirpath().remove(rec=1)
     context.empty_dir.remove(rec=1)
 
 
+def _copy_with_linked_objects(src, dst):
+    """Copy repository directory `src` to `dst`, hardlinking files of `.git/objects`."""
+    objects_dir = os.path.join(src, ".git", "objects")
+
+    def copy(src_path, dst_path):
+        if src_path.startswith(objects_dir + os.sep):
+            return os.link(src_path, dst_path)
+        return shutil.copy2(src_path, dst_path)
+
+    shutil.copytree(src, dst, symlinks=True, copy_function=copy)
+
+
+def _restore(snapshot_dir, repo_dir):
+    """Make `repo_dir` a private copy of the repository at `snapshot_dir`."""
+    global _reflink_works
+
+    src, dst = str(snapshot_dir), str(repo_dir)
+    if _reflink_works is not False:
+        cmd = ["cp", "-a", "--reflink=always", src, dst]
+        result = subprocess.run(cmd, stderr=subprocess.DEVNULL)
+        _reflink_works = result.returncode == 0
+        if _reflink_works:
+            return
+        shutil.rmtree(dst, ignore_errors=True)
+    _copy_with_linked_objects(src, dst)
+
+
+def _snapshot(snapshot_dir, template):
+    """Return path of the extracted `template` repo, extracting it on first use.
+
+    Extraction is to a private directory renamed into place, so concurrent behave
+    processes sharing `snapshot_dir` never see a partial snapshot.
+    """
+    path = snapshot_dir.join(template)
+    if not path.check(dir=1):
+        staging_dir = py.path.local(tempfile.mkdtemp(dir=str(snapshot_dir)))
+        ZipFile(_test_file("%s.zip" % template)).extractall(str(staging_dir))
+        try:
+            staging_dir.rename(path)
+        except py.error.Error:
+            # --- another process got there first, its snapshot is as good as ours ---
+            staging_dir.remove(rec=1)
+    return path
+
+
 def _test_file(filename):
     """Return str absolute path to *filename* in acceptance test_files directory."""
     thisdir = os.path.split(__file__)[0]
@@ -12,6 +12,36 @@ Feature: Reset fixit branch to commit ref
       And HEAD is 28f1215
 
 
+  Scenario: Keep fixit in a worktree of its own
+    Given the working directory is a Git repo
+      And the current branch is 'spike'
+     When I issue the command `fix --worktree 28f1215`
+     Then the return code is 0
+      And the current branch is 'spike'
+      And HEAD is b7bcd32
+      And 'fixit' is at 28f1215 in its own worktree
+
+
+  Scenario: Move fixit within its own worktree
+    Given the working directory is a Git repo
+      And the current branch is 'spike'
+      And 'fixit' is checked out in its own worktree
+     When I issue the command `fix --worktree 28f1215`
+     Then the return code is 0
+      And HEAD is b7bcd32
+      And 'fixit' is at 28f1215 in its own worktree
+
+
+  Scenario: Move fixit in its own worktree to a commit relative to HEAD
+    Given the working directory is a Git repo
+      And the current branch is 'spike'
+      And 'fixit' is checked out in its own worktree
+     When I issue the command `fix --worktree HEAD~1`
+     Then the return code is 0
+      And HEAD is b7bcd32
+      And 'fixit' is at f67ea7e in its own worktree
+
+
   @linear-repo
   Scenario: Checkout new fixit at specified commit
     Given the working directory is a Git repo
@@ -12,6 +12,29 @@ Feature: Move current branch "upward" to "next" (child) commit
       And HEAD is 36c9fec
 
 
+  Scenario: Move fixit up one commit in its own worktree
+    Given the working directory is a Git repo
+      And the current branch is 'spike'
+      And 'fixit' is checked out in its own worktree
+     When I issue the command `next`
+     Then the return code is 0
+      And the current branch is 'spike'
+      And HEAD is b7bcd32
+      And 'fixit' is at 36c9fec in its own worktree
+
+
+  Scenario: Move the current branch in a worktree fixit was not added beside
+    Given the working directory is a Git repo
+      And the current branch is 'spike'
+      And 'fixit' is checked out in its own worktree
+      And the working directory is a new worktree on branch 'other' at 3381ef8
+     When I issue the command `next`
+     Then the return code is 0
+      And the current branch is 'other'
+      And HEAD is 36c9fec
+      And 'fixit' is at 3381ef8 in its own worktree
+
+
   Scenario: Error exit when not in Git repository
     Given the working directory is not in a Git repository
      When I issue the command `next`
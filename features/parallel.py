@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""Run the behave acceptance suite split across worker processes.
+
+Scenarios are dealt round-robin to `--jobs` behave processes, each given its share as
+`file:line` locations. The workers share one snapshot directory, so each template repo
+is extracted only once for the run. Each worker's output is printed when it finishes
+and the return code is non-zero when any worker fails:
+
+    $ python features/parallel.py --jobs 4 --tags=-wip
+
+Arguments other than `--jobs` are passed through to each behave process.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from behave.parser import parse_file
+
+FEATURES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# --- must match `environment.SNAPSHOT_DIR_ENV`, behave does not make it importable ---
+SNAPSHOT_DIR_ENV = "GITHELPERS_SNAPSHOT_DIR"
+
+
+def main(argv: List[str] = None) -> int:
+    argv = sys.argv if argv is None else argv
+    parser = argparse.ArgumentParser(prog=os.path.basename(argv[0]))
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    options, behave_args = parser.parse_known_args(argv[1:])
+
+    locations = _scenario_locations()
+    shares = [locations[i :: options.jobs] for i in range(options.jobs)]
+    shares = [share for share in shares if share]
+
+    with tempfile.TemporaryDirectory(prefix="githelpers-snapshots-") as snapshot_dir:
+        env = dict(os.environ, **{SNAPSHOT_DIR_ENV: snapshot_dir})
+        cmds = [
+            ["behave", "--format", "progress"] + behave_args + share for share in shares
+        ]
+        with ThreadPoolExecutor(max_workers=len(cmds) or 1) as executor:
+            results = list(executor.map(lambda cmd: _run(cmd, env), cmds))
+
+    for output in (output for _, output in results):
+        sys.stdout.write(output)
+    return max((return_code for return_code, _ in results), default=0)
+
+
+def _run(cmd: List[str], env: dict):
+    """Return (return_code, output) pair for behave command `cmd`."""
+    result = subprocess.run(
+        cmd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    return result.returncode, result.stdout
+
+
+def _scenario_locations() -> List[str]:
+    """Return `file:line` location of each scenario in the features directory.
+
+    A scenario outline is one location, so its examples stay in one process.
+    """
+    locations = []
+    for filename in sorted(os.listdir(FEATURES_DIR)):
+        if not filename.endswith(".feature"):
+            continue
+        feature = parse_file(os.path.join(FEATURES_DIR, filename))
+        for scenario in feature.scenarios:
+            locations.append("%s:%d" % (scenario.filename, scenario.line))
+    return locations
+
+
+if __name__ == "__main__":
+    sys.exit(main())
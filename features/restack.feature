@@ -0,0 +1,42 @@
+Feature: Restack the branches built on an amended commit
+  In order to keep working on a branch after fixing one of its earlier commits
+  As a developer using Git
+  I need a way to move every branch built on the old commit onto the new one
+
+
+  Scenario: Restack branches onto an amended commit
+    Given the working directory is a Git repo
+      And the current branch is 'fixit'
+      And the commit at HEAD is amended
+     When I issue the command `restack 3381ef8`
+     Then the return code is 0
+      And rev 3381ef8 is not reachable
+      And branch 'master' contains HEAD
+      And branch 'spike' contains HEAD
+      And the current branch is 'fixit'
+
+
+  Scenario: Error exit on a branch to move checked out in another worktree
+    Given the working directory is a Git repo
+      And the current branch is 'fixit'
+      And 'spike' is checked out in another worktree
+      And the commit at HEAD is amended
+     When I issue the command `restack 3381ef8`
+     Then the return code is 7
+      And stderr output starts with 'Branch spike is checked out in worktree'
+      And rev 3381ef8 is still reachable
+
+
+  Scenario: Error exit when working tree is dirty
+    Given the working directory is a Git repo
+      But the working tree is not clean
+     When I issue the command `restack 3381ef8`
+     Then the return code is 3
+      And stderr output starts with 'Workspace contains uncommitted'
+
+
+  Scenario: Error exit on unknown revision
+    Given the working directory is a Git repo
+     When I issue the command `restack f00beef`
+     Then the return code is 4
+      And stderr output starts with 'Unknown revision f00beef.'
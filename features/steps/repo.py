@@ -10,14 +10,20 @@ import githelpers.scripts.fix as fix
 import githelpers.scripts.next as next
 import githelpers.scripts.prev as prev
 import githelpers.scripts.drop as drop
+import githelpers.scripts.restack as restack
 
 from githelpers.gitlib import (
+    Repo,
+    branches_containing,
     checkout,
     current_branch_name,
     head,
+    is_clean,
     is_reachable,
     reset_hard_to,
+    worktree_of,
 )
+from githelpers.runcmd import output_of, return_code_of
 
 
 # given ===================================================
@@ -28,6 +34,48 @@ def given_rev_abbrev_is_reachable(context, abbrev):
     assert is_reachable(abbrev)
 
 
+@given("a commit changing {filename} is added")
+def given_a_commit_changing_filename_is_added(context, filename):
+    with open(filename, "a") as f:
+        f.write("changed\n")
+    output_of(["git", "commit", "-q", "-a", "-m", "change %s" % filename])
+
+
+@given("a commit and a merge of a change beside it are added")
+def given_a_commit_and_a_merge_of_a_change_beside_it_are_added(context):
+    def commit(text, message):
+        with open("shared.txt", "w") as f:
+            f.write(text)
+        output_of(["git", "add", "shared.txt"])
+        output_of(["git", "commit", "-q", "-m", message])
+
+    commit("a\nb\nc\n", "add shared.txt")
+    output_of(["git", "checkout", "-q", "-b", "side"])
+    commit("a\nb\nC\n", "change line c")
+    output_of(["git", "checkout", "-q", "-"])
+    commit("a\nB\nc\n", "change line b")
+    # --- the changes touch adjacent lines, so the merge needs resolving by hand ---
+    return_code_of(["git", "merge", "-q", "--no-commit", "side"])
+    commit("a\nB\nC\n", "merge side")
+    output_of(["git", "branch", "-q", "-D", "side"])
+
+
+@given("the commit at HEAD is amended")
+def given_the_commit_at_HEAD_is_amended(context):
+    output_of(["git", "commit", "-q", "--amend", "-m", "amended commit"])
+
+
+@given("'{branch_name}' is checked out in another worktree")
+def given_branch_name_is_checked_out_in_another_worktree(context, branch_name):
+    path = "%s-%s" % (context.repo_dir, branch_name)
+    output_of(["git", "worktree", "add", "-q", path, branch_name])
+
+
+@given("'fixit' is checked out in its own worktree")
+def given_fixit_is_checked_out_in_its_own_worktree(context):
+    assert fix.main(["behave-fix", "--worktree", "fixit"]) == 0
+
+
 @given("the current branch is '{branch_name}'")
 def given_the_current_branch_is_branch_name(context, branch_name):
     if current_branch_name() != branch_name:
@@ -44,6 +92,13 @@ def given_the_cwd_is_a_Git_repository(context):
     context.repo_dir.chdir()
 
 
+@given("the working directory is a new worktree on branch '{branch_name}' at {rev}")
+def given_the_cwd_is_a_new_worktree_on_branch_name_at_rev(context, branch_name, rev):
+    path = context.repo_dir.dirpath().join(branch_name)
+    output_of(["git", "worktree", "add", "-q", "-b", branch_name, str(path), rev])
+    path.chdir()
+
+
 @given("the working directory is not in a Git repository")
 def given_the_cwd_is_not_in_a_Git_repository(context):
     context.empty_dir.chdir()
@@ -58,9 +113,9 @@ def given_the_working_tree_is_not_clean(context):
 # when ====================================================
 
 
-@when("I issue the command `fix {commit_ish}`")
-def when_I_issue_the_command_fix_commit_ish(context, commit_ish):
-    rc = fix.main(["behave-fix", commit_ish])
+@when("I issue the command `fix {args}`")
+def when_I_issue_the_command_fix_args(context, args):
+    rc = fix.main(["behave-fix"] + args.split())
     context.return_code = rc
 
 
@@ -74,15 +129,34 @@ def when_I_issue_the_command_prev(context):
     context.return_code = prev.main()
 
 
-@when("I issue the command `drop {abbrev}`")
-def when_I_issue_the_command_drop_abbrev(context, abbrev):
-    rc = drop.main(["behave-drop", abbrev])
+@when("I issue the command `drop {args}`")
+def when_I_issue_the_command_drop_args(context, args):
+    rc = drop.main(["behave-drop"] + args.split())
     context.return_code = rc
 
 
+@when("I issue the command `restack {args}`")
+def when_I_issue_the_command_restack_args(context, args):
+    context.return_code = restack.main(["behave-restack"] + args.split())
+
+
 # then ====================================================
 
 
+@then("branch '{branch_name}' contains HEAD")
+def then_branch_branch_name_contains_HEAD(context, branch_name):
+    assert branch_name in branches_containing("HEAD")
+
+
+@then("'fixit' is at {abbrev_hash} in its own worktree")
+def then_fixit_is_at_abbrev_hash_in_its_own_worktree(context, abbrev_hash):
+    path = worktree_of("fixit")
+    assert path == "%s-fixit" % context.repo_dir
+    with Repo(path):
+        assert head().startswith(abbrev_hash)
+        assert current_branch_name() == "fixit"
+
+
 @then("HEAD is {abbrev_hash}")
 def then_HEAD_is_abbrev_hash(context, abbrev_hash):
     assert head().startswith(abbrev_hash)
@@ -93,6 +167,22 @@ def then_rev_abbrev_is_not_reachable(context, abbrev):
     assert not is_reachable(abbrev)
 
 
+@then("rev {abbrev} is still reachable")
+def then_rev_abbrev_is_still_reachable(context, abbrev):
+    assert is_reachable(abbrev)
+
+
+@then("{filename} reads '{text}'")
+def then_filename_reads_text(context, filename, text):
+    with open(filename) as f:
+        assert f.read().split() == text.split()
+
+
+@then("the working tree is clean")
+def then_the_working_tree_is_clean(context):
+    assert is_clean()
+
+
 @then("the current branch is '{branch_name}'")
 def then_the_current_branch_is_branch_name(context, branch_name):
     branch = current_branch_name()
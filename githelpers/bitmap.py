@@ -0,0 +1,108 @@
+# encoding: utf-8
+
+"""Compressed bitmap of row numbers, for per-ref commit reachability.
+
+A `Bitmap` splits its rows into chunks of 65536, in the manner of a roaring bitmap, and
+holds only the chunks having at least one row. Each chunk is a Python int with bit `r`
+set for row `chunk * 65536 + r`, so testing a row touches one 8 KiB int at most rather
+than a bitmap the size of the whole history.
+
+On disk each chunk takes whichever of three forms is smallest: the marker -1 for a
+chunk with every row set, which is most chunks of a ref that reaches most of history; a
+tuple of row offsets for a sparse chunk; or the int itself.
+"""
+
+from typing import Dict, Iterable, Union
+
+CHUNK_BITS = 16
+CHUNK_ROWS = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_ROWS - 1
+FULL_CHUNK = (1 << CHUNK_ROWS) - 1
+
+# --- a chunk with fewer rows than this is stored as a tuple of row offsets ---
+SPARSE_ROWS = 4096
+
+_ChunkState = Union[int, tuple]
+
+
+class Bitmap:
+    """Set of int row numbers, stored as 65536-row chunks."""
+
+    __slots__ = ("_chunks",)
+
+    def __init__(self, chunks: Dict[int, int] = None):
+        self._chunks = chunks or {}
+
+    def __contains__(self, row: int) -> bool:
+        chunk = self._chunks.get(row >> CHUNK_BITS)
+        return chunk is not None and chunk >> (row & CHUNK_MASK) & 1 == 1
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Bitmap) and self._chunks == other._chunks
+
+    def __len__(self) -> int:
+        return sum(bin(chunk).count("1") for chunk in self._chunks.values())
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        chunks = dict(self._chunks)
+        for key, chunk in other._chunks.items():
+            chunks[key] = chunks.get(key, 0) | chunk
+        return Bitmap(chunks)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Bitmap":
+        """Return bitmap of `data`, a little-endian bit array with a bit per row."""
+        size = CHUNK_ROWS // 8
+        chunks = {}
+        for key, start in enumerate(range(0, len(data), size)):
+            chunk = int.from_bytes(data[start : start + size], "little")
+            if chunk:
+                chunks[key] = chunk
+        return cls(chunks)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[int]) -> "Bitmap":
+        """Return bitmap holding each of `rows`."""
+        rows = sorted(rows)
+        if not rows:
+            return cls()
+        data = bytearray(rows[-1] // 8 + 1)
+        for row in rows:
+            data[row >> 3] |= 1 << (row & 7)
+        return cls.from_bytes(data)
+
+    @classmethod
+    def from_state(cls, state: Dict[int, _ChunkState]) -> "Bitmap":
+        """Return bitmap stored as `state`, as produced by `.to_state()`."""
+        chunks = {}
+        for key, chunk in state.items():
+            if chunk == -1:
+                chunks[key] = FULL_CHUNK
+            elif isinstance(chunk, tuple):
+                chunks[key] = sum(1 << offset for offset in chunk)
+            else:
+                chunks[key] = chunk
+        return cls(chunks)
+
+    def to_state(self) -> Dict[int, _ChunkState]:
+        """Return marshal-able form of this bitmap, compressing each chunk."""
+        state: Dict[int, _ChunkState] = {}
+        for key, chunk in self._chunks.items():
+            if chunk == FULL_CHUNK:
+                state[key] = -1
+            elif bin(chunk).count("1") < SPARSE_ROWS:
+                state[key] = _offsets_of(chunk)
+            else:
+                state[key] = chunk
+        return state
+
+
+def _offsets_of(chunk: int) -> tuple:
+    """Return tuple of the offset of each set bit of `chunk`, in ascending order."""
+    offsets = []
+    for i, byte in enumerate(chunk.to_bytes(CHUNK_ROWS // 8, "little")):
+        while byte:
+            low = byte & -byte
+            offsets.append(i * 8 + low.bit_length() - 1)
+            byte ^= low
+    return tuple(offsets)
@@ -0,0 +1,333 @@
+# encoding: utf-8
+
+"""Journal of the files changed in a worktree, kept by a watcher process.
+
+`githelpers fsmonitor start` runs a process that watches each directory of the worktree
+with inotify and appends the path of every file changed to a journal in the git
+directory. A change token names a position in that journal, so `changes_since()` can
+say which paths changed after a token was issued without looking at the tree at all.
+`gitlib.is_clean()` uses this to reuse its last verdict while nothing has changed.
+
+Only the watcher process loads `ctypes`, which `githelpers.inotify` imports only once an
+inotify instance is made, so asking about changes stays cheap enough to run at the start
+of every navigation command.
+
+Before answering, `changes_since()` creates a "cookie" file the watcher also watches,
+and waits for the watcher to journal it. inotify reports events in order, so every
+change made before the question was asked is then in the journal. When the watcher is
+not running, its journal overflows, or the cookie is not seen in time, the answer is
+"unknown" and the caller must scan the tree.
+
+The same journal answers git's fsmonitor hook protocol (version 2), so setting
+`core.fsmonitor` to `githelpers fsmonitor` lets `git status` use it too.
+"""
+
+import errno
+import os
+import select
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .inotify import (
+    IN_ATTRIB,
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_DELETE,
+    IN_IGNORED,
+    IN_ISDIR,
+    IN_MODIFY,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    IN_Q_OVERFLOW,
+    Inotify,
+)
+
+_CONTENT_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE
+_TREE_MASK = _CONTENT_MASK | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+# --- journal record marking that a cookie file was seen, followed by its name ---
+COOKIE_MARK = b"\x01"
+
+# --- journal is started afresh, invalidating every token, once it grows this large ---
+JOURNAL_LIMIT = 4 * 1024 * 1024
+
+# --- seconds to wait for the watcher to journal a cookie before giving up ---
+SYNC_TIMEOUT = 1.0
+
+# --- a token naming no journal, for when there is no watcher to issue one ---
+NO_TOKEN = "githelpers:none:0"
+
+
+def changes_since(git_dir: str, token: str) -> Tuple[str, Optional[List[str]]]:
+    """Return (new_token, paths) pair of the paths changed since `token` was issued.
+
+    `paths` are relative to the top of the worktree, and |None| when the changes are
+    unknown, as when no watcher is running or `token` is from an earlier journal.
+    `new_token` names the journal as of now, including changes made up to the call.
+    """
+    monitor_dir = _monitor_dir(git_dir)
+    journal_id = _running_journal_id(monitor_dir)
+    if journal_id is None:
+        return NO_TOKEN, None
+
+    journal_path = os.path.join(monitor_dir, "%s.journal" % journal_id)
+    end = _sync(monitor_dir, journal_path)
+    if end is None:
+        return NO_TOKEN, None
+    new_token = "githelpers:%s:%d" % (journal_id, end)
+
+    token_id, _, offset = token.rpartition(":")
+    if token_id != "githelpers:%s" % journal_id or not offset.isdigit():
+        return new_token, None
+    with open(journal_path, "rb") as f:
+        f.seek(int(offset))
+        records = f.read(end - int(offset)).split(b"\0")
+    paths = {
+        os.fsdecode(record)
+        for record in records
+        if record and not record.startswith(COOKIE_MARK)
+    }
+    return new_token, sorted(paths)
+
+
+def is_running(git_dir: str) -> bool:
+    """|True| when a watcher is journaling the worktree of `git_dir`."""
+    return _running_journal_id(_monitor_dir(git_dir)) is not None
+
+
+def run(worktree_dir: str, git_dir: str):
+    """Watch `worktree_dir` and journal each path changed, until terminated.
+
+    Paths inside any `.git` directory are not watched, since git changes them as it
+    reads the repository. Raises |OSError| when a directory cannot be watched, as when
+    the inotify watch limit is reached, having withdrawn the journal so callers scan the
+    tree instead.
+    """
+    monitor_dir = _monitor_dir(git_dir)
+    os.makedirs(monitor_dir, exist_ok=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    journal = _Journal(monitor_dir)
+    try:
+        while True:
+            watcher = _TreeWatcher(worktree_dir, monitor_dir)
+            # --- advertised only once watched, so no change can go unrecorded ---
+            journal.restart()
+            try:
+                while journal.size < JOURNAL_LIMIT:
+                    records = watcher.read()
+                    if records is None:
+                        break
+                    journal.append(records)
+            finally:
+                watcher.close()
+    finally:
+        journal.close()
+
+
+def start(worktree_dir: str, git_dir: str) -> int:
+    """Start a watcher of `worktree_dir` in the background, returning its pid.
+
+    Returns once the watcher is journaling, so a change made after this returns is
+    always seen.
+    """
+    cmd = [sys.executable, "-m", "githelpers.fsmonitor", worktree_dir, git_dir]
+    # --- so the watcher imports this same package, installed or not ---
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=package_root)
+    with open(os.devnull, "r+b") as devnull:
+        process = subprocess.Popen(
+            cmd,
+            env=env,
+            stdin=devnull,
+            stdout=devnull,
+            stderr=devnull,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + SYNC_TIMEOUT * 5
+    while not is_running(git_dir):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise OSError("fsmonitor watcher did not start")
+        time.sleep(0.01)
+    return process.pid
+
+
+def stop(git_dir: str) -> bool:
+    """Stop the watcher of the worktree of `git_dir`, |False| if none was running."""
+    monitor_dir = _monitor_dir(git_dir)
+    if _running_journal_id(monitor_dir) is None:
+        return False
+    advert = os.path.join(monitor_dir, "watcher")
+    with open(advert) as f:
+        pid = int(f.read().split()[1])
+    os.kill(pid, signal.SIGTERM)
+    # --- the watcher withdraws its advert as it exits ---
+    deadline = time.monotonic() + SYNC_TIMEOUT
+    while os.path.exists(advert) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return True
+
+
+class _Journal:
+    """Append-only journal file of a running watcher, advertised in `watcher` file."""
+
+    def __init__(self, monitor_dir: str):
+        self._monitor_dir = monitor_dir
+        self._fd = -1
+        self.size = 0
+
+    def append(self, records: List[bytes]):
+        """Append `records` to the journal, each terminated by a NUL byte."""
+        if records:
+            data = b"".join(record + b"\0" for record in records)
+            os.write(self._fd, data)
+            self.size += len(data)
+
+    def close(self):
+        """Withdraw this journal, so no token issued from it is trusted again."""
+        try:
+            os.unlink(os.path.join(self._monitor_dir, "watcher"))
+        except OSError:
+            pass
+        self._remove_journal()
+
+    def restart(self):
+        """Start a new, empty journal under a new id, invalidating every token."""
+        self._remove_journal()
+        self._id = os.urandom(16).hex()
+        self._path = os.path.join(self._monitor_dir, "%s.journal" % self._id)
+        self._fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.size = 0
+        advert = os.path.join(self._monitor_dir, "watcher")
+        with open(advert + ".tmp", "w") as f:
+            f.write("%s %d\n" % (self._id, os.getpid()))
+        os.replace(advert + ".tmp", advert)
+
+    def _remove_journal(self):
+        """Close and delete the current journal file, if there is one."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            os.unlink(self._path)
+            self._fd = -1
+
+
+class _TreeWatcher:
+    """inotify watch of every directory in a worktree, and of the cookie directory."""
+
+    def __init__(self, worktree_dir: str, cookie_dir: str):
+        self._worktree_dir = worktree_dir
+        self._inotify = Inotify()
+        self._dirs: Dict[int, bytes] = {}
+        self._cookie_wd = self._inotify.add_watch(cookie_dir, IN_CREATE)
+        self._watch_tree(b"")
+
+    def close(self):
+        self._inotify.close()
+
+    def read(self) -> Optional[List[bytes]]:
+        """Return the journal records for the next batch of events, blocking for it.
+
+        Returns |None| when events were lost because the inotify queue overflowed.
+        """
+        select.select([self._inotify.fd], [], [])
+        records: List[bytes] = []
+        for wd, mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+            elif wd == self._cookie_wd:
+                if name.startswith(b"cookie-"):
+                    records.append(COOKIE_MARK + name)
+            elif wd in self._dirs:
+                path = os.path.join(self._dirs[wd], name)
+                records.append(path)
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    records.extend(self._watch_tree(path))
+        return records
+
+    def _watch_tree(self, rel_dir: bytes) -> List[bytes]:
+        """Watch directory `rel_dir` and those below it, returning the paths within.
+
+        A directory created while the watcher runs may have files in it before it is
+        watched, so those are reported as changed. Raises |OSError| when a directory
+        that exists cannot be watched, since its changes would go unrecorded.
+        """
+        paths = []
+        top = os.path.join(os.fsencode(self._worktree_dir), rel_dir)
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [name for name in dirnames if name != b".git"]
+            rel = os.path.relpath(dirpath, os.fsencode(self._worktree_dir))
+            rel = b"" if rel == b"." else rel
+            try:
+                self._dirs[self._inotify.add_watch(dirpath, _TREE_MASK)] = rel
+            except OSError as e:
+                # --- removed before it could be watched, so nothing to miss there ---
+                if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise
+            paths.extend(os.path.join(rel, name) for name in dirnames + filenames)
+        return paths if rel_dir else []
+
+
+def _monitor_dir(git_dir: str) -> str:
+    """Return path of the directory holding the watcher's journal and cookies."""
+    return os.path.join(git_dir, "githelpers", "fsmonitor")
+
+
+def _pid_is_alive(pid: int) -> bool:
+    """|True| when a process with `pid` exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _running_journal_id(monitor_dir: str) -> Optional[str]:
+    """Return id of the journal of the watcher running for `monitor_dir`, if any."""
+    try:
+        with open(os.path.join(monitor_dir, "watcher")) as f:
+            journal_id, pid = f.read().split()
+    except (OSError, ValueError):
+        return None
+    return journal_id if _pid_is_alive(int(pid)) else None
+
+
+def _sync(monitor_dir: str, journal_path: str) -> Optional[int]:
+    """Return size of the journal once it records every change made before this call.
+
+    Returns |None| when the watcher does not record the cookie within `SYNC_TIMEOUT`.
+    """
+    name = "cookie-%d-%s" % (os.getpid(), os.urandom(4).hex())
+    cookie_path = os.path.join(monitor_dir, name)
+    mark = COOKIE_MARK + name.encode("ascii") + b"\0"
+    deadline = time.monotonic() + SYNC_TIMEOUT
+    try:
+        start = os.stat(journal_path).st_size
+        open(cookie_path, "w").close()
+    except OSError:
+        return None
+    try:
+        with open(journal_path, "rb") as f:
+            while time.monotonic() < deadline:
+                f.seek(start)
+                found = f.read().find(mark)
+                if found >= 0:
+                    return start + found + len(mark)
+                time.sleep(0.0005)
+        return None
+    except OSError:
+        return None
+    finally:
+        os.unlink(cookie_path)
+
+
+if __name__ == "__main__":
+    run(sys.argv[1], sys.argv[2])
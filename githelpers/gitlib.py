@@ -1,37 +1,145 @@
 # encoding: utf-8
 
-"""Git helper functions, each roughly equivalent to a form of a git command."""
+"""Git helper functions, each roughly equivalent to a form of a git command.
 
-from .runcmd import output_of, return_code_of
+Each function operates on the repository containing the current working directory,
+unless called inside a `with Repo(path):` block, in which case it operates on the
+repository at `path`. This allows many repositories to be queried concurrently, each
+from its own thread, without changing the working directory of the process.
+
+Functions that only read the repository run git as a query, under the current
+`runcmd.QueryPolicy`; those that change it run git with the user's settings.
+"""
+
+import os
+import re
+from contextvars import ContextVar, Token
+from typing import Dict, List, Optional, Tuple
+
+from .runcmd import RunCmdError, output_bytes_of, output_of, return_code_of, run
+
+# --- fixed identity and date of the throwaway commits `replay_onto()` merges with, so a
+# --- replay makes the same objects each time rather than new garbage ---
+_SCRATCH_COMMIT_ENV = {
+    "GIT_AUTHOR_NAME": "githelpers",
+    "GIT_AUTHOR_EMAIL": "githelpers@localhost",
+    "GIT_AUTHOR_DATE": "946684800 +0000",
+    "GIT_COMMITTER_NAME": "githelpers",
+    "GIT_COMMITTER_EMAIL": "githelpers@localhost",
+    "GIT_COMMITTER_DATE": "946684800 +0000",
+}
+
+
+# --- a full SHA1 hash, which `git rev-parse` echoes back without checking it ---
+FULL_HASH_RE = re.compile(r"[0-9a-f]{40}")
+
+
+# --- word recording each verdict of `is_clean()` in its cached state ---
+_CLEAN_WORDS = {True: "clean", False: "dirty"}
+
+
+class ReplayError(Exception):
+    """Raised when `replay_onto()` cannot replay `commit`.
+
+    `is_merge` is |True| when `commit` is a merge whose first parent is not replayed,
+    so it has no changes of its own to replay, and |False| when its changes conflict.
+    """
+
+    def __init__(self, commit: str, is_merge: bool = False):
+        self.commit = commit
+        self.is_merge = is_merge
+
+    def __str__(self):
+        if self.is_merge:
+            return "Commit %s merges in a replayed commit" % self.commit
+        return "Commit %s conflicts when replayed" % self.commit
+
+
+class Repo:
+    """A git repository, addressed by `path` rather than the current working directory.
+
+    Used as a context manager, the gitlib functions called within the `with` block
+    operate on this repository, by running git with `-C path`. The binding is
+    per-thread (strictly, per-context), so concurrent threads can each use a different
+    `Repo`. A `Repo` with no path is the repository containing the working directory.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._tokens: List[Token] = []
+
+    def __enter__(self) -> "Repo":
+        self._tokens.append(_current_repo.set(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_repo.reset(self._tokens.pop())
+
+    def git(self, *args: str) -> List[str]:
+        """Return command-line list that runs git with `args` in this repository."""
+        if self._path is None:
+            return ["git"] + list(args)
+        return ["git", "-C", self._path] + list(args)
+
+    @property
+    def path(self) -> Optional[str]:
+        """Path to the working tree of this repository, |None| for the working dir."""
+        return self._path
+
+
+_current_repo = ContextVar("_current_repo", default=Repo())
+
+
+def add_worktree(path: str, branch_name: str, commit_ref: str):
+    """Check out `branch_name`, reset to `commit_ref`, in a new worktree at `path`.
+
+    The new worktree is linked to this repository, sharing its object store and refs.
+    Raises |RunCmdError| if `branch_name` is checked out in another worktree.
+    """
+    cmd = _git("worktree", "add", "-B", branch_name, path, commit_ref)
+    return output_of(cmd).rstrip()
 
 
 def branch_exists(branch_name: str):
     """Return |True| when `branch_name` exists in the current repository."""
-    cmd = ["git", "show-ref", "--verify", "refs/heads/%s" % branch_name]
-    return return_code_of(cmd) == 0
+    cmd = _git("show-ref", "--verify", "refs/heads/%s" % branch_name)
+    return return_code_of(cmd, query=True) == 0
 
 
 def branch_hash(branch_name: str):
     """Return 40-char str SHA1 hash of commit pointed to by `branch_name`."""
-    return output_of(["git", "rev-parse", branch_name]).strip()
+    return output_of(_git("rev-parse", branch_name), query=True).strip()
 
 
 def branch_hashes():
     """Return list of str SHA1 hash for each of local branch in this repository."""
-    out = output_of(["git", "show-ref", "--heads", "--hash"])
+    out = output_of(_git("show-ref", "--heads", "--hash"), query=True)
     return [line for line in out.splitlines()]
 
 
 def branch_names():
     """Return list of str name of each local branch in this repository."""
-    out = output_of(["git", "for-each-ref", "--format=%(refname)", "refs/heads"])
+    cmd = _git("for-each-ref", "--format=%(refname)", "refs/heads")
+    out = output_of(cmd, query=True)
     return [line[11:] for line in out.splitlines()]
 
 
 def branches_containing(commitish: str):
-    """Return list of name of each local branch from which `commitish` is reachable."""
+    """Return list of name of each local branch from which `commitish` is reachable.
+
+    Uses the reachability bitmaps of the commit-graph index maintained by `githelpers
+    install-hooks` when the repository has one.
+    """
     rev = full_hash_of(commitish)
-    return [name for name in branch_names() if rev in rev_list(name)]
+    graph = _commit_graph()
+    if graph is not None:
+        branches = _branch_commit_hashes()
+        containing = graph.containing_tips([rev], list(branches.values()))
+        if containing is not None:
+            names = list(branches)
+            return [names[i] for i in containing[0]]
+    cmd = _git("for-each-ref", "--format=%(refname)", "--contains", rev, "refs/heads")
+    return [line[11:] for line in output_of(cmd, query=True).splitlines()]
 
 
 def checkout(branch_name: str):
@@ -40,17 +148,122 @@ def checkout(branch_name: str):
     Returns whatever output is send to stdout. Raises |RunCmdError| if checkout is
     unsuccessful.
     """
-    return output_of(["git", "checkout", branch_name])
+    return output_of(_git("checkout", branch_name))
 
 
 def children_of_head():
-    """Return list of str SHA1 hash for each child commit of HEAD."""
-    out = output_of(["git", "rev-list", "--all", "--children"])
-    head_sha1 = head()
-    for line in out.splitlines():
-        if line.startswith(head_sha1):
-            return line.split()[1:]
-    raise Exception("HEAD not found in rev-list output")
+    """Return list of str SHA1 hash for each child commit of HEAD.
+
+    Uses the commit-graph index maintained by `githelpers install-hooks` when the
+    repository has one, avoiding a walk of the full history.
+    """
+    graph = _commit_graph()
+    if graph is not None:
+        head_sha1 = head()
+        if head_sha1 in graph:
+            return graph.live_children_of(head_sha1)
+
+    # --- list only the commits descended from HEAD, so the output grows with what was
+    # --- committed on top of HEAD rather than with history; HEAD is a boundary commit,
+    # --- listed as "-<sha1> <child>..." ---
+    cmd = _git(
+        "rev-list", "--children", "--boundary", "--ancestry-path", "--all", "^HEAD"
+    )
+    boundary = [
+        line[1:].split()
+        for line in output_of(cmd, query=True).splitlines()
+        if line.startswith("-")
+    ]
+    # --- HEAD is the only boundary commit unless a merge on top of it has a parent
+    # --- from elsewhere; only then is its hash needed to tell which line is HEAD's ---
+    if len(boundary) == 1:
+        return boundary[0][1:]
+    head_sha1 = head() if boundary else None
+    for sha1, *children in boundary:
+        if sha1 == head_sha1:
+            return children
+    return []
+
+
+def commit_messages(revs: List[str]) -> List[Tuple[str, List[str], int, str, int, str]]:
+    """Return (sha, parent_shas, time, author, date, message) for each commit in `revs`.
+
+    `revs` are arguments to `git log`, given on its standard input so there can be any
+    number of them, and a rev naming a missing object is ignored. `time` is the commit
+    time and `date` the author time, in seconds since the epoch. `author` is
+    "{name} <{email}>" as mapped by the mailmap, the form `git log --author` matches.
+    """
+    fmt = "%H%x00%P%x00%ct%x00%aN <%aE>%x00%at%x00%B"
+    cmd = _git("log", "-z", "--ignore-missing", "--stdin", "--format=%s" % fmt)
+    stdin = "".join("%s\n" % rev for rev in revs).encode("utf-8")
+    fields = output_bytes_of(cmd, input=stdin, query=True).split(b"\0")
+    records = []
+    for i in range(0, len(fields) - 5, 6):
+        sha, parents, time, author, date, message = (
+            str(field, "utf-8", "surrogateescape") for field in fields[i : i + 6]
+        )
+        records.append((sha, parents.split(), int(time), author, int(date), message))
+    return records
+
+
+def commit_records(revs: List[str]) -> List[Tuple[str, List[str], str, Dict, str]]:
+    """Return (sha, parent_shas, tree, author_env, message) for each commit in `revs`.
+
+    `revs` are arguments to `git log`, and commits are listed parents first.
+    `author_env` maps the `GIT_AUTHOR_*` environment variables to the author of the
+    commit, so `commit_tree()` can make a commit by the same author at the same time.
+    """
+    fmt = "%H%x00%P%x00%T%x00%an%x00%ae%x00%ad%x00%B"
+    cmd = _git(
+        "log", "-z", "--topo-order", "--reverse", "--date=raw", "--format=%s" % fmt
+    )
+    fields = output_bytes_of(cmd + list(revs), query=True).split(b"\0")
+    records = []
+    for i in range(0, len(fields) - 6, 7):
+        sha, parents, tree, name, email, date = (
+            str(field, "utf-8", "surrogateescape") for field in fields[i : i + 6]
+        )
+        author_env = {
+            "GIT_AUTHOR_NAME": name,
+            "GIT_AUTHOR_EMAIL": email,
+            "GIT_AUTHOR_DATE": date,
+        }
+        message = str(fields[i + 6], "utf-8", "surrogateescape")
+        records.append((sha, parents.split(), tree, author_env, message))
+    return records
+
+
+def commit_tree(
+    tree: str, parents: List[str], message: str, env: Optional[Dict] = None
+) -> str:
+    """Return str SHA1 hash of a new commit of `tree` having `parents` and `message`.
+
+    No ref is moved. `env` is added to the environment of `git commit-tree`, as to set
+    the author of the commit.
+    """
+    cmd = _git("commit-tree", tree, *_with_option("-p", parents))
+    return output_of(cmd + ["-m", message], env=env).strip()
+
+
+def commits_of(shas: List[str]) -> Dict[str, str]:
+    """Return dict mapping each of `shas` to the hash of the commit it peels to.
+
+    An annotated tag peels to the commit it tags and a commit to itself. Objects that
+    peel to no commit, like a tag of a tree, are left out. All are peeled in one
+    `git cat-file` process.
+    """
+    stdin = "".join("%s^{commit}\n" % sha for sha in shas).encode("ascii")
+    cmd = _git("cat-file", "--batch-check=%(objectname)")
+    out = output_of(cmd, input=stdin, query=True)
+    return {
+        sha: commit for sha, commit in zip(shas, out.splitlines()) if " " not in commit
+    }
+
+
+def config_value(name: str) -> Optional[str]:
+    """Return str value of config variable `name`, or |None| when it is not set."""
+    rc, out, _ = run(_git("config", "--get", name), query=True)
+    return out.decode("utf-8").strip() if rc == 0 else None
 
 
 def create_branch_at(branch_name: str, commit_ref: str):
@@ -59,33 +272,83 @@ def create_branch_at(branch_name: str, commit_ref: str):
     Does not checkout the new branch. Returns stdout output, but this command is
     normally silent.
     """
-    return output_of(["git", "branch", branch_name, commit_ref])
+    return output_of(_git("branch", branch_name, commit_ref))
 
 
 def current_branch_name():
     """Return str current branch name, or 'HEAD' if in detached head state."""
-    return output_of(["git", "rev-parse", "--abbrev-ref", "HEAD"]).strip()
+    return output_of(_git("rev-parse", "--abbrev-ref", "HEAD"), query=True).strip()
 
 
 def delete_branch(branch_name: str):
     """Delete the reference refs/heads/{`branch_name`}."""
     if branch_name == current_branch_name():
         raise ValueError("Cannot delete current branch '%s'" % branch_name)
-    return output_of(["git", "branch", "-D", branch_name])
+    return output_of(_git("branch", "-D", branch_name))
+
+
+def enable_untracked_cache():
+    """Turn on the untracked cache of the index and fill it.
+
+    The cache is only filled by a `git status` that may write the index, which queries
+    never do, so one is run here.
+    """
+    output_of(_git("update-index", "--untracked-cache"))
+    return output_of(_git("status", "--porcelain"))
 
 
 def full_hash_of(commit_ish: str):
     """Return str full 40-character SHA1 hash of commit identified by `commit_ish`.
 
     Raises |RunCmdError| if `commit_ish` does not correspond to a revision in the
-    repository.
+    repository. A full hash is returned as is, as `git rev-parse` would return it,
+    without running git.
     """
-    return output_of(["git", "rev-parse", commit_ish]).strip()
+    if FULL_HASH_RE.fullmatch(commit_ish):
+        return commit_ish
+    return output_of(_git("rev-parse", commit_ish), query=True).strip()
+
+
+def git_dir():
+    """Return str absolute path of the git directory of the current worktree."""
+    return output_of(_git("rev-parse", "--absolute-git-dir"), query=True).strip()
+
+
+def git_common_dir():
+    """Return str absolute path of the git directory shared by all worktrees.
+
+    Found without running git when the git directory of the current `Repo` is.
+    """
+    git_dir = _discovered_git_dir()
+    if git_dir is not None and "GIT_COMMON_DIR" not in os.environ:
+        try:
+            with open(os.path.join(git_dir, "commondir")) as f:
+                git_dir = os.path.join(git_dir, f.read().strip())
+        except OSError:
+            pass
+        return os.path.realpath(git_dir)
+    cmd = _git("rev-parse", "--path-format=absolute", "--git-common-dir")
+    return output_of(cmd, query=True).strip()
+
+
+def git_path(path: str):
+    """Return str path of `path` within the git directory, as git resolves it.
+
+    This respects settings like `core.hooksPath` that relocate parts of the git
+    directory. Relative paths are relative to the working directory.
+    """
+    return output_of(_git("rev-parse", "--git-path", path), query=True).strip()
+
+
+def has_merges(revs: List[str]) -> bool:
+    """Return |True| when a commit listed by `git rev-list revs` has several parents."""
+    cmd = _git("rev-list", "--min-parents=2", "--max-count=1", *revs)
+    return output_of(cmd, query=True) != ""
 
 
 def head():
     """Return str SHA1 hash of the commit pointed to by 'HEAD'."""
-    return output_of(["git", "rev-parse", "HEAD"]).strip()
+    return output_of(_git("rev-parse", "HEAD"), query=True).strip()
 
 
 def head_is_independent():
@@ -94,7 +357,16 @@ def head_is_independent():
     In this situation, that commit would become unreachable if the current branch
     pointer was moved "downward" to the parent commit. |False| otherwise.
     """
-    return head() in independent_branch_hashes()
+    head_sha1 = head()
+    graph = _commit_graph()
+    if graph is not None:
+        branch_tips = list(_branch_commit_hashes().values())
+        containing = graph.containing_tips([head_sha1], branch_tips)
+        if containing is not None:
+            return head_sha1 in branch_tips and all(
+                branch_tips[i] == head_sha1 for i in containing[0]
+            )
+    return head_sha1 in independent_branch_hashes()
 
 
 def independent_branch_hashes():
@@ -104,39 +376,139 @@ def independent_branch_hashes():
     Conceptually, an independent branch is a commit graph "tip" that has only one branch
     reference.
     """
-    out = output_of(["git", "show-branch", "--independent"] + branch_hashes())
+    cmd = _git("show-branch", "--independent") + branch_hashes()
+    out = output_of(cmd, query=True)
     return [line for line in out.splitlines()]
 
 
 def is_clean():
-    """Return |True| when current working directory has no uncommitted changes."""
-    out = output_of(["git", "status", "--porcelain"])
-    return out == ""
+    """Return |True| when current working directory has no uncommitted changes.
+
+    While `githelpers fsmonitor` watches the worktree, the verdict of the last check is
+    reused when no file has changed since and HEAD and the index are as they were, so
+    the tree is not scanned.
+    """
+    git_dir = _discovered_git_dir()
+    if git_dir is None or not os.path.exists(_monitor_path(git_dir, "watcher")):
+        return _status_is_clean()
+
+    # --- imported here, so startup without a watcher does not pay for it ---
+    from . import fsmonitor
+
+    head_sig = _head_signature(git_dir)
+    state_path = _monitor_path(git_dir, "clean-state")
+    try:
+        with open(state_path) as f:
+            state = f.read().split()
+    except OSError:
+        state = []
+    token, changed = fsmonitor.changes_since(
+        git_dir, state[0] if len(state) == 4 else fsmonitor.NO_TOKEN
+    )
+    if changed == [] and state[1:3] == [head_sig, _index_signature(git_dir)]:
+        return state[3] == "clean"
+
+    clean = _status_is_clean()
+    if token != fsmonitor.NO_TOKEN:
+        state = [token, head_sig, _index_signature(git_dir), _CLEAN_WORDS[clean]]
+        with open(state_path + ".tmp", "w") as f:
+            f.write(" ".join(state) + "\n")
+        os.replace(state_path + ".tmp", state_path)
+    return clean
 
 
 def is_commit(commit_ref: str):
     """Return |True| when `commit_ref` "points" to a commit in this repository."""
     ref = "%s^{commit}" % commit_ref
-    cmd = ["git", "rev-parse", "-q", "--verify", "%s" % ref]
-    return return_code_of(cmd) == 0
+    cmd = _git("rev-parse", "-q", "--verify", "%s" % ref)
+    return return_code_of(cmd, query=True) == 0
 
 
 def is_git_repo():
-    """Return |True| when the current working directory is in a git repository."""
-    cmd = ["git", "rev-parse", "--git-dir"]
-    return return_code_of(cmd) == 0
+    """Return |True| when the current working directory is in a git repository.
+
+    Answered without running git when the git directory of the current `Repo` is found.
+    """
+    if _discovered_git_dir() is not None:
+        return True
+    cmd = _git("rev-parse", "--git-dir")
+    return return_code_of(cmd, query=True) == 0
 
 
 def is_reachable(commitish: str):
-    """Return |True| when `commitish` is reachable from at least one branch."""
-    return full_hash_of(commitish) in reachable_revs()
+    """Return |True| when `commitish` is reachable from at least one ref or HEAD.
+
+    Uses the reachability bitmaps of the commit-graph index maintained by `githelpers
+    install-hooks` when the repository has one.
+    """
+    rev = full_hash_of(commitish)
+    graph = _commit_graph()
+    if graph is not None:
+        tips = list(ref_commit_hashes().values()) + [head()]
+        containing = graph.containing_tips([rev], tips)
+        if containing is not None:
+            return bool(containing[0])
+    if is_ref_reachable(rev):
+        return True
+    cmd = _git("merge-base", "--is-ancestor", rev, "HEAD")
+    return return_code_of(cmd, query=True) == 0
+
+
+def is_ref_reachable(commitish: str):
+    """Return |True| when `commitish` is reachable from at least one ref.
+
+    Unlike `is_reachable()`, a detached HEAD does not count as a ref. A commit that
+    no longer exists, as after `git gc` prunes it, is not reachable.
+    """
+    cmd = _git("for-each-ref", "--count=1", "--contains=%s" % commitish)
+    try:
+        return output_bytes_of(cmd, query=True) != b""
+    except RunCmdError:
+        return False
+
+
+def merge_tree(ours: str, theirs: str) -> Optional[str]:
+    """Return str SHA1 hash of the tree merging commits `ours` and `theirs`.
+
+    The merge is made without touching the index or working tree, from the merge base
+    git finds for the two commits. Returns |None| when the merge has conflicts.
+    """
+    cmd = _git("merge-tree", "--write-tree", "--no-messages", ours, theirs)
+    rc, out, err = run(cmd)
+    if rc == 1:
+        return None
+    if rc != 0:
+        raise RunCmdError(rc, cmd, out, err)
+    return str(out[:40], "ascii")
+
+
+def pack_refs():
+    """Move every loose ref into `packed-refs`, so reading all refs reads one file."""
+    return output_of(_git("pack-refs", "--all"))
 
 
 def parent_revs_of(commitish: str):
     """Return list of str SHA1 hash of each parent commit of `commitish`."""
     rev = full_hash_of(commitish)
     parents_spec = "%s^@" % rev
-    return output_of(["git", "rev-parse", parents_spec]).split()
+    return output_of(_git("rev-parse", parents_spec), query=True).split()
+
+
+def preflight_replay(
+    newbase: str, old_base: str, tips: List[str]
+) -> Optional[ReplayError]:
+    """Return the |ReplayError| `replay_onto()` would raise, |None| if it would succeed.
+
+    Each commit is merged in memory as `replay_onto()` would, but no replacement commit
+    is made, so this reports whether, and on which commit, replaying `tips` from
+    `old_base` onto `newbase` would conflict without touching index, working tree, or
+    refs.
+    """
+    try:
+        _replay(newbase, old_base, tips, make_commits=False)
+    except ReplayError as e:
+        return e
+    return None
 
 
 def reachable_revs():
@@ -145,21 +517,283 @@ def reachable_revs():
     All references in the repository are included, including local, remote, and tag
     refs.
     """
-    return output_of(["git", "rev-list", "--all"]).split()
+    return output_of(_git("rev-list", "--all"), query=True).split()
 
 
 def rebase_onto(newbase: str, old_base: str, branch_name: str):
     """Rebase `branch_name` onto `newbase` exclusive of the commit at `old_base`."""
-    return output_of(
-        ["git", "rebase", "--onto", newbase, old_base, branch_name]
-    ).rstrip()
+    return output_of(_git("rebase", "--onto", newbase, old_base, branch_name)).rstrip()
+
+
+def read_tree_update(old_commit: str, new_commit: str):
+    """Move index and working tree from `old_commit` to `new_commit`, as checkout does.
+
+    HEAD is not moved, so this updates the working tree after the current branch has
+    been moved by other means. Raises |RunCmdError| if a local change would be lost.
+    """
+    return output_of(_git("read-tree", "-m", "-u", old_commit, new_commit))
+
+
+def ref_commit_hashes() -> Dict[str, str]:
+    """Return dict mapping the full name of each ref to the SHA1 hash of its commit.
+
+    Annotated tags are peeled to the commit they tag. Refs to anything other than a
+    commit are left out.
+    """
+    fmt = (
+        "%(refname) %(if)%(*objectname)%(then)%(*objecttype) %(*objectname)"
+        "%(else)%(objecttype) %(objectname)%(end)"
+    )
+    out = output_of(_git("for-each-ref", "--format=%s" % fmt), query=True)
+    hashes = {}
+    for line in out.splitlines():
+        refname, objecttype, sha = line.rsplit(" ", 2)
+        if objecttype == "commit":
+            hashes[refname] = sha
+    return hashes
+
+
+def ref_hashes() -> Dict[str, str]:
+    """Return dict mapping the full name of each ref to its str SHA1 hash."""
+    cmd = _git("for-each-ref", "--format=%(refname) %(objectname)")
+    out = output_of(cmd, query=True)
+    return dict(line.rsplit(" ", 1) for line in out.splitlines())
+
+
+def replay_onto(newbase: str, old_base: str, tips: List[str]) -> Dict[str, str]:
+    """Return dict mapping each replayed commit to the new commit replacing it.
+
+    Roughly `git replay --onto newbase old_base..tip` for all `tips` at once: each
+    commit descended from `old_base` and reachable from a tip, but not from `newbase`,
+    is replayed once, however many tips share it. `old_base` itself maps to `newbase`.
+    No ref, index, or working tree is changed. Raises |ReplayError| when a commit cannot
+    be replayed, in which case no commit is rewritten.
+    """
+    return _replay(newbase, old_base, tips, make_commits=True)
 
 
 def reset_hard_to(commit_ref: str):
     """Move current branch to `commit_ref`. Note this is potentially destructive."""
-    return output_of(["git", "reset", "--hard", commit_ref])
+    return output_of(_git("reset", "--hard", commit_ref))
+
+
+def rev_list_parents(revs: List[str]) -> List[Tuple[str, List[str]]]:
+    """Return (sha, parent_shas) pair for each commit listed by `git rev-list revs`."""
+    out = output_of(_git("rev-list", "--parents", *revs), query=True)
+    pairs = []
+    for line in out.splitlines():
+        sha, *parents = line.split()
+        pairs.append((sha, parents))
+    return pairs
 
 
 def rev_list(commitish: str):
     """Return list of str SHA1 hash of each commit reachable from `commitish`."""
-    return output_of(["git", "rev-list", commitish]).split()
+    return output_of(_git("rev-list", commitish), query=True).split()
+
+
+def update_refs(updates: List[Tuple[str, str, str]], message: str):
+    """Move each ref of `updates` in a single transaction, all or none.
+
+    `updates` is a sequence of (refname, new_sha, old_sha) triples, and a ref that no
+    longer points to its `old_sha` fails the whole transaction with |RunCmdError|.
+    `message` is recorded in the reflog of each ref moved.
+    """
+    lines = "".join("update %s %s %s\n" % update for update in updates)
+    cmd = _git("update-ref", "-m", message, "--stdin")
+    return output_of(cmd, input=lines.encode("utf-8"))
+
+
+def write_commit_graph():
+    """Write the commit-graph file of every reachable commit, with changed-path filters.
+
+    Git then walks history from the file instead of parsing each commit object.
+    """
+    cmd = _git("commit-graph", "write", "--reachable", "--changed-paths")
+    return output_of(cmd)
+
+
+def working_tree_dir():
+    """Return str absolute path of the top directory of the current worktree."""
+    return output_of(_git("rev-parse", "--show-toplevel"), query=True).strip()
+
+
+def worktree_branches() -> Dict[str, str]:
+    """Return dict mapping each checked-out branch name to the path of its worktree.
+
+    A worktree deleted without `git worktree remove`, or with HEAD detached, has no
+    entry. Returns an empty dict when there is no repository.
+    """
+    cmd = _git("worktree", "list", "--porcelain")
+    try:
+        out = output_of(cmd, query=True)
+    except RunCmdError:
+        return {}
+    branches = {}
+    for entry in out.split("\n\n"):
+        lines = entry.splitlines()
+        if not lines or any(line.startswith("prunable") for line in lines):
+            continue
+        for line in lines[1:]:
+            if line.startswith("branch refs/heads/"):
+                branches[line[len("branch refs/heads/") :]] = lines[0][
+                    len("worktree ") :
+                ]
+    return branches
+
+
+def worktree_of(branch_name: str) -> Optional[str]:
+    """Return str path of the worktree having `branch_name` checked out.
+
+    Returns |None| when the branch is not checked out in any worktree, its worktree has
+    been deleted without `git worktree remove`, or there is no repository.
+    """
+    return worktree_branches().get(branch_name)
+
+
+def _branch_commit_hashes() -> Dict[str, str]:
+    """Return dict mapping the name of each local branch to the hash of its commit."""
+    return {
+        refname[11:]: sha
+        for refname, sha in ref_commit_hashes().items()
+        if refname.startswith("refs/heads/")
+    }
+
+
+def _commit_graph():
+    """Return commit-graph index of the current repository, |None| if it has none."""
+    # --- imported here because the graph module is itself built on gitlib ---
+    from .graph import CommitGraph
+
+    return CommitGraph.load()
+
+
+def _discovered_git_dir() -> Optional[str]:
+    """Return path of the git dir of the current `Repo`, found without running git.
+
+    Follows the `.git` file of a linked worktree. Returns |None| when no `.git` is
+    found above the repository path, the one found holds no HEAD, or `$GIT_DIR` is set,
+    so git must be asked.
+    """
+    if "GIT_DIR" in os.environ:
+        return None
+    path = os.path.abspath(_current_repo.get().path or os.curdir)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.exists(dot_git):
+            break
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+    git_dir = dot_git
+    if os.path.isfile(dot_git):
+        with open(dot_git) as f:
+            line = f.readline().strip()
+        if not line.startswith("gitdir: "):
+            return None
+        git_dir = os.path.normpath(os.path.join(path, line[len("gitdir: ") :]))
+    return git_dir if os.path.isfile(os.path.join(git_dir, "HEAD")) else None
+
+
+def _git(*args: str) -> List[str]:
+    """Return command-line list that runs git with `args` in the current `Repo`."""
+    return _current_repo.get().git(*args)
+
+
+def _head_signature(git_dir: str) -> str:
+    """Return str identifying the commit HEAD of `git_dir` is at, without running git.
+
+    A branch moves by its loose ref file being replaced, or by `packed-refs` being
+    rewritten when it has no loose ref, so the file holding it identifies the commit.
+    """
+    with open(os.path.join(git_dir, "HEAD")) as f:
+        head = f.read().strip()
+    if not head.startswith("ref: "):
+        return head
+    common_dir = git_dir
+    try:
+        with open(os.path.join(git_dir, "commondir")) as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+    except OSError:
+        pass
+    for path in (head[len("ref: ") :], "packed-refs"):
+        try:
+            st = os.stat(os.path.join(common_dir, path))
+        except OSError:
+            continue
+        return "%s@%d:%d:%d" % (path, st.st_ino, st.st_size, st.st_mtime_ns)
+    return head[len("ref: ") :]
+
+
+def _index_signature(git_dir: str) -> str:
+    """Return str identifying the current state of the index file of `git_dir`."""
+    try:
+        st = os.stat(os.path.join(git_dir, "index"))
+    except OSError:
+        return "none"
+    return "%d:%d:%d" % (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _monitor_path(git_dir: str, name: str) -> str:
+    """Return path of file `name` in the fsmonitor directory of `git_dir`."""
+    return os.path.join(git_dir, "githelpers", "fsmonitor", name)
+
+
+def _replay(
+    newbase: str, old_base: str, tips: List[str], make_commits: bool
+) -> Dict[str, str]:
+    """Return dict mapping each commit replayed from `old_base` onto `newbase`.
+
+    Each commit is mapped to its replacement when `make_commits` is |True|, and to the
+    hash of the tree it would have otherwise. Raises |ReplayError| as for
+    `replay_onto()`.
+    """
+    cmd = _git("rev-parse", old_base, newbase)
+    old_base, newbase = output_of(cmd, query=True).split()
+    rewritten = {old_base: newbase}
+    if old_base == newbase:
+        return rewritten
+
+    trees = {old_base: "%s^{tree}" % newbase}
+    revs = ["^%s" % old_base, "^%s" % newbase] + sorted(set(tips))
+    for sha, parents, _, author_env, message in commit_records(revs):
+        if not any(parent in trees for parent in parents):
+            # --- not descended from `old_base`, as on a branch merged in ---
+            continue
+        if parents[0] not in trees:
+            raise ReplayError(sha, is_merge=True)
+        tree = _replayed_tree(sha, parents[0], trees[parents[0]])
+        if tree is None:
+            raise ReplayError(sha)
+        trees[sha] = tree
+        if make_commits:
+            new_parents = [rewritten.get(parent, parent) for parent in parents]
+            rewritten[sha] = commit_tree(tree, new_parents, message, author_env)
+        else:
+            rewritten[sha] = tree
+    return rewritten
+
+
+def _replayed_tree(commit: str, parent: str, new_tree: str) -> Optional[str]:
+    """Return hash of the tree of `commit` with its changes made to `new_tree`.
+
+    The changes are those `commit` makes to `parent`, its first parent, so they are
+    merged into `new_tree` with `parent` as the merge base. `git merge-tree` before git
+    2.40 has no way to name the merge base, so `new_tree` is merged as a new commit
+    having `parent` as its only parent, making `parent` the merge base git finds.
+    Returns |None| when the changes conflict.
+    """
+    ours = commit_tree(new_tree, [parent], "replay base", _SCRATCH_COMMIT_ENV)
+    return merge_tree(ours, commit)
+
+
+def _status_is_clean() -> bool:
+    """Return |True| when `git status` reports no change in the worktree or index."""
+    return output_bytes_of(_git("status", "--porcelain"), query=True) == b""
+
+
+def _with_option(option: str, values: List[str]) -> List[str]:
+    """Return list of `option` followed by each of `values` in turn."""
+    return [arg for value in values for arg in (option, value)]
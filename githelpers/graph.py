@@ -0,0 +1,447 @@
+# encoding: utf-8
+
+"""Persistent index of the commit graph, kept current by git hooks.
+
+`githelpers install-hooks` builds the index once, with a full walk, and installs hooks
+that append a delta record to a journal whenever commits are made or rewritten or a
+ref moves. Loading the index replays only the journal records written since it was
+last compacted, so its cost tracks the number of changes rather than the size of the
+history. Both files live in the `githelpers` directory of the git common dir:
+
+* `graph-index` is a snapshot of the index as of the last compaction.
+* `graph-journal` holds one record per line, appended by the hooks and by this module:
+
+    commit <sha> [<parent-sha> ...]   a commit was made
+    rewrite <old-sha> <new-sha>       a commit was amended or rebased
+    ref <old-sha> <new-sha> <ref>     a ref moved (an all-zero sha is "no commit")
+    live <sha>                        `sha` was found reachable
+    dead <sha>                        `sha` was found unreachable
+
+Only HEAD and refs under `refs/` are tracked, matching `git rev-list --all`. Git does
+not always report the old value of a deleted ref, so the value last recorded is used.
+A symbolic ref update, where git reports `ref:<name>` in place of a sha, is skipped;
+the ref it points to is recorded when that moves.
+
+A commit can only become unreachable when a ref moves off it, so each such "loss" is
+counted as the journal is replayed, and a commit found reachable stays known-reachable
+until the next loss.
+"""
+
+import marshal
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .bitmap import Bitmap
+from .gitlib import git_common_dir, is_ref_reachable, ref_hashes, rev_list_parents
+from .reach import CommitIndex, Reachability
+
+INDEX_VERSION = 2
+
+ZERO_SHA = "0" * 40
+
+# -- journal is folded into the snapshot once it grows to this many records --
+COMPACT_THRESHOLD = 4096
+
+# -- a tip's bitmap is found by walking its history down to tips with a bitmap, but a
+# -- walk visiting more commits than this gives way to a pass over the whole graph --
+WALK_LIMIT = 10000
+
+
+class CommitGraph:
+    """Commit-graph index: the parents and children of every commit ever indexed.
+
+    Commits are never removed once indexed, since a commit object never changes.
+    Whether a commit is still reachable from a ref is tracked separately and checked
+    with git only when a loss may have made it unreachable.
+    """
+
+    def __init__(self, index_dir: str):
+        self._index_dir = index_dir
+        self._parents: Dict[str, Tuple[str, ...]] = {}
+        self._children: Dict[str, List[str]] = {}
+        self._refs: Dict[str, str] = {}
+        self._dead: Set[str] = set()
+        self._live: Dict[str, int] = {}
+        self._losses = 0
+        self._journal_len = 0
+        self._commit_index: Optional[CommitIndex] = None
+        self._build_id = ""
+        self._bitmaps: Optional[Dict[str, Bitmap]] = None
+        self._rows: Optional[Dict[str, int]] = None
+
+    def __contains__(self, sha: str) -> bool:
+        return sha in self._parents
+
+    def __len__(self) -> int:
+        return len(self._parents)
+
+    @classmethod
+    def build(cls) -> "CommitGraph":
+        """Return new index of the current repository, built by a full history walk.
+
+        The new index is saved, replacing any existing index and journal.
+        """
+        graph = cls(cls._index_dir_path())
+        graph._build_id = os.urandom(8).hex()
+        graph._refs = ref_hashes()
+        for sha, parents in rev_list_parents(["--all"]):
+            graph._add_commit(sha, parents)
+        os.makedirs(graph._index_dir, exist_ok=True)
+        graph._save()
+        graph._bitmaps = {}
+        graph._bitmaps_of([sha for sha in graph._refs.values() if sha in graph])
+        return graph
+
+    @classmethod
+    def load(cls) -> Optional["CommitGraph"]:
+        """Return the index of the current repository, or |None| if it has none.
+
+        Records journaled since the index was last saved are applied, and the journal
+        is compacted into a new snapshot once it is long enough to be worth it.
+        """
+        index_dir = cls._index_dir_path()
+        graph = cls(index_dir)
+        try:
+            with open(graph._snapshot_path, "rb") as f:
+                state = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if state[0] != INDEX_VERSION:
+            return None
+        (
+            _,
+            graph._build_id,
+            graph._parents,
+            graph._children,
+            graph._refs,
+            graph._dead,
+            graph._live,
+            graph._losses,
+        ) = state
+
+        graph._replay(graph._read_journal())
+        if graph._journal_len >= COMPACT_THRESHOLD:
+            graph._save()
+        return graph
+
+    def containing_tips(
+        self, shas: Sequence[str], tips: Sequence[str]
+    ) -> Optional[List[List[int]]]:
+        """Return, for each of `shas`, list of index of each tip it is reachable from.
+
+        Answered by a bit lookup in the reachability bitmap of each tip, which is kept
+        beside the index and computed only for tips that have none, as after a ref
+        moves. Returns |None| when a tip is not indexed, meaning a ref moved without the
+        hooks reporting it, so the caller can fall back to asking git.
+        """
+        if not all(tip in self for tip in tips):
+            return None
+        bitmaps = self._bitmaps_of(tips)
+        tip_bitmaps = [bitmaps[tip] for tip in tips]
+        rows = self._row_of
+        containing = []
+        for sha in shas:
+            row = rows.get(sha)
+            containing.append(
+                []
+                if row is None
+                else [i for i, bitmap in enumerate(tip_bitmaps) if row in bitmap]
+            )
+        return containing
+
+    def live_children_of(self, sha: str) -> List[str]:
+        """Return list of str SHA1 hash of each child of `sha` reachable from a ref.
+
+        This matches what `git rev-list --all --children` reports for `sha`. Children
+        not confirmed reachable since the last loss are checked with git, one process
+        per child, and the result journaled.
+        """
+        children = []
+        for child in self._children.get(sha, []):
+            if child in self._dead:
+                continue
+            if self._live.get(child, -1) < self._losses:
+                if not is_ref_reachable(child):
+                    self._journal(["dead", child])
+                    self._dead.add(child)
+                    continue
+                self._journal(["live", child])
+                self._live[child] = self._losses
+            children.append(child)
+        return children
+
+    def parents_of(self, sha: str) -> Tuple[str, ...]:
+        """Return tuple of str SHA1 hash of each parent of `sha`, empty if unindexed."""
+        return self._parents.get(sha, ())
+
+    def reachability(self, tips: Sequence[str]) -> Optional[Reachability]:
+        """Return reachability of each indexed commit from each of `tips`.
+
+        Returns |None| when a tip is not indexed, meaning a ref moved without the hooks
+        reporting it, so the caller can fall back to asking git.
+        """
+        if not all(tip in self for tip in tips):
+            return None
+        if self._commit_index is None:
+            self._commit_index = CommitIndex(self._parents)
+        return self._commit_index.reachability(tips)
+
+    def _add_commit(self, sha: str, parents: Iterable[str]):
+        """Add commit `sha` having `parents` to the index, if not already present."""
+        if sha in self._parents:
+            return
+        self._commit_index = None
+        if self._rows is not None:
+            self._rows[sha] = len(self._parents)
+        parents = tuple(parents)
+        self._parents[sha] = parents
+        for parent in parents:
+            self._children.setdefault(parent, []).append(sha)
+
+    def _add_commits_reachable_from(self, tips: List[str]):
+        """Index the commits reachable from `tips` that are not yet indexed.
+
+        The walk is bounded by the ref tips already known to the index, so it visits
+        only the commits new since those refs were recorded.
+        """
+        known_tips = ["^%s" % sha for sha in set(self._refs.values()) if sha in self]
+        records = []
+        # --- a tip can be gone by now, pruned by `git gc` after its ref was deleted ---
+        for sha, parents in rev_list_parents(["--ignore-missing"] + tips + known_tips):
+            if sha not in self._parents:
+                records.append(["commit", sha] + parents)
+                self._add_commit(sha, parents)
+        self._journal(*records)
+
+    def _bitmap_by_walk(self, tip: str, bitmaps: Dict[str, Bitmap]) -> Optional[Bitmap]:
+        """Return reachability bitmap of `tip`, found by walking down its history.
+
+        The walk stops at each commit that has a bitmap, and at each commit in the
+        bitmap of one met earlier, since that bitmap holds all its history too. Returns
+        |None| when the walk goes on for more than WALK_LIMIT commits.
+        """
+        rows = self._row_of
+        found = Bitmap()
+        walked_rows: List[int] = []
+        stack, seen = [tip], {tip}
+        while stack:
+            sha = stack.pop()
+            bitmap = bitmaps.get(sha)
+            if bitmap is not None:
+                found |= bitmap
+                continue
+            row = rows[sha]
+            if row in found:
+                continue
+            walked_rows.append(row)
+            if len(walked_rows) > WALK_LIMIT:
+                return None
+            for parent in self._parents[sha]:
+                if parent in self._parents and parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+        return found | Bitmap.from_rows(walked_rows)
+
+    def _bitmaps_by_pass(self, tips: List[str]) -> Dict[str, Bitmap]:
+        """Return reachability bitmap of each of `tips`, in one pass."""
+        reachability = self.reachability(tips)
+        data = [bytearray((len(self) + 7) // 8) for _ in tips]
+        for row, sha in enumerate(self._parents):
+            bits = reachability.tips_reaching(sha)
+            while bits:
+                low = bits & -bits
+                data[low.bit_length() - 1][row >> 3] |= 1 << (row & 7)
+                bits ^= low
+        return {tip: Bitmap.from_bytes(tip_data) for tip, tip_data in zip(tips, data)}
+
+    def _bitmaps_of(self, tips: Sequence[str]) -> Dict[str, Bitmap]:
+        """Return the reachability bitmaps of the index, including one for each tip.
+
+        Bitmaps are computed for the tips that have none, those of commits no longer at
+        a ref or in `tips` are dropped, and the bitmaps saved when anything changed.
+        """
+        if self._bitmaps is None:
+            self._bitmaps = self._load_bitmaps()
+        bitmaps = self._bitmaps
+        missing = [tip for tip in dict.fromkeys(tips) if tip not in bitmaps]
+
+        # --- with no bitmap to stop at, every walk would run to the root commits ---
+        unwalked = missing if not bitmaps else []
+        for tip in [] if unwalked else missing:
+            bitmap = self._bitmap_by_walk(tip, bitmaps)
+            if bitmap is None:
+                unwalked.append(tip)
+            else:
+                bitmaps[tip] = bitmap
+        if unwalked:
+            bitmaps.update(self._bitmaps_by_pass(unwalked))
+
+        current = set(self._refs.values()).union(tips)
+        stale = [sha for sha in bitmaps if sha not in current]
+        for sha in stale:
+            del bitmaps[sha]
+
+        if missing or stale:
+            self._write(
+                self._bitmaps_path,
+                (
+                    INDEX_VERSION,
+                    self._build_id,
+                    {sha: bitmap.to_state() for sha, bitmap in bitmaps.items()},
+                ),
+            )
+        return bitmaps
+
+    @property
+    def _bitmaps_path(self) -> str:
+        return os.path.join(self._index_dir, "graph-bitmaps")
+
+    @staticmethod
+    def _index_dir_path() -> str:
+        """Return path of the directory holding the index for the current repository."""
+        return os.path.join(git_common_dir(), "githelpers")
+
+    def _journal(self, *records: List[str]):
+        """Append `records` to the journal."""
+        if not records:
+            return
+        with open(self._journal_path, "a") as f:
+            f.write("".join(" ".join(record) + "\n" for record in records))
+        self._journal_len += len(records)
+
+    @property
+    def _journal_path(self) -> str:
+        return os.path.join(self._index_dir, "graph-journal")
+
+    def _load_bitmaps(self) -> Dict[str, Bitmap]:
+        """Return the saved reachability bitmaps, empty if saved for another build."""
+        try:
+            with open(self._bitmaps_path, "rb") as f:
+                version, build_id, states = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+        if version != INDEX_VERSION or build_id != self._build_id:
+            return {}
+        return {sha: Bitmap.from_state(state) for sha, state in states.items()}
+
+    def _read_journal(self) -> List[List[str]]:
+        """Return list of the records in the journal, each a list of str fields."""
+        try:
+            with open(self._journal_path) as f:
+                records = [line.split() for line in f]
+        except OSError:
+            return []
+        self._journal_len = len(records)
+        return [record for record in records if record]
+
+    def _replay(self, records: List[List[str]]):
+        """Apply journal `records` to this index.
+
+        Commit records are applied first, since a ref transaction is journaled before
+        the post-commit hook reports the commit the ref now points to. Commits that
+        refs moved to but no hook reported, as after a fetch or rebase, are then
+        indexed by a walk bounded by the ref tips already known, as are the ancestors
+        of a reported commit whose parents are not yet indexed.
+        """
+        unindexed_tips: List[str] = []
+        for record in records:
+            if record[0] == "commit":
+                self._add_commit(record[1], record[2:])
+                # --- a commit made on a detached HEAD outside the index would leave
+                # --- its ancestors unindexed ---
+                unindexed_tips.extend(p for p in record[2:] if p not in self)
+
+        for record in records:
+            kind = record[0]
+            if kind == "rewrite":
+                self._losses += 1
+            elif kind == "ref":
+                old, new, refname = record[1], record[2], record[3]
+                if refname != "HEAD" and not refname.startswith("refs/"):
+                    continue
+                if old.startswith("ref:") or new.startswith("ref:"):
+                    continue
+                if old == ZERO_SHA:
+                    old = self._refs.get(refname, ZERO_SHA)
+                if self._ref_move_is_loss(old, new, refname):
+                    self._losses += 1
+                if new == ZERO_SHA:
+                    self._refs.pop(refname, None)
+                    continue
+                self._refs[refname] = new
+                if new not in self:
+                    unindexed_tips.append(new)
+                self._revive(new)
+            elif kind == "live":
+                self._live[record[1]] = self._losses
+            elif kind == "dead":
+                self._dead.add(record[1])
+
+        if unindexed_tips:
+            self._add_commits_reachable_from(unindexed_tips)
+            for tip in unindexed_tips:
+                self._revive(tip)
+
+    def _ref_move_is_loss(self, old: str, new: str, refname: str) -> bool:
+        """Return |True| if moving `refname` from `old` to `new` may strand commits.
+
+        Creating a ref, advancing it to a child commit, and moving it off a commit
+        another ref still points to cannot make any commit unreachable. Deleting a ref
+        (`new` is all zeros) may.
+        """
+        if old == ZERO_SHA or (new != ZERO_SHA and old in self.parents_of(new)):
+            return False
+        return not any(
+            sha == old for name, sha in self._refs.items() if name != refname
+        )
+
+    def _revive(self, sha: str):
+        """Clear the dead mark from `sha`, now a ref tip, and its dead ancestors."""
+        stack = [sha]
+        while stack:
+            sha = stack.pop()
+            if sha in self._dead:
+                self._dead.discard(sha)
+                stack.extend(self.parents_of(sha))
+
+    @property
+    def _row_of(self) -> Dict[str, int]:
+        """Row number of each indexed commit, its position in the order indexed.
+
+        Commits are only ever appended, so a commit keeps its row for the life of the
+        index, and the bitmap of a tip stays valid as later commits are indexed.
+        """
+        if self._rows is None:
+            self._rows = dict(zip(self._parents, range(len(self._parents))))
+        return self._rows
+
+    def _save(self):
+        """Write a snapshot of this index and clear the journal it now includes."""
+        state = (
+            INDEX_VERSION,
+            self._build_id,
+            self._parents,
+            self._children,
+            self._refs,
+            self._dead,
+            self._live,
+            self._losses,
+        )
+        self._write(self._snapshot_path, state)
+        try:
+            os.remove(self._journal_path)
+        except OSError:
+            pass
+        self._journal_len = 0
+
+    @property
+    def _snapshot_path(self) -> str:
+        return os.path.join(self._index_dir, "graph-index")
+
+    @staticmethod
+    def _write(path: str, state):
+        """Write `state` to the file at `path`, replacing it atomically."""
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            marshal.dump(state, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,79 @@
+# encoding: utf-8
+
+"""Binding of the Linux inotify API, through `ctypes` so there is nothing to install.
+
+`ctypes` is imported only when an `Inotify` instance is made, so a module importing
+this one for its event masks pays nothing for it.
+"""
+
+import os
+import struct
+from typing import List, Tuple
+
+# --- inotify event masks, from <sys/inotify.h> ---
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+# --- `struct inotify_event`, less the name of `len` bytes that follows it ---
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """Non-blocking inotify file descriptor and the watches added to it.
+
+    Raises |OSError| when inotify is not available, as on a platform other than Linux.
+    """
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Add watch for `mask` events on directory at `path`, returning its descriptor.
+
+        `path` may be str or bytes.
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(self._ctypes.get_errno(), "inotify_add_watch failed", path)
+        return wd
+
+    def close(self):
+        """Close the inotify file descriptor, removing every watch. Safe to repeat."""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def read_events(self) -> List[Tuple[int, int, bytes]]:
+        """Return (wd, mask, name) triple for each pending event, without blocking.
+
+        `name` is empty for an event on the watched directory itself.
+        """
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events, offset = [], 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, name))
+        return events
@@ -0,0 +1,257 @@
+# encoding: utf-8
+
+"""Reachability of indexed commits from many ref tips at once.
+
+`CommitIndex.reachability()` answers "which of these tips is each commit reachable
+from" for a whole list of tips in one pass, as a bitset per commit with bit `i` set
+when the commit is reachable from `tips[i]`.
+
+The index collapses each linear run of commits, where each commit has one parent and
+that parent has no other child, into a single segment. Every commit in a segment is
+reachable from the same tips, except for tips that point into the segment itself, so
+the bitsets are kept per segment, as one Python int each, and a pass costs one step
+per segment rather than one per commit. In a typical history most commits are in long
+runs between forks and merges, so that is several times fewer steps.
+
+Building the index is the costly part. With NumPy installed, the parents of each
+commit are put in CSR form (an offsets array and an indices array) and the segments
+found with whole-array operations. Without NumPy, a pure-Python build produces the
+same index. The pass itself stays in Python: a commit cannot be visited until all its
+children have been, so the pass is one long chain of dependent steps on the mainline
+of a real history and a frontier-at-a-time array walk spends more on per-step overhead
+than it saves.
+"""
+
+from itertools import chain
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# -- graphs with fewer commits than this are indexed in pure Python, which costs less
+# -- than importing NumPy --
+NUMPY_MIN_COMMITS = 20000
+
+
+class CommitIndex:
+    """Commit graph with each linear run of commits collapsed into a segment.
+
+    `parents` maps the str SHA1 hash of each commit to a tuple of its parent hashes.
+    Parents that are not themselves keys of `parents`, as at a shallow-clone boundary,
+    are left out. NumPy is used to build the index when it is installed and the graph
+    is large, unless `use_numpy` says otherwise.
+    """
+
+    def __init__(
+        self, parents: Dict[str, Tuple[str, ...]], use_numpy: Optional[bool] = None
+    ):
+        if use_numpy is None:
+            use_numpy = len(parents) >= NUMPY_MIN_COMMITS and _numpy() is not None
+        self._row_of = dict(zip(parents, range(len(parents))))
+        build = _segments_by_numpy if use_numpy else _segments_by_python
+        self._segment_of, self._position, self._segment_parents = build(
+            parents, self._row_of
+        )
+        self._order = _topological_order(self._segment_parents)
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def reachability(self, tips: Sequence[str]) -> "Reachability":
+        """Return reachability of each indexed commit from each of `tips`."""
+        tips_in_segment: Dict[int, List[Tuple[int, int]]] = {}
+        seeds: Dict[int, int] = {}
+        for i, tip in enumerate(tips):
+            row = self._row_of.get(tip)
+            if row is None:
+                continue
+            segment = self._segment_of[row]
+            tips_in_segment.setdefault(segment, []).append(
+                (self._position[row], 1 << i)
+            )
+            seeds[segment] = seeds.get(segment, 0) | 1 << i
+
+        # --- `incoming[s]` is the bitset of tips reaching segment `s` from above ---
+        incoming = [0] * len(self._segment_parents)
+        segment_parents = self._segment_parents
+        for segment in self._order:
+            bits = incoming[segment] | seeds.get(segment, 0)
+            if not bits:
+                continue
+            for parent in segment_parents[segment]:
+                incoming[parent] |= bits
+
+        return Reachability(self, incoming, tips_in_segment)
+
+
+class Reachability:
+    """Which of a list of tips each commit of a `CommitIndex` is reachable from."""
+
+    def __init__(
+        self,
+        index: CommitIndex,
+        incoming: List[int],
+        tips_in_segment: Dict[int, List[Tuple[int, int]]],
+    ):
+        self._index = index
+        self._incoming = incoming
+        self._tips_in_segment = tips_in_segment
+
+    def tips_reaching(self, sha: str) -> int:
+        """Return int bitset with bit `i` set when `sha` is reachable from `tips[i]`."""
+        row = self._index._row_of.get(sha)
+        if row is None:
+            return 0
+        segment = self._index._segment_of[row]
+        position = self._index._position[row]
+        bits = self._incoming[segment]
+        for tip_position, tip_bit in self._tips_in_segment.get(segment, ()):
+            if tip_position <= position:
+                bits |= tip_bit
+        return bits
+
+
+class _RowOf(dict):
+    """Row number of each commit, -1 for a commit that is not indexed."""
+
+    def __missing__(self, sha: str) -> int:
+        return -1
+
+
+def _numpy():
+    """Return the `numpy` module, or |None| when it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _segments_by_numpy(
+    parents: Dict[str, Tuple[str, ...]], row_of: Dict[str, int]
+) -> Tuple[List[int], List[int], List[List[int]]]:
+    """Return (segment_of, position, segment_parents) lists, built with NumPy.
+
+    Produces exactly what `_segments_by_python()` does. Segments are numbered in order
+    of their first row, `position` is the distance of a row below the first row of its
+    segment, and `segment_parents[s]` lists the segments holding the parents of the
+    last commit of segment `s`.
+    """
+    np = _numpy()
+    n = len(row_of)
+
+    # --- CSR adjacency: parents of row `r` are indices[offsets[r]:offsets[r + 1]] ---
+    degree = np.fromiter(map(len, parents.values()), dtype=np.int64, count=n)
+    indices = np.fromiter(
+        map(_RowOf(row_of).__getitem__, chain.from_iterable(parents.values())),
+        dtype=np.int64,
+        count=int(degree.sum()),
+    )
+    if (indices < 0).any():
+        owner = np.repeat(np.arange(n), degree)
+        known = indices >= 0
+        degree = np.bincount(owner[known], minlength=n)
+        indices = indices[known]
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(degree, out=offsets[1:])
+
+    # --- a row is linked to its parent when it is that parent's only child ---
+    child_count = np.bincount(indices, minlength=n)
+    first_parent = np.zeros(n, dtype=np.int64)
+    has_parent = degree > 0
+    first_parent[has_parent] = indices[offsets[:-1][has_parent]]
+    linked = degree == 1
+    linked[linked] = child_count[first_parent[linked]] == 1
+    above = np.full(n, -1, dtype=np.int64)
+    above[first_parent[linked]] = np.flatnonzero(linked)
+
+    # --- find the first row of each row's run by pointer jumping, each round
+    # --- doubling the distance jumped, so log(longest run) rounds in all ---
+    rows = np.arange(n)
+    head = np.where(above >= 0, above, rows)
+    position = (above >= 0).astype(np.int64)
+    while True:
+        next_head = head[head]
+        if (next_head == head).all():
+            break
+        position = position + position[head]
+        head = next_head
+
+    heads = np.flatnonzero(above < 0)
+    segment_of = np.empty(n, dtype=np.int64)
+    segment_of[heads] = np.arange(len(heads))
+    segment_of = segment_of[head]
+
+    # --- the parents of the last row of a segment each start a segment ---
+    tails = np.flatnonzero(~linked)
+    tail_of_segment = np.empty(len(heads), dtype=np.int64)
+    tail_of_segment[segment_of[tails]] = tails
+    tail_degree = degree[tail_of_segment]
+    starts = offsets[tail_of_segment]
+    segment_offsets = np.zeros(len(heads) + 1, dtype=np.int64)
+    np.cumsum(tail_degree, out=segment_offsets[1:])
+    positions = np.arange(int(segment_offsets[-1])) + np.repeat(
+        starts - segment_offsets[:-1], tail_degree
+    )
+    flat_parents = segment_of[indices[positions]].tolist()
+    bounds = segment_offsets.tolist()
+    segment_parents = [
+        flat_parents[bounds[s] : bounds[s + 1]] for s in range(len(heads))
+    ]
+
+    return segment_of.tolist(), position.tolist(), segment_parents
+
+
+def _segments_by_python(
+    parents: Dict[str, Tuple[str, ...]], row_of: Dict[str, int]
+) -> Tuple[List[int], List[int], List[List[int]]]:
+    """Return (segment_of, position, segment_parents) lists, built in pure Python."""
+    n = len(row_of)
+    parent_rows = [[row_of[p] for p in ps if p in row_of] for ps in parents.values()]
+    child_count = [0] * n
+    for row in chain.from_iterable(parent_rows):
+        child_count[row] += 1
+
+    below = [-1] * n
+    has_above = [False] * n
+    for row, rows in enumerate(parent_rows):
+        if len(rows) == 1 and child_count[rows[0]] == 1:
+            below[row] = rows[0]
+            has_above[rows[0]] = True
+
+    segment_of = [0] * n
+    position = [0] * n
+    tails = []
+    for head in range(n):
+        if has_above[head]:
+            continue
+        segment, row, distance = len(tails), head, 0
+        while True:
+            segment_of[row], position[row] = segment, distance
+            if below[row] < 0:
+                break
+            row, distance = below[row], distance + 1
+        tails.append(row)
+
+    segment_parents = [[segment_of[r] for r in parent_rows[t]] for t in tails]
+    return segment_of, position, segment_parents
+
+
+def _topological_order(parents: List[List[int]]) -> List[int]:
+    """Return list of the nodes of DAG `parents`, each before all of its parents."""
+    post_order: List[int] = []
+    visited = [False] * len(parents)
+    for root in range(len(parents)):
+        if visited[root]:
+            continue
+        visited[root] = True
+        stack = [(root, iter(parents[root]))]
+        while stack:
+            node, unvisited_parents = stack[-1]
+            for parent in unvisited_parents:
+                if not visited[parent]:
+                    visited[parent] = True
+                    stack.append((parent, iter(parents[parent])))
+                    break
+            else:
+                stack.pop()
+                post_order.append(node)
+    post_order.reverse()
+    return post_order
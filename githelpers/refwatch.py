@@ -0,0 +1,180 @@
+# encoding: utf-8
+
+"""Wait for HEAD or any ref of a repository to change, without polling git.
+
+On Linux the git directory, the `refs/` tree and `packed-refs` are watched with inotify
+(through the `ctypes` binding in `githelpers.inotify`), and a process waiting for a
+change uses no CPU at all until git writes a ref. Git writes a ref by renaming a lock
+file into place, so a rename into, or a delete from, a watched directory is a change.
+Elsewhere the same files are checked with `stat()` a few times a second.
+"""
+
+import os
+import select
+import sys
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .inotify import IN_CREATE, IN_DELETE, IN_ISDIR, IN_MOVED_FROM, IN_MOVED_TO, Inotify
+
+_WATCH_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# --- files directly in a git directory whose change is a ref change ---
+STATE_FILES = ("HEAD", "packed-refs")
+
+# --- seconds to wait for the rest of a burst of ref updates, as made by one command ---
+SETTLE_SECONDS = 0.02
+
+# --- seconds between checks when inotify is not available ---
+POLL_SECONDS = 0.25
+
+
+class RefWatcher(ABC):
+    """Waits for a change to HEAD or any ref in the git directories of a repository.
+
+    `git_dirs` are the git directory of the worktree and the common git directory,
+    which are the same directory outside a linked worktree.
+    """
+
+    def __init__(self, git_dirs: Sequence[str]):
+        self._git_dirs = sorted(set(git_dirs))
+
+    def __enter__(self) -> "RefWatcher":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @classmethod
+    def open(cls, git_dirs: Sequence[str]) -> "RefWatcher":
+        """Return an inotify watcher of `git_dirs` if possible, else a polling one."""
+        if sys.platform.startswith("linux"):
+            try:
+                return _InotifyWatcher(git_dirs)
+            except OSError:
+                pass
+        return _PollingWatcher(git_dirs)
+
+    def close(self):
+        """Release the resources held by this watcher."""
+
+    @abstractmethod
+    def wait(
+        self, timeout: Optional[float] = None, wake_fds: Sequence[int] = ()
+    ) -> bool:
+        """Return |True| when a ref changes, |False| on `timeout` or a wake-up.
+
+        Any of `wake_fds` becoming readable ends the wait early, as a self-pipe written
+        by a signal handler does. Its content is left for the caller to read.
+        """
+
+
+class _InotifyWatcher(RefWatcher):
+    """Watcher blocking on an inotify file descriptor."""
+
+    def __init__(self, git_dirs: Sequence[str]):
+        super(_InotifyWatcher, self).__init__(git_dirs)
+        self._inotify = Inotify()
+        self._refs_dirs: Dict[int, str] = {}
+        self._top_dirs: Dict[int, str] = {}
+        try:
+            for git_dir in self._git_dirs:
+                self._top_dirs[self._inotify.add_watch(git_dir, _WATCH_MASK)] = git_dir
+                self._watch_tree(os.path.join(git_dir, "refs"))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        self._inotify.close()
+
+    def wait(
+        self, timeout: Optional[float] = None, wake_fds: Sequence[int] = ()
+    ) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            fd = self._inotify.fd
+            ready, _, _ = select.select([fd] + list(wake_fds), [], [], remaining)
+            if fd not in ready:
+                return False
+            if self._read_changes():
+                # --- let the rest of a burst of updates land before reporting ---
+                while select.select([fd], [], [], SETTLE_SECONDS)[0]:
+                    self._read_changes()
+                return True
+
+    def _read_changes(self) -> bool:
+        """Return |True| when the pending events include a change to a ref."""
+        changed = False
+        for wd, mask, raw_name in self._inotify.read_events():
+            name = os.fsdecode(raw_name)
+            if wd in self._top_dirs:
+                changed = changed or name in STATE_FILES
+                continue
+            if wd not in self._refs_dirs or name.endswith(".lock"):
+                continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch_tree(os.path.join(self._refs_dirs[wd], name))
+            changed = True
+        return changed
+
+    def _watch_tree(self, path: str):
+        """Watch the directory at `path` and each directory below it."""
+        for dirpath, _, _ in os.walk(path):
+            try:
+                self._refs_dirs[self._inotify.add_watch(dirpath, _WATCH_MASK)] = dirpath
+            except OSError:
+                # --- removed before it could be watched, as by `git pack-refs` ---
+                continue
+
+
+class _PollingWatcher(RefWatcher):
+    """Watcher checking the ref files with `stat()` every `POLL_SECONDS`."""
+
+    def __init__(self, git_dirs: Sequence[str]):
+        super(_PollingWatcher, self).__init__(git_dirs)
+        self._state = self._snapshot()
+
+    def wait(
+        self, timeout: Optional[float] = None, wake_fds: Sequence[int] = ()
+    ) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            interval = (
+                POLL_SECONDS if remaining is None else min(remaining, POLL_SECONDS)
+            )
+            if wake_fds and select.select(list(wake_fds), [], [], interval)[0]:
+                return False
+            if not wake_fds:
+                time.sleep(interval)
+            state = self._snapshot()
+            if state != self._state:
+                self._state = state
+                return True
+
+    def _snapshot(self) -> List[Tuple[str, int, int, int]]:
+        """Return (path, inode, size, mtime) of each ref file, identifying the refs."""
+        paths = [
+            os.path.join(git_dir, name)
+            for git_dir in self._git_dirs
+            for name in STATE_FILES
+        ]
+        for git_dir in self._git_dirs:
+            for dirpath, dirnames, filenames in os.walk(os.path.join(git_dir, "refs")):
+                dirnames.sort()
+                paths.extend(os.path.join(dirpath, name) for name in sorted(filenames))
+        state = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            state.append((path, st.st_ino, st.st_size, st.st_mtime_ns))
+        return state
@@ -1,13 +1,34 @@
 # encoding: utf-8
 
-"""Wrapper around subprocess, providing command execution services."""
+"""Wrapper around subprocess, providing command execution services.
 
-from subprocess import PIPE, Popen
-from typing import Sequence, Tuple, Union
+A command can be bounded by a deadline, a maximum number of bytes of output, and a
+`CancelToken`. When any bound is hit the child is killed and reaped, and the call
+raises. Bounds are given per call or, for every command run within a `with` block, by
+a `Limits` object, which is how they reach the commands run by the gitlib functions.
+
+A git command run with `query=True`, as gitlib runs each command that only reads the
+repository, has the settings of the current `QueryPolicy` applied, so it takes no
+optional locks, writes no index refresh, and produces output in the C locale.
+"""
+
+import os
+import selectors
+import threading
+import time
+from contextvars import ContextVar, Token
+from subprocess import PIPE, Popen, TimeoutExpired
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Type, Union
 
 
 Args = Union[Sequence[str], str]
 
+# --- seconds between checks of a cancel token while waiting on a command ---
+CANCEL_POLL_INTERVAL = 0.05
+
+# --- bytes written to a command's stdin at once, never blocking when it is writable ---
+PIPE_BUF = 512
+
 
 class RunCmdError(Exception):
     """Base class for exceptions in `runcmd` module."""
@@ -26,33 +47,424 @@ class RunCmdError(Exception):
         )
 
 
-def run(args: Args) -> Tuple[int, bytes, bytes]:
+class RunCmdCancelled(RunCmdError):
+    """Raised when a command is killed because its `CancelToken` was cancelled."""
+
+    def __str__(self):
+        return "Command '%s' was cancelled" % (self._cmd,)
+
+
+class RunCmdOutputLimit(RunCmdError):
+    """Raised when a command is killed for writing more output than allowed."""
+
+    def __str__(self):
+        return "Command '%s' exceeded its output limit" % (self._cmd,)
+
+
+class RunCmdTimeout(RunCmdError):
+    """Raised when a command is killed for running past its deadline."""
+
+    def __str__(self):
+        return "Command '%s' did not finish before its deadline" % (self._cmd,)
+
+
+class CancelToken:
+    """Flag, set from any thread, that stops commands being run under it.
+
+    A command running under a cancelled token is killed within `CANCEL_POLL_INTERVAL`
+    seconds, and commands started after cancellation are not run at all.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Cancel the commands running, or yet to run, under this token."""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """|True| once `.cancel()` has been called."""
+        return self._event.is_set()
+
+
+class Limits:
+    """Bounds on each command run within a `with` block.
+
+    `timeout` is in seconds from when the `Limits` is created, making a deadline shared
+    by every command in the block rather than an allowance for each. `max_output` is
+    the most bytes a command may write to stdout and stderr combined. The binding is
+    per-thread (strictly, per-context), like `gitlib.Repo`, and nested blocks combine,
+    the tighter of each bound applying.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        max_output: Optional[int] = None,
+        cancel: Optional[CancelToken] = None,
+    ):
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.max_output = max_output
+        self.cancel = cancel
+        self._tokens: List[Token] = []
+
+    def __enter__(self) -> "Limits":
+        self._tokens.append(_current_limits.set(self._within(_current_limits.get())))
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_limits.reset(self._tokens.pop())
+
+    @property
+    def is_bounded(self) -> bool:
+        """|True| when at least one bound is set."""
+        return not (
+            self.deadline is None and self.max_output is None and self.cancel is None
+        )
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, |None| when there is no deadline."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def _within(self, outer: "Limits") -> "Limits":
+        """Return limits combining these with `outer`, the tighter of each applying."""
+        combined = Limits(max_output=_min(self.max_output, outer.max_output))
+        combined.deadline = _min(self.deadline, outer.deadline)
+        combined.cancel = self.cancel
+        if outer.cancel is not None and outer.cancel is not self.cancel:
+            combined.cancel = (
+                outer.cancel
+                if self.cancel is None
+                else _AnyCancelled(self.cancel, outer.cancel)
+            )
+        return combined
+
+
+_current_limits = ContextVar("_current_limits", default=Limits())
+
+
+class QueryPolicy:
+    """Settings applied to each git command run as a read-only query.
+
+    `git_options` are inserted before the git subcommand and `env` is merged into the
+    environment of the command. Commands that change the repository are never run as
+    queries, so they keep the user's own settings. Used as a context manager, the
+    policy applies to the queries run within the `with` block, per-thread (strictly,
+    per-context) like `Limits`. Otherwise the policy is `QueryPolicy.tuned()`, unless
+    the environment variable `GITHELPERS_QUERY_POLICY` is set to "user".
+    """
+
+    def __init__(
+        self,
+        git_options: Sequence[str] = (),
+        env: Optional[Dict[str, str]] = None,
+    ):
+        self.git_options = list(git_options)
+        self.env = dict(env or {})
+        self._tokens: List[Token] = []
+
+    def __enter__(self) -> "QueryPolicy":
+        self._tokens.append(_current_query_policy.set(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_query_policy.reset(self._tokens.pop())
+
+    @classmethod
+    def from_environ(cls) -> "QueryPolicy":
+        """Return the policy named by `$GITHELPERS_QUERY_POLICY`, tuned by default."""
+        if os.environ.get("GITHELPERS_QUERY_POLICY") == "user":
+            return cls.user()
+        return cls.tuned()
+
+    @classmethod
+    def tuned(cls) -> "QueryPolicy":
+        """Return policy running queries without optional locks, pager, or color.
+
+        Without optional locks, `git status` does not write the refreshed index back,
+        so a query never contends for `index.lock` with a command the user is running.
+        """
+        return cls(
+            git_options=["--no-pager", "--no-optional-locks", "-c", "color.ui=never"],
+            env={"GIT_OPTIONAL_LOCKS": "0", "LC_ALL": "C"},
+        )
+
+    @classmethod
+    def user(cls) -> "QueryPolicy":
+        """Return policy running queries with the user's own settings."""
+        return cls()
+
+    def command(self, args: Args) -> Tuple[Args, Optional[Dict[str, str]]]:
+        """Return (args, env) pair running the command-line `args` under this policy.
+
+        `env` is |None| when the command inherits the environment unchanged. Only a git
+        command given as a list of arguments is changed.
+        """
+        if isinstance(args, str) or not args or args[0] != "git":
+            return args, None
+        args = ["git"] + self.git_options + list(args[1:])
+        return args, dict(os.environ, **self.env) if self.env else None
+
+
+_current_query_policy = ContextVar(
+    "_current_query_policy", default=QueryPolicy.from_environ()
+)
+
+
+def run(
+    args: Args,
+    timeout: Optional[float] = None,
+    max_output: Optional[int] = None,
+    cancel: Optional[CancelToken] = None,
+    query: bool = False,
+    env: Optional[Dict[str, str]] = None,
+    input: Optional[bytes] = None,
+) -> Tuple[int, bytes, bytes]:
     """Return (rc, out, err) 3-tuple indicating result of running the command in *args*.
 
     *rc*, *out*, and *err* are the return code, output on stdout, and output on stderr,
-    respectively.
+    respectively. The command is bounded by *timeout*, *max_output*, and *cancel*, as
+    for `Limits`, and by the `Limits` of any enclosing `with` block. Raises
+    |RunCmdTimeout|, |RunCmdOutputLimit| or |RunCmdCancelled| after killing the command
+    when a bound is hit. A *query* command, one that only reads the repository, is run
+    under the current `QueryPolicy`. *env* is added to the environment of the command
+    and *input*, when given, is written to its stdin.
     """
-    process = Popen(args, stdout=PIPE, stderr=PIPE)
-    out, err = process.communicate()
-    rc = process.returncode
-    return rc, out, err
+    limits = _limits_of(args, timeout, max_output, cancel)
+    args, env = _command(args, query, env)
+    stdin = None if input is None else PIPE
+    process = Popen(args, stdin=stdin, stdout=PIPE, stderr=PIPE, env=env)
+    if not limits.is_bounded:
+        out, err = process.communicate(input)
+        return process.returncode, out, err
+    return _communicate_within(process, args, limits, input)
 
 
-def output_of(args: Args) -> str:
-    """Return the output written to stdout by the command line in *args*.
+def output_bytes_of(args: Args, **options) -> bytes:
+    """Return the undecoded output written to stdout by the command line in *args*.
 
-    Raises |RunCmdError| if the return code is not zero.
+    Raises |RunCmdError| if the return code is not zero. *options* are any of the
+    `timeout`, `max_output`, `cancel`, `query`, `env`, and `input` keyword arguments of
+    `run()`.
     """
-    rc, out, err = run(args)
+    rc, out, err = run(args, **options)
     if rc != 0:
         raise RunCmdError(rc, args, out, err)
-    return str(out, encoding="utf-8")
+    return out
+
+
+def output_lines_of(
+    args: Args,
+    timeout: Optional[float] = None,
+    max_output: Optional[int] = None,
+    cancel: Optional[CancelToken] = None,
+    query: bool = False,
+    env: Optional[Dict[str, str]] = None,
+) -> Iterator[str]:
+    """Generate each line written to stdout by the command line in *args*, as written.
+
+    Each line keeps its newline. The command is bounded as for `run()`, and is killed,
+    raising the same errors, when a bound is hit between lines. Its stderr is not
+    captured, going to that of this process. Raises |RunCmdError| after the last line
+    if the return code is not zero. Closing the generator before the last line kills
+    the command.
+    """
+    limits = _limits_of(args, timeout, max_output, cancel)
+    args, env = _command(args, query, env)
+    # --- unbuffered, so each read is a single read of the pipe and the stream is
+    # --- never holding data while the pipe is waited on ---
+    process = Popen(args, bufsize=0, stdout=PIPE, env=env)
+    assert process.stdout is not None
+    pending = b""
+    total = 0
+    error: Optional[Type[RunCmdError]] = None
+
+    try:
+        while error is None:
+            wait = limits.remaining()
+            if limits.cancel is not None:
+                wait = _min(wait, CANCEL_POLL_INTERVAL)
+            if limits.is_bounded and not _wait_readable(process.stdout, wait):
+                error = _bound_hit(limits, total)
+                continue
+            data = process.stdout.read(65536)
+            if not data:
+                break
+            total += len(data)
+            error = _bound_hit(limits, total)
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines if error is None else ():
+                yield str(line, encoding="utf-8") + "\n"
+        if pending and error is None:
+            yield str(pending, encoding="utf-8")
+        if error is None:
+            try:
+                process.wait(limits.remaining())
+            except TimeoutExpired:
+                error = RunCmdTimeout
+    finally:
+        if process.returncode is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
 
+    if error is not None:
+        raise error(process.returncode, args, b"", b"")
+    if process.returncode != 0:
+        raise RunCmdError(process.returncode, args, b"", b"")
 
-def return_code_of(args: Args) -> int:
+
+def output_of(args: Args, **options) -> str:
+    """Return the output written to stdout by the command line in *args*.
+
+    Raises |RunCmdError| if the return code is not zero. *options* are as for
+    `output_bytes_of()`.
+    """
+    return str(output_bytes_of(args, **options), encoding="utf-8")
+
+
+def return_code_of(args: Args, **options) -> int:
     """Return the exit code returned from executing the command line in *args*.
 
-    All stdout and stderr output is suppressed.
+    All stdout and stderr output is suppressed. *options* are as for `output_of()`.
     """
-    rc, _, _ = run(args)
+    rc, _, _ = run(args, **options)
     return rc
+
+
+class _AnyCancelled:
+    """Cancel token that is cancelled when either of two tokens is."""
+
+    def __init__(self, first: CancelToken, second: CancelToken):
+        self._tokens = (first, second)
+
+    @property
+    def cancelled(self) -> bool:
+        return any(token.cancelled for token in self._tokens)
+
+
+def _command(
+    args: Args, query: bool, env: Optional[Dict[str, str]]
+) -> Tuple[Args, Optional[Dict[str, str]]]:
+    """Return (args, env) pair to start the command in *args* with, as for `run()`."""
+    extra_env = dict(env or {})
+    env = None
+    if query:
+        args, env = _current_query_policy.get().command(args)
+    if extra_env:
+        env = dict(env or os.environ, **extra_env)
+    return args, env
+
+
+def _communicate_within(
+    process: Popen, args: Args, limits: Limits, input: Optional[bytes] = None
+) -> Tuple[int, bytes, bytes]:
+    """Return (rc, out, err) of `process`, killing it if it exceeds `limits`.
+
+    `input`, when given, is written to the stdin of `process` as it can accept it.
+    """
+    chunks = {process.stdout: [], process.stderr: []}
+    pending = memoryview(input or b"")
+    total = 0
+    error: Optional[Type[RunCmdError]] = None
+
+    with selectors.DefaultSelector() as selector:
+        for stream in chunks:
+            selector.register(stream, selectors.EVENT_READ)
+        if process.stdin is not None:
+            selector.register(process.stdin, selectors.EVENT_WRITE)
+        while selector.get_map() and error is None:
+            wait = limits.remaining()
+            if limits.cancel is not None:
+                wait = _min(wait, CANCEL_POLL_INTERVAL)
+            for key, _ in selector.select(None if wait is None else max(wait, 0)):
+                if key.fileobj is process.stdin:
+                    pending = _write_some(process.stdin, pending)
+                    if not pending:
+                        selector.unregister(process.stdin)
+                        process.stdin.close()
+                    continue
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    continue
+                chunks[key.fileobj].append(data)
+                total += len(data)
+            error = _bound_hit(limits, total)
+
+    if error is None:
+        try:
+            process.wait(limits.remaining())
+        except TimeoutExpired:
+            error = RunCmdTimeout
+    if error is not None:
+        process.kill()
+        process.wait()
+    for stream in list(chunks) + [process.stdin]:
+        if stream is not None:
+            stream.close()
+
+    out, err = (b"".join(chunks[stream]) for stream in chunks)
+    if error is not None:
+        raise error(process.returncode, args, out, err)
+    return process.returncode, out, err
+
+
+def _bound_hit(limits: Limits, total: int) -> Optional[Type[RunCmdError]]:
+    """Return the error class for the first of `limits` reached, |None| if none is."""
+    if limits.cancel is not None and limits.cancel.cancelled:
+        return RunCmdCancelled
+    if limits.max_output is not None and total > limits.max_output:
+        return RunCmdOutputLimit
+    remaining = limits.remaining()
+    if remaining is not None and remaining <= 0:
+        return RunCmdTimeout
+    return None
+
+
+def _limits_of(
+    args: Args,
+    timeout: Optional[float],
+    max_output: Optional[int],
+    cancel: Optional[CancelToken],
+) -> Limits:
+    """Return the limits on the command in *args*, those given within the current ones.
+
+    Raises |RunCmdCancelled| when they are already cancelled.
+    """
+    limits = _current_limits.get()
+    if timeout is not None or max_output is not None or cancel is not None:
+        limits = Limits(timeout, max_output, cancel)._within(limits)
+    if limits.cancel is not None and limits.cancel.cancelled:
+        raise RunCmdCancelled(-1, args, b"", b"")
+    return limits
+
+
+def _min(a, b):
+    """Return the lesser of `a` and `b`, either of which may be |None| for no bound."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def _wait_readable(stream, wait: Optional[float]) -> bool:
+    """Return |True| once `stream` is readable, |False| if `wait` seconds pass first."""
+    with selectors.DefaultSelector() as selector:
+        selector.register(stream, selectors.EVENT_READ)
+        return bool(selector.select(None if wait is None else max(wait, 0)))
+
+
+def _write_some(stream, data: memoryview) -> memoryview:
+    """Write what `stream` will accept of `data`, returning the part left unwritten.
+
+    A command that exits without reading all its input leaves nothing more to write.
+    """
+    try:
+        return data[os.write(stream.fileno(), data[:PIPE_BUF]) :]
+    except BrokenPipeError:
+        return data[:0]
@@ -0,0 +1,32 @@
+# encoding: utf-8
+
+"""Entry point for the `githelpers` command, which dispatches to a subcommand.
+
+Each subcommand lives in its own module and is only imported when it is invoked, so
+adding subcommands does not slow down the startup of the others.
+"""
+
+import importlib
+import sys
+from typing import List, Optional
+
+# -- subcommand name -> module in `githelpers.scripts` providing its `main()` --
+SUBCOMMANDS = {
+    "doctor": "doctor",
+    "fleet": "fleet",
+    "fsmonitor": "fsmonitor",
+    "install-hooks": "install_hooks",
+    "search-index": "search_index",
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for 'githelpers' script."""
+    args = sys.argv[1:] if argv is None else argv[1:]
+    if not args or args[0] not in SUBCOMMANDS:
+        print("usage: githelpers {%s} ..." % ",".join(sorted(SUBCOMMANDS)))
+        return 1
+
+    subcommand = args[0]
+    module = importlib.import_module("githelpers.scripts.%s" % SUBCOMMANDS[subcommand])
+    return module.main(["githelpers %s" % subcommand] + args[1:])
@@ -0,0 +1,241 @@
+# encoding: utf-8
+
+"""Check the current repository for the git accelerators the helpers rely on.
+
+    usage: githelpers doctor [--fix]
+
+Times the gitlib queries the helpers run most, then reports each accelerator git can
+use to answer them that the repository lacks: a commit-graph file with changed-path
+filters for history walks, packed refs for reading every ref, and the untracked cache
+and an fsmonitor watcher for `is_clean()`. With `--fix`, the missing accelerators are
+added and the queries timed again, so the gain can be seen. A watcher is only
+suggested, since it keeps running after the command exits.
+"""
+
+import os
+import struct
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+
+from .exceptions import ExecutionError
+from .. import fsmonitor
+from ..gitlib import (
+    branches_containing,
+    config_value,
+    enable_untracked_cache,
+    git_common_dir,
+    git_dir,
+    git_path,
+    is_clean,
+    is_git_repo,
+    pack_refs,
+    ref_commit_hashes,
+    rev_list,
+    write_commit_graph,
+)
+from ..runcmd import RunCmdError
+
+# --- number of loose refs above which reading every ref is worth packing them ---
+LOOSE_REF_LIMIT = 100
+
+# --- values git reads as false in a boolean config variable ---
+FALSE_VALUES = ("false", "no", "off", "0", "")
+
+# --- times each query is run, the best time being reported ---
+REPEAT = 5
+
+QUERIES: List[Tuple[str, Callable[[], object]]] = [
+    ("is_clean", is_clean),
+    ("ref_commit_hashes", ref_commit_hashes),
+    ("branches_containing HEAD", lambda: branches_containing("HEAD")),
+    ("rev_list HEAD", lambda: rev_list("HEAD")),
+]
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for 'githelpers doctor' subcommand."""
+    args = sys.argv[1:] if argv is None else argv[1:]
+    if args not in ([], ["--fix"]):
+        print("usage: githelpers doctor [--fix]")
+        return 1
+
+    try:
+        _doctor(fix=bool(args))
+    except ExecutionError as e:
+        print(e.message, file=sys.stderr)
+        return e.return_code
+    return 0
+
+
+def _check_commit_graph() -> Optional[str]:
+    """Return problem with the commit-graph file of the repository, if any."""
+    info_dir = os.path.join(git_common_dir(), "objects", "info")
+    graph_path = os.path.join(info_dir, "commit-graph")
+    if os.path.exists(graph_path):
+        graph_paths = [graph_path]
+    else:
+        chain_dir = os.path.join(info_dir, "commit-graphs")
+        try:
+            with open(os.path.join(chain_dir, "commit-graph-chain")) as f:
+                hashes = f.read().split()
+        except OSError:
+            return "missing"
+        graph_paths = [os.path.join(chain_dir, "graph-%s.graph" % h) for h in hashes]
+    if not all(b"BDAT" in _graph_chunk_ids(path) for path in graph_paths):
+        return "has no changed-path filters"
+    return None
+
+
+def _check_fsmonitor() -> Optional[str]:
+    """Return problem when no fsmonitor watches the worktree, |None| otherwise."""
+    if fsmonitor.is_running(git_dir()):
+        return None
+    # --- a hook command, or `true` for git's own daemon, is another kind of watcher ---
+    setting = config_value("core.fsmonitor")
+    if setting is not None and setting.lower() not in FALSE_VALUES:
+        return None
+    return "not running; start it with `githelpers fsmonitor start`"
+
+
+def _check_packed_refs() -> Optional[str]:
+    """Return problem when more than `LOOSE_REF_LIMIT` refs are loose, if so."""
+    count = 0
+    for _, _, filenames in os.walk(os.path.join(git_common_dir(), "refs")):
+        count += len(filenames)
+    if count > LOOSE_REF_LIMIT:
+        return "%d loose refs" % count
+    return None
+
+
+def _check_untracked_cache() -> Optional[str]:
+    """Return problem when the index has no untracked cache, |None| otherwise."""
+    setting = _untracked_cache_setting()
+    if setting is True:
+        return None
+    if setting is False:
+        return "disabled by core.untrackedCache; unset it to allow one"
+    hash_size = 32 if config_value("extensions.objectFormat") == "sha256" else 20
+    extensions = _index_extensions(git_path("index"), hash_size)
+    if extensions is None or b"UNTR" in extensions:
+        return None
+    return "missing"
+
+
+def _doctor(fix: bool):
+    """Report the missing accelerators and query timings, adding them when `fix`."""
+    if not is_git_repo():
+        raise ExecutionError("Not in a Git repository.\nAborting.", 2)
+
+    # --- (name, check, fix) of each accelerator, a fix of |None| only suggested; the
+    # --- user's own core.untrackedCache=false would override adding the cache ---
+    untracked_fix = enable_untracked_cache
+    if _untracked_cache_setting() is False:
+        untracked_fix = None
+    checks: List[Tuple[str, Callable[[], Optional[str]], Optional[Callable]]] = [
+        ("commit-graph", _check_commit_graph, write_commit_graph),
+        ("packed refs", _check_packed_refs, pack_refs),
+        ("untracked cache", _check_untracked_cache, untracked_fix),
+        ("fsmonitor", _check_fsmonitor, None),
+    ]
+
+    before = _timings()
+    problems = [(name, check(), fixer) for name, check, fixer in checks]
+    for name, problem, _ in problems:
+        print("%-18s %s" % (name, problem or "ok"))
+    fixers = [(name, fixer) for name, problem, fixer in problems if problem and fixer]
+
+    if not (fix and fixers):
+        print()
+        _print_timings(before)
+        if fixers:
+            print("\nRun `githelpers doctor --fix` to add the missing accelerators.")
+        return
+
+    print()
+    for name, fixer in fixers:
+        print("Adding %s ..." % name)
+        try:
+            fixer()
+        except RunCmdError as e:
+            raise ExecutionError("Could not add %s:\n%s\nAborting." % (name, e), 4)
+    print()
+    _print_timings(before, _timings())
+
+
+def _graph_chunk_ids(path: str) -> List[bytes]:
+    """Return the id of each chunk in the commit-graph file at `path`."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(8)
+            if header[:4] != b"CGPH":
+                return []
+            table = f.read(header[6] * 12)
+    except OSError:
+        return []
+    return [table[offset : offset + 4] for offset in range(0, len(table), 12)]
+
+
+def _index_extensions(index_path: str, hash_size: int) -> Optional[List[bytes]]:
+    """Return the signature of each extension in the index file at `index_path`.
+
+    Returns |None| for an index in version 4, whose path-compressed entries are not
+    parsed, and an empty list when there is no index.
+    """
+    try:
+        with open(index_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+    if data[:4] != b"DIRC":
+        return []
+    version, count = struct.unpack_from(">II", data, 4)
+    if version not in (2, 3):
+        return None
+
+    # --- each entry is padded with 1 to 8 NULs to a multiple of 8 bytes ---
+    offset = 12
+    for _ in range(count):
+        (flags,) = struct.unpack_from(">H", data, offset + 40 + hash_size)
+        name_start = offset + 42 + hash_size + (2 if flags & 0x4000 else 0)
+        offset += (data.index(b"\0", name_start) - offset + 8) // 8 * 8
+
+    extensions = []
+    while offset + 8 <= len(data) - hash_size:
+        signature, size = struct.unpack_from(">4sI", data, offset)
+        extensions.append(signature)
+        offset += 8 + size
+    return extensions
+
+
+def _print_timings(before: List[float], after: Optional[List[float]] = None):
+    """Print the time of each query, beside its time after the fixes when given."""
+    if after is None:
+        print("%-26s %12s" % ("query", "time (ms)"))
+        for (name, _), ms in zip(QUERIES, before):
+            print("%-26s %12.2f" % (name, ms))
+        return
+    print("%-26s %12s %12s" % ("query", "before (ms)", "after (ms)"))
+    for (name, _), before_ms, after_ms in zip(QUERIES, before, after):
+        print("%-26s %12.2f %12.2f" % (name, before_ms, after_ms))
+
+
+def _timings() -> List[float]:
+    """Return best-of-REPEAT wall time of each query in `QUERIES`, in milliseconds."""
+    timings = []
+    for _, query in QUERIES:
+        best = float("inf")
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            query()
+            best = min(best, time.perf_counter() - start)
+        timings.append(best * 1000)
+    return timings
+
+
+def _untracked_cache_setting() -> Optional[bool]:
+    """Return the boolean value of core.untrackedCache, |None| when unset or `keep`."""
+    setting = config_value("core.untrackedCache")
+    if setting is None or setting.lower() == "keep":
+        return None
+    return setting.lower() not in FALSE_VALUES
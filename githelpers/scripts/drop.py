@@ -3,7 +3,12 @@
 """Remove a commit from its branch.
 
 Exits with an error message if the commit is reachable from more than one local branch
-or has other than one parent commit.
+or has other than one parent commit. With `--all`, the commit is removed from every
+local branch it is reachable from: the history shared by those branches is replayed
+once, without touching the working tree, and each branch is moved to its rewritten tip
+in a single `git update-ref` transaction, so either every branch moves or none does.
+A branch checked out in another worktree is not moved under it; `--all` exits with an
+error message instead.
 """
 
 import sys
@@ -11,15 +16,23 @@ from typing import List, Optional
 
 from .exceptions import ExecutionError
 from ..gitlib import (
+    ReplayError,
     branches_containing,
     checkout,
     current_branch_name,
     full_hash_of,
+    has_merges,
     is_clean,
     is_git_repo,
     is_reachable,
     parent_revs_of,
+    preflight_replay,
+    read_tree_update,
     rebase_onto,
+    ref_commit_hashes,
+    replay_onto,
+    update_refs,
+    worktree_branches,
 )
 from ..runcmd import RunCmdError
 
@@ -27,14 +40,20 @@ from ..runcmd import RunCmdError
 def main(argv: Optional[List[str]] = None):
     """Entry point for 'drop' script."""
     args = sys.argv[1:] if argv is None else argv[1:]
+    all_branches = args[:1] == ["--all"]
+    if all_branches:
+        args = args[1:]
     if len(args) != 1:
-        print("usage: drop <commit>")
+        print("usage: drop [--all] <commit>")
         return 1
 
     commitish = args[0]
 
     try:
-        _drop(commitish)
+        if all_branches:
+            _drop_from_all(commitish)
+        else:
+            _drop(commitish)
     except ExecutionError as e:
         print(e.message, file=sys.stderr)
         return e.return_code
@@ -45,14 +64,27 @@ def _drop(commitish_to_drop: str):
     """Remove `commitish_to_drop` from its branch.
 
     Exits with an error message if `commitish_to_drop` is reachable from more than one
-    branch or has other than exactly one parent.
+    branch, has other than exactly one parent, or a later commit conflicts without it.
+    A conflict is found before the working tree is touched unless a merge follows the
+    commit.
     """
-    _exit_if_not_valid_in_context(commitish_to_drop)
+    rev_to_drop = _exit_if_not_valid_in_context(commitish_to_drop)
 
-    rev_to_drop = _resolve_rev(commitish_to_drop)
     orig_branch = current_branch_name()
-    commit_branch = _only_branch_containing(commitish_to_drop)
-    newbase = _single_parent_of(commitish_to_drop)
+    commit_branch = _only_branch_containing(rev_to_drop, commitish_to_drop)
+    newbase = _single_parent_of(rev_to_drop, commitish_to_drop)
+
+    # --- refuse before the rebase touches the working tree, rather than part way; the
+    # --- rebase flattens a merge, which the preflight replays whole, so a range with a
+    # --- merge in it is left to the rebase ---
+    if not has_merges(["%s..%s" % (rev_to_drop, commit_branch)]):
+        error = preflight_replay(newbase, rev_to_drop, [commit_branch])
+        if error is not None:
+            raise ExecutionError(
+                "Commit %s conflicts without commit %s.\nAborting.\a"
+                % (error.commit[:7], commitish_to_drop),
+                9,
+            )
 
     print(rebase_onto(newbase, rev_to_drop, commit_branch))
 
@@ -60,8 +92,73 @@ def _drop(commitish_to_drop: str):
         checkout(orig_branch)
 
 
+def _drop_from_all(commitish_to_drop: str):
+    """Remove `commitish_to_drop` from every local branch it is reachable from.
+
+    Each commit descended from the dropped commit is replayed once, however many
+    branches share it, and all the branches are moved in one transaction. Exits with an
+    error message, leaving every branch as it was, if one of the branches is checked out
+    in another worktree, or a replayed commit conflicts or merges in a branch the
+    dropped commit is not on.
+    """
+    rev_to_drop = _exit_if_not_valid_in_context(commitish_to_drop)
+
+    newbase = _single_parent_of(rev_to_drop, commitish_to_drop)
+    branch_names = branches_containing(rev_to_drop)
+    orig_branch = current_branch_name()
+    _exit_if_checked_out_elsewhere(branch_names, orig_branch)
+    branch_refs = ["refs/heads/%s" % name for name in branch_names]
+    ref_hashes = ref_commit_hashes()
+    tips = {refname: ref_hashes[refname] for refname in branch_refs}
+
+    try:
+        rewritten = replay_onto(newbase, rev_to_drop, list(tips.values()))
+    except ReplayError as e:
+        if e.is_merge:
+            raise ExecutionError(
+                "Commit %s merges in commit %s from another branch.\nAborting."
+                % (e.commit[:7], commitish_to_drop),
+                8,
+            )
+        raise ExecutionError(
+            "Commit %s conflicts without commit %s.\nAborting.\a"
+            % (e.commit[:7], commitish_to_drop),
+            9,
+        )
+
+    update_refs(
+        [(refname, rewritten[tip], tip) for refname, tip in tips.items()],
+        "drop: %s" % rev_to_drop,
+    )
+
+    orig_ref = "refs/heads/%s" % orig_branch
+    if orig_ref in tips:
+        read_tree_update(tips[orig_ref], rewritten[tips[orig_ref]])
+
+    print(
+        "Dropped %s from %s."
+        % (rev_to_drop[:7], ", ".join(refname[11:] for refname in branch_refs))
+    )
+
+
+def _exit_if_checked_out_elsewhere(branch_names: List[str], orig_branch: str):
+    """Exit with error message when one of `branch_names` is checked out elsewhere.
+
+    Moving a branch checked out in another worktree would leave that worktree's index
+    and files describing the old commits, showing the dropped change as staged there.
+    """
+    worktrees = worktree_branches()
+    for name in branch_names:
+        if name != orig_branch and name in worktrees:
+            raise ExecutionError(
+                "Branch %s is checked out in worktree %s.\nAborting."
+                % (name, worktrees[name]),
+                10,
+            )
+
+
 def _exit_if_not_valid_in_context(commitish: str):
-    """Exit with error message when current state does not permit drop.
+    """Return SHA1 hash of `commitish`, exiting when current state does not permit drop.
 
     These conditions are:
 
@@ -74,24 +171,28 @@ def _exit_if_not_valid_in_context(commitish: str):
         raise ExecutionError("Not in a Git repository.\nAborting.", 2)
 
     # --- raise if `commitish` is not a revision in repo ---
-    _resolve_rev(commitish)
+    rev = _resolve_rev(commitish)
 
     if not is_clean():
         raise ExecutionError("Workspace contains uncommitted changes.\nAborting.\a", 3)
 
+    return rev
+
 
-def _only_branch_containing(commitish: str):
-    """Return the name of the branch containing `commitish`.
+def _only_branch_containing(rev: str, commitish: str):
+    """Return the name of the branch containing `rev`, which `commitish` names.
 
-    Exit with an error message if `commitish` can be reached from other than exactly one
+    Exit with an error message if `rev` can be reached from other than exactly one
     branch.
     """
-    branch_names = branches_containing(commitish)
+    branch_names = branches_containing(rev)
     branch_count = len(branch_names)
 
     if branch_count > 1:
         raise ExecutionError(
-            "Commit %s reachable from more than one branch.\n" "Aborting." % commitish,
+            "Commit %s reachable from more than one branch.\n"
+            "Use `drop --all` to drop it from each of them.\n"
+            "Aborting." % commitish,
             5,
         )
 
@@ -117,12 +218,12 @@ def _resolve_rev(commitish: str):
     return rev
 
 
-def _single_parent_of(commitish: str):
-    """Return the SHA1 hash of the single parent of `commitish`.
+def _single_parent_of(rev: str, commitish: str):
+    """Return the SHA1 hash of the single parent of `rev`, which `commitish` names.
 
     Exit with an error message if there is other than a single parent.
     """
-    parent_revs = parent_revs_of(commitish)
+    parent_revs = parent_revs_of(rev)
     parent_rev_count = len(parent_revs)
 
     if parent_rev_count == 0:
@@ -4,34 +4,78 @@
 
 Exits with an error message if the current working directory is not in a Git repository,
 the working tree is dirty, or *commit_ref* does not identify a commit in the repository.
+
+With `--worktree`, 'fixit' is kept checked out in a linked worktree of its own, next to
+the current one, and the current worktree is never touched. The worktree is created on
+first use and reused after that, so moving 'fixit' only rewrites the files that differ
+between the two commits. While it exists, `next` and `prev` run in the worktree it was
+added beside move 'fixit' there too.
 """
 
+import os
 import sys
 
 from .exceptions import ExecutionError
 from ..gitlib import (
+    Repo,
+    add_worktree,
     branch_exists,
     checkout,
     create_branch_at,
     current_branch_name,
+    full_hash_of,
+    git_common_dir,
     is_clean,
     is_commit,
     is_git_repo,
     reset_hard_to,
+    working_tree_dir,
+    worktree_of,
 )
+from ..runcmd import RunCmdError
 
 
 def main(argv=None):
     """Entry point for 'fix' script."""
-    commit_ish = sys.argv[1] if argv is None else argv[1]
+    args = sys.argv[1:] if argv is None else argv[1:]
+    in_worktree = args[:1] == ["--worktree"]
+    if in_worktree:
+        args = args[1:]
+    if len(args) != 1:
+        print("usage: fix [--worktree] <commit>")
+        return 1
+
+    commit_ish = args[0]
     try:
-        _fix(commit_ish)
+        if in_worktree:
+            _fix_in_worktree(commit_ish)
+        else:
+            _fix(commit_ish)
     except ExecutionError as e:
         print(e.message, file=sys.stderr)
         return e.return_code
     return 0
 
 
+def fixit_worktree():
+    """Return path of the worktree `fix --worktree` keeps 'fixit' in beside this one.
+
+    Returns |None| when 'fixit' is not checked out in a worktree, or is checked out in
+    one other than that beside the current worktree, such as the current one itself.
+    """
+    try:
+        # --- git keeps an entry under `worktrees/` for each linked worktree, so without
+        # --- one there is no need to ask git where 'fixit' is ---
+        if not os.path.isdir(os.path.join(git_common_dir(), "worktrees")):
+            return None
+        path = worktree_of("fixit")
+        if path is None:
+            return None
+        return path if path == "%s-fixit" % working_tree_dir() else None
+    except RunCmdError:
+        return None
+
+
 def _checkout_branch_and_reset_to(branch_name, commit_ref):
     """Check out *branch_name* and reset it hard to *commit_ref*.
 
@@ -82,3 +126,39 @@ def _fix(commit_ref):
     _exit_if_not_valid_in_context()
     _exit_if_not_valid(commit_ref)
     _checkout_branch_and_reset_to("fixit", commit_ref)
+
+
+def _fix_in_worktree(commit_ref):
+    """Move 'fixit' branch to *commit_ref* in the linked worktree dedicated to it.
+
+    The worktree is added beside the current one when 'fixit' is not yet checked out in
+    a worktree. *commit_ref* is resolved in the current worktree, so a ref like `HEAD~1`
+    names the same commit it does in `git log` here. Exits with an error message if
+    the 'fixit' worktree is dirty or 'fixit' is checked out in the current worktree.
+    """
+    if not is_git_repo():
+        raise ExecutionError("Not in a Git repository.\nAborting.", 2)
+    _exit_if_not_valid(commit_ref)
+    commit_ref = full_hash_of(commit_ref)
+
+    path = worktree_of("fixit")
+    if path is None:
+        path = "%s-fixit" % working_tree_dir()
+        try:
+            add_worktree(path, "fixit", commit_ref)
+        except RunCmdError:
+            raise ExecutionError(
+                "Could not add worktree %s for 'fixit'.\nAborting." % path, 5
+            )
+    elif path == working_tree_dir():
+        raise ExecutionError(
+            "Branch 'fixit' is checked out in this worktree.\nAborting.", 5
+        )
+    else:
+        with Repo(path):
+            if not is_clean():
+                raise ExecutionError(
+                    "Worktree %s contains uncommitted changes.\nAborting." % path, 3
+                )
+            print(reset_hard_to(commit_ref), end="")
+    print("fixit is checked out in %s" % path)
@@ -0,0 +1,155 @@
+# encoding: utf-8
+
+"""Run a query across many repositories concurrently.
+
+    usage: githelpers fleet [-j N] [-t SECS] [-f FILE] {status,lawg} [REPO ...]
+                            [-- LAWG_ARG ...]
+
+Each repository is queried from its own worker thread, addressing the repository by
+path so the working directory never changes. Each repository's output is written as
+soon as it is complete, so total wall time is close to that of the slowest repository.
+With `--timeout`, the git commands of a query that takes longer are killed and the
+repository is reported as an error. Interrupting the command kills the git commands
+still running. Exits with return code 1 if the query failed for any repository.
+"""
+
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+
+from .exceptions import ExecutionError
+from .lawg import pretty_log
+from ..gitlib import Repo, current_branch_name, head, is_clean, is_git_repo
+from ..runcmd import CancelToken, Limits, RunCmdError
+
+DEFAULT_JOBS = 8
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for 'githelpers fleet' subcommand."""
+    argv = sys.argv if argv is None else argv
+    args, lawg_args = _split_args(argv[1:])
+    options = _parser(argv[0]).parse_args(args)
+
+    repo_paths = list(options.repos)
+    if options.file:
+        repo_paths.extend(_read_repo_paths(options.file))
+    if not repo_paths:
+        print("No repositories given.", file=sys.stderr)
+        return 1
+
+    jobs, timeout = options.jobs, options.timeout
+    if options.query == "status":
+        return _run(repo_paths, _status, jobs, timeout)
+    return _run(repo_paths, lambda path: _lawg(path, lawg_args), jobs, timeout)
+
+
+def _exit_if_not_git_repo():
+    """Raise when the current `Repo` is not a Git repository."""
+    if not is_git_repo():
+        raise ExecutionError("Not a Git repository.", 2)
+
+
+def _lawg(repo_path: str, lawg_args: List[str]) -> str:
+    """Return the `git lawg` output for `lawg_args` in the repository at `repo_path`."""
+    with Repo(repo_path):
+        _exit_if_not_git_repo()
+    return "\n".join(pretty_log(lawg_args, repo_path))
+
+
+def _parser(prog: str) -> argparse.ArgumentParser:
+    """Return the command-line parser for the fleet subcommand."""
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Run a query across many repositories concurrently."
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="number of repositories to query at once (default %d)" % DEFAULT_JOBS,
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        metavar="SECS",
+        help="give up on a repository after SECS seconds",
+    )
+    parser.add_argument(
+        "-f",
+        "--file",
+        help="read repository paths from FILE, one per line, - for stdin",
+    )
+    parser.add_argument("query", choices=["status", "lawg"])
+    parser.add_argument("repos", nargs="*", metavar="REPO")
+    return parser
+
+
+def _print_results(futures) -> int:
+    """Print the result of each of `futures` as it completes, under its repo path.
+
+    Returns 1 if any of them raised, 0 otherwise.
+    """
+    return_code = 0
+    for future in as_completed(futures):
+        path = futures[future]
+        try:
+            text = future.result()
+        except (ExecutionError, RunCmdError) as e:
+            text = "error: %s" % str(e).strip()
+            return_code = 1
+        print("== %s ==\n%s" % (path, text), flush=True)
+    return return_code
+
+
+def _read_repo_paths(filename: str) -> List[str]:
+    """Return the non-blank lines of `filename`, or of stdin when it is "-"."""
+    if filename == "-":
+        return [line.strip() for line in sys.stdin if line.strip()]
+    with open(filename) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _run(
+    repo_paths: List[str], query, jobs: int, timeout: Optional[float] = None
+) -> int:
+    """Run `query` on each of `repo_paths` using `jobs` threads, printing each result.
+
+    Results are printed in order of completion, each under a header naming its
+    repository. The commands of each query are bounded by `timeout` seconds, timed from
+    when that query starts, and are killed on keyboard interrupt. Returns 1 if `query`
+    failed for any repository, 0 otherwise.
+    """
+    cancel = CancelToken()
+
+    def bounded_query(path: str) -> str:
+        with Limits(timeout=timeout, cancel=cancel):
+            return query(path)
+
+    with ThreadPoolExecutor(max(jobs, 1)) as pool:
+        futures = {pool.submit(bounded_query, path): path for path in repo_paths}
+        try:
+            return _print_results(futures)
+        except KeyboardInterrupt:
+            cancel.cancel()
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def _split_args(args: List[str]):
+    """Return (fleet_args, lawg_args) from `args`, split at the first "--"."""
+    if "--" not in args:
+        return args, []
+    idx = args.index("--")
+    return args[:idx], args[idx + 1 :]
+
+
+def _status(repo_path: str) -> str:
+    """Return one-line summary of HEAD and working-tree state of repo at `repo_path`."""
+    with Repo(repo_path):
+        _exit_if_not_git_repo()
+        state = "clean" if is_clean() else "dirty"
+        return "%s %s (%s)" % (head()[:7], current_branch_name(), state)
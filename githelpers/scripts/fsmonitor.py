@@ -0,0 +1,81 @@
+# encoding: utf-8
+
+"""Start, stop, or query the watcher journaling changes to the current worktree.
+
+    usage: githelpers fsmonitor {start,stop,status}
+           githelpers fsmonitor 2 TOKEN
+
+While the watcher runs, `is_clean()`, and so `next`, `prev`, `fix`, and `drop`, skip
+the scan of the worktree when no file has changed since the last check. The second
+form is git's fsmonitor hook protocol, version 2, so `git config core.fsmonitor
+"githelpers fsmonitor"` has `git status` use the same journal.
+"""
+
+import sys
+from typing import List, Optional
+
+from .exceptions import ExecutionError
+from .. import fsmonitor
+from ..gitlib import git_dir, is_git_repo, working_tree_dir
+
+USAGE = "usage: githelpers fsmonitor {start,stop,status}"
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for 'githelpers fsmonitor' subcommand."""
+    args = sys.argv[1:] if argv is None else argv[1:]
+    if len(args) == 2 and args[0] == "2":
+        return _answer_hook(args[1])
+    if args not in (["start"], ["stop"], ["status"]):
+        print(USAGE)
+        return 1
+
+    try:
+        if not is_git_repo():
+            raise ExecutionError("Not in a Git repository.\nAborting.", 2)
+        {"start": _start, "stop": _stop, "status": _status}[args[0]]()
+    except ExecutionError as e:
+        print(e.message, file=sys.stderr)
+        return e.return_code
+    return 0
+
+
+def _answer_hook(token: str) -> int:
+    """Write the paths changed since `token`, as git's fsmonitor hook protocol asks.
+
+    The new token comes first, then each path, each terminated by a NUL byte. A path of
+    "/" tells git the changes are unknown, so it scans the worktree itself.
+    """
+    new_token, paths = fsmonitor.changes_since(git_dir(), token)
+    out = sys.stdout.buffer
+    out.write(new_token.encode("ascii") + b"\0")
+    for path in ["/"] if paths is None else paths:
+        out.write(path.encode("utf-8", "surrogateescape") + b"\0")
+    out.flush()
+    return 0
+
+
+def _start():
+    """Start the watcher of the current worktree unless it is already running."""
+    if fsmonitor.is_running(git_dir()):
+        print("fsmonitor is already watching %s" % working_tree_dir())
+        return
+    try:
+        pid = fsmonitor.start(working_tree_dir(), git_dir())
+    except OSError as e:
+        raise ExecutionError("Could not start fsmonitor: %s\nAborting." % e, 4)
+    print("fsmonitor (pid %d) is watching %s" % (pid, working_tree_dir()))
+
+
+def _status():
+    """Report whether the watcher of the current worktree is running."""
+    if not fsmonitor.is_running(git_dir()):
+        raise ExecutionError("fsmonitor is not running.", 3)
+    print("fsmonitor is watching %s" % working_tree_dir())
+
+
+def _stop():
+    """Stop the watcher of the current worktree."""
+    if not fsmonitor.stop(git_dir()):
+        raise ExecutionError("fsmonitor is not running.", 3)
+    print("fsmonitor stopped")
@@ -0,0 +1,100 @@
+# encoding: utf-8
+
+"""Install git hooks that keep the githelpers commit-graph index current.
+
+Builds the index with one full history walk, then installs `post-commit`,
+`post-rewrite`, `post-checkout`, and `reference-transaction` hooks that append a delta
+record to the index journal for each change, so the index never needs another full
+walk. Exits with an error message if a hook of the same name, not installed by
+githelpers, already exists, unless `--force` is given.
+"""
+
+import os
+import stat
+import sys
+from typing import List, Optional
+
+from .exceptions import ExecutionError
+from ..gitlib import git_path, is_git_repo
+from ..graph import CommitGraph
+
+HOOK_MARKER = "# installed by `githelpers install-hooks`"
+
+HOOK_PREAMBLE = (
+    """#!/bin/sh
+%s; journals changes for the commit-graph
+# index used by `next`. Remove this file to stop journaling.
+journal="$(git rev-parse --git-common-dir)/githelpers/graph-journal"
+[ -d "${journal%%/*}" ] || exit 0
+"""
+    % HOOK_MARKER
+)
+
+HOOK_BODIES = {
+    "post-commit": (
+        'git rev-list -1 --parents HEAD | sed "s/^/commit /" >>"$journal"\n'
+    ),
+    "post-rewrite": (
+        'while read -r old new extra; do echo "rewrite $old $new"; done >>"$journal"\n'
+    ),
+    "post-checkout": ('[ "$3" = 1 ] && echo "ref $1 $2 HEAD" >>"$journal"\nexit 0\n'),
+    "reference-transaction": (
+        '[ "$1" = committed ] || exit 0\n'
+        "while read -r old new ref; do\n"
+        '  case "$old $new" in *ref:*) continue ;; esac\n'
+        '  echo "ref $old $new $ref"\n'
+        'done >>"$journal"\n'
+    ),
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for 'githelpers install-hooks' subcommand."""
+    args = sys.argv[1:] if argv is None else argv[1:]
+    if args not in ([], ["--force"]):
+        print("usage: githelpers install-hooks [--force]")
+        return 1
+
+    try:
+        _install_hooks(force=bool(args))
+    except ExecutionError as e:
+        print(e.message, file=sys.stderr)
+        return e.return_code
+    return 0
+
+
+def _exit_if_foreign_hooks(hooks_dir: str):
+    """Exit with error message if a hook we would replace was not installed by us."""
+    for name in sorted(HOOK_BODIES):
+        path = os.path.join(hooks_dir, name)
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            if HOOK_MARKER not in f.read():
+                raise ExecutionError(
+                    "Hook %s already exists.\nUse --force to replace it.\nAborting."
+                    % path,
+                    3,
+                )
+
+
+def _install_hooks(force: bool):
+    """Build the commit-graph index and install the hooks that keep it current."""
+    if not is_git_repo():
+        raise ExecutionError("Not in a Git repository.\nAborting.", 2)
+
+    hooks_dir = os.path.abspath(git_path("hooks"))
+    if not force:
+        _exit_if_foreign_hooks(hooks_dir)
+
+    graph = CommitGraph.build()
+    print("Indexed %d commits." % len(graph))
+
+    os.makedirs(hooks_dir, exist_ok=True)
+    for name, body in sorted(HOOK_BODIES.items()):
+        path = os.path.join(hooks_dir, name)
+        with open(path, "w") as f:
+            f.write(HOOK_PREAMBLE + body)
+        mode = os.stat(path).st_mode
+        os.chmod(path, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        print("Installed %s" % path)
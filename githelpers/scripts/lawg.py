@@ -11,16 +11,55 @@ Example:
 The log format uses an ASCII x1f (unit-separator) character '' between each field to
 ease parsing it into the required tokens. A '' in the commit subject or other field
 will break this (but I've never seen it happen).
+
+The raw git log output is cached under `.git/githelpers/lawg-cache`, keyed on the
+command-line arguments and the state of the repository's refs, so repeating the same
+query in an unchanged repository does not run git at all. Pass `--no-cache` to bypass
+the cache.
+
+Pass `--format=ndjson` to get one uncolored JSON object per log line instead, for
+editor plugins and other tools.
+
+Pass `--jobs=N` (or just `--jobs` for one per CPU) to parse and color a very long log
+in N worker processes, as when exporting a full history to a file.
+
+Pass `--page` to page the log in place of piping it to `less`. Commits are read from
+git and rendered a screen at a time, only as the view scrolls to them, so opening the
+log of a huge history costs about one screen's worth of work. Column widths are fitted
+to the lines on screen. A log that fits on one screen is just printed. `--page` cannot
+be combined with `--jobs`, which renders the whole log up front.
+
+Pass `--watch` to keep the log on screen and current, in place of `watch git lawg`.
+The log is queried again only when a ref changes, and only the lines that differ are
+redrawn.
+
+Once `githelpers search-index` has indexed the repository's commit messages, a log
+filtered by literal `--grep` and `--author` patterns is found in the index. Git then
+only lists the commits in the range, which it does from the commit-graph without
+reading their messages, and formats the few that match; the graph is drawn here, as
+git would draw it.
 """
 
 from __future__ import print_function
 
 import errno
+import functools
+import hashlib
+import os
 import re
-import subprocess
 import sys
-from typing import Iterable, Tuple
-from typing_extensions import Protocol
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+# --- `typing_extensions` costs more to import than the rest of this module combined, so
+# --- only fall back to it on interpreters that predate `typing.Protocol`.
+if sys.version_info >= (3, 8):
+    from typing import Protocol
+else:  # pragma: no cover
+    from typing_extensions import Protocol
+
+from ..runcmd import RunCmdError, output_lines_of, run
 
 
 RED = "\033[31m"
@@ -37,23 +76,362 @@ SHA1_COLOR = YELLOW
 CLASSIFIER_COLOR = CYAN
 TIME_COLOR = GREEN
 
+USAGE = "usage: git-lawg [--jobs[=N] | --page] [<git log args>]"
+
+# -- number of log lines each worker process parses and renders at a time --
+CHUNK_SIZE = 20000
+
+# -- marks after the sha1 and time padding of a chunk rendered by a worker, for
+# -- `_pad_chunk()` to widen; no field holds `\x1f`, git's output being split on it --
+SHA1_PAD_MARK = "\x1f1"
+TIME_PAD_MARK = "\x1f2"
+
+# -- relative times of commits newer than this many seconds are shown in seconds --
+SECONDS_RESOLUTION_AGE = 90
+
+# -- options that change which refs git decorates commits with, leaving it to `%d` --
+DECORATION_OPTIONS = ("--decorate", "--no-decorate", "--clear-decorations")
+
+# -- config that changes how git decorates commits, or where it reads refs from, leaving
+# -- decoration to `%d`; names as `git config --get-regexp` matches them, lowercased --
+DECORATION_CONFIG = (
+    r"^(log\.(decorate|excludedecoration|initialdecorationset)|extensions\.refstorage)$"
+)
+
+# -- prefixes of the refs git decorates commits with by default, besides `refs/stash` --
+DECORATION_PREFIXES = ("refs/heads/", "refs/remotes/", "refs/tags/")
+
+# -- options filtering commits by pattern, which the search index may answer --
+SEARCH_OPTIONS = ("--grep", "--author")
+
+# -- a terminal escape sequence, such as an arrow key sends, read as one key --
+ESCAPE_SEQUENCE_RE = re.compile(rb"\033\[[0-?]*[ -/]*[@-~]")
+
+# -- (lines, screens) scrolled by each key of the pager, |None| to quit --
+PAGER_KEYS: Dict[bytes, Optional[Tuple[int, int]]] = {
+    b"q": None,
+    b"Q": None,
+    b"j": (1, 0),
+    b"\n": (1, 0),
+    b"\r": (1, 0),
+    b"\033[B": (1, 0),
+    b"k": (-1, 0),
+    b"\033[A": (-1, 0),
+    b" ": (0, 1),
+    b"f": (0, 1),
+    b"\033[6~": (0, 1),
+    b"b": (0, -1),
+    b"\033[5~": (0, -1),
+    b"g": (-sys.maxsize, 0),
+    b"<": (-sys.maxsize, 0),
+    b"G": (sys.maxsize, 0),
+    b">": (sys.maxsize, 0),
+}
+
 
 def main():
+    args = sys.argv[1:]
+    ndjson = "--format=ndjson" in args
+    watch = "--watch" in args
+    page = "--page" in args
+    args = [arg for arg in args if arg not in ("--format=ndjson", "--watch", "--page")]
+    jobs_args = [arg for arg in args if arg == "--jobs" or arg.startswith("--jobs=")]
+    if page and jobs_args:
+        print(USAGE)
+        return 1
+    jobs = 1
+    for arg in jobs_args:
+        if arg == "--jobs":
+            jobs = os.cpu_count() or 1
+            continue
+        count = arg[len("--jobs=") :]
+        if not count.isdigit() or int(count) < 1:
+            print(USAGE)
+            return 1
+        jobs = int(count)
+    args = [arg for arg in args if arg not in jobs_args]
+
     # --- Send log lines to stdout one at a time, exiting on broken pipe, such as might
     # --- happen when user quits `git-lawg | less` before all input is read.
     try:
-        for line in str(_LogLines.load()).splitlines():
+        if watch:
+            return _watch(args)
+        if ndjson:
+            _write_ndjson(args)
+            return
+        if jobs > 1:
+            _write_parallel(args, jobs)
+            return
+        if page and sys.stdout.isatty():
+            return _page(args)
+        for line in _LogLines.load(args).pretty_lines():
             print(line)
+    except RunCmdError:
+        # --- git has already said why on stderr ---
+        return 1
     except IOError as e:
         if e.errno != errno.EPIPE:
             raise
         sys.stderr.close()
 
 
+def pretty_log(args: List[str], repo_dir: Optional[str] = None) -> Iterator[str]:
+    """Generate each colored line of the `git lawg` output for `args`.
+
+    The log is of the repository at `repo_dir`, or the working directory if |None|.
+    Used to render logs of other repositories without changing directory.
+    """
+    return _LogLines.load(args, repo_dir).pretty_lines()
+
+
+def _write_ndjson(args: List[str]):
+    """Write one JSON object per git log line to stdout, as each line arrives.
+
+    No widths are computed and nothing is colored; each record comes straight from the
+    field parse, so a consumer can start processing before git finishes the walk. Each
+    record is flushed as it is written, stdout being block-buffered when piped, and git
+    is ended as soon as the consumer stops reading.
+    """
+    # --- imported here so the default colored output does not pay for it ---
+    import json
+
+    raw_lines = _LogLines.raw_lines(args)
+    try:
+        for line in raw_lines:
+            print(json.dumps(_BaseLine.record_from_text(line)), flush=True)
+    finally:
+        raw_lines.close()
+
+
+def _write_parallel(args: List[str], jobs: int):
+    """Write the colored git log to stdout, parsing and rendering in `jobs` processes.
+
+    The raw log is split into chunks of `CHUNK_SIZE` lines, each dispatched to a worker
+    as soon as git has written it. Each worker parses its chunk once, returning its
+    column widths and the chunk rendered to them. Each chunk is written out in log
+    order as soon as it and those before it are done, its padding widened to the widest
+    columns written so far, so only the chunks in flight are held and a reader that
+    stops early ends git at once. A column is aligned across the whole log unless a
+    later chunk needs it wider, when it shifts right from that chunk on.
+    """
+    # --- imported here so the default serial output does not pay for it ---
+    from concurrent.futures import ProcessPoolExecutor
+    from itertools import islice
+
+    now = int(time.time())
+    raw_lines = _LogLines.raw_lines(args)
+    chunks = iter(lambda: "".join(islice(raw_lines, CHUNK_SIZE)), "")
+
+    max_graf, max_sha1, max_time = 0, 0, 0
+    with ProcessPoolExecutor(jobs) as pool:
+        rendered = _rendered_chunks(pool, chunks, now, jobs)
+        try:
+            for widths, text in rendered:
+                max_graf = max(max_graf, widths[0])
+                max_sha1 = max(max_sha1, widths[1])
+                max_time = max(max_time, widths[2])
+                sys.stdout.write(
+                    _pad_chunk(text, widths, (max_graf, max_sha1, max_time))
+                )
+        finally:
+            rendered.close()
+            raw_lines.close()
+
+
+def _pad_chunk(
+    text: str, widths: Tuple[int, int, int], max_widths: Tuple[int, int, int]
+) -> str:
+    """Return chunk `text` rendered to `widths`, widened to `max_widths`.
+
+    `text` is as returned by `_render_chunk()`. Each line of a chunk is short of
+    `max_widths` by the same amount in each column, so widening it is a matter of
+    replacing each pad mark with that many spaces.
+    """
+    max_graf, max_sha1, max_time = max_widths
+    graf_width, sha1_width, time_width = widths
+    sha1_pad = " " * (max_graf + max_sha1 - graf_width - sha1_width)
+    time_pad = " " * (max_time - time_width)
+    return text.replace(SHA1_PAD_MARK, sha1_pad).replace(TIME_PAD_MARK, time_pad)
+
+
+def _render_chunk(text: str, now: int) -> Tuple[Tuple[int, int, int], str]:
+    """Return (widths, rendered) pair for the raw log lines in `text`.
+
+    `widths` are the (max_graf, max_sha1, max_time) widths of the lines and `rendered`
+    the lines colored and aligned to them, a pad mark after each column's padding. Runs
+    in a worker process.
+    """
+    log_lines = _LogLines.from_raw_text(text, now)
+    widths = log_lines.max_widths
+    pretty_lines = log_lines.pretty_lines(widths, marked=True)
+    return widths, "".join(line + "\n" for line in pretty_lines)
+
+
+def _rendered_chunks(
+    pool, chunks: Iterator[str], now: int, ahead: int
+) -> Iterator[Tuple[Tuple[int, int, int], str]]:
+    """Generate the `_render_chunk()` result for each of `chunks`, in order.
+
+    Each chunk is submitted to `pool` as it is read, so parsing overlaps git's walk, but
+    no more than `ahead` chunks are read beyond the one waited on. Chunks not yet
+    rendered are cancelled when the generator is closed.
+    """
+    pending: Deque[Any] = deque()
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(_render_chunk, chunk, now))
+            if len(pending) > ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _page(args: List[str]) -> int:
+    """Show the log a screen at a time, reading from git only the lines scrolled to.
+
+    Keys are those of `less` for moving by line, by screen, and to either end; `q`
+    quits. A log that fits on the screen is printed instead, as `less -F` does. Returns
+    the exit code for the process.
+    """
+    # --- imported here so the default output does not pay for them ---
+    import select
+    import signal
+    import termios
+    import tty
+
+    raw_lines = _LogLines.raw_lines(args)
+    pager = _Pager(raw_lines, int(time.time()))
+    rows = os.get_terminal_size(sys.stdout.fileno()).lines
+    if pager.fetch(rows + 1) <= rows:
+        for line in pager.window(rows):
+            print(line)
+        return 0
+
+    tty_fd = os.open("/dev/tty", os.O_RDONLY)
+    tty_attrs = termios.tcgetattr(tty_fd)
+
+    # --- a terminal resize or Ctrl-C wakes the wait for a key through this pipe ---
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    old_handler = signal.signal(signal.SIGWINCH, lambda signum, frame: None)
+    old_wakeup_fd = signal.set_wakeup_fd(wake_w)
+
+    tty.setcbreak(tty_fd)
+    try:
+        with _Screen(sys.stdout) as screen:
+            while True:
+                height = max(os.get_terminal_size(sys.stdout.fileno()).lines - 1, 1)
+                pager.scroll(0, height)
+                prompt = "(END)" if pager.is_at_end(height) else ":"
+                screen.paint(pager.window(height) + ["\033[7m%s\033[0m" % prompt])
+                ready, _, _ = select.select([tty_fd, wake_r], [], [])
+                while _read_nonblocking(wake_r):
+                    pass
+                if tty_fd not in ready:
+                    continue
+                for key in _pager_keys(os.read(tty_fd, 1024)):
+                    if key in PAGER_KEYS and PAGER_KEYS[key] is None:
+                        return 0
+                    lines, screens = PAGER_KEYS.get(key) or (0, 0)
+                    pager.scroll(lines + screens * height, height)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        termios.tcsetattr(tty_fd, termios.TCSADRAIN, tty_attrs)
+        os.close(tty_fd)
+        signal.set_wakeup_fd(old_wakeup_fd)
+        signal.signal(signal.SIGWINCH, old_handler)
+        os.close(wake_r)
+        os.close(wake_w)
+        raw_lines.close()
+
+
+def _pager_keys(data: bytes) -> Iterator[bytes]:
+    """Generate each key pressed in `data`, as read from the terminal.
+
+    One read returns every key typed since the last, such as several `j`s while the key
+    repeats, so each is split off in turn. An escape sequence is kept whole, whether or
+    not it is one of `PAGER_KEYS`.
+    """
+    while data:
+        match = ESCAPE_SEQUENCE_RE.match(data)
+        key = match.group() if match else data[:1]
+        yield key
+        data = data[len(key) :]
+
+
+def _redraw_seconds(raw_lines: Iterable[str], now: int) -> int:
+    """Return seconds until the relative time shown for `raw_lines` next needs redraw.
+
+    That is a second while any commit is young enough to show its age in seconds, and
+    otherwise a minute, the next-finest unit.
+    """
+    for line in raw_lines:
+        tokens = line.split("\x1f")
+        if len(tokens) > 2 and now - int(tokens[2]) < SECONDS_RESOLUTION_AGE:
+            return 1
+    return 60
+
+
+def _watch(args: List[str]) -> int:
+    """Show the log full-screen, keeping it current until interrupted.
+
+    The log is queried again only when HEAD or a ref changes, and is otherwise redrawn
+    only as the relative times of its commits age. Each redraw rewrites only the lines
+    that changed. Returns the exit code for the process.
+    """
+    # --- imported here so the default output does not pay for them ---
+    import signal
+    from ..refwatch import RefWatcher
+
+    git_dirs = _git_dirs()
+    if git_dirs is None:
+        print("Not in a Git repository.", file=sys.stderr)
+        return 2
+    if not sys.stdout.isatty():
+        print("git-lawg --watch needs a terminal to draw on.", file=sys.stderr)
+        return 1
+
+    # --- a terminal resize or Ctrl-C wakes the wait through this pipe ---
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    old_handler = signal.signal(signal.SIGWINCH, lambda signum, frame: None)
+    old_wakeup_fd = signal.set_wakeup_fd(wake_w)
+
+    try:
+        raw_lines = list(_LogLines.raw_lines(args))
+        with RefWatcher.open(git_dirs) as watcher, _Screen(sys.stdout) as screen:
+            while True:
+                now = int(time.time())
+                log_lines = _LogLines(
+                    _BaseLine.from_text(line, now) for line in raw_lines
+                )
+                screen.paint(list(log_lines.pretty_lines()))
+                timeout = _redraw_seconds(raw_lines, now)
+                if watcher.wait(timeout, wake_fds=[wake_r]):
+                    raw_lines = list(_LogLines.raw_lines(args))
+                while _read_nonblocking(wake_r):
+                    pass
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        signal.set_wakeup_fd(old_wakeup_fd)
+        signal.signal(signal.SIGWINCH, old_handler)
+        os.close(wake_r)
+        os.close(wake_w)
+
+
 class _Line(Protocol):
     """Interface a line object must implement."""
 
-    def pretty(self, max_graf: int, max_sha1: int, max_time: int) -> str:
+    def pretty(
+        self, max_graf: int, max_sha1: int, max_time: int, marked: bool = False
+    ) -> str:
         """Return this line formatted and colored, ready for display on the console."""
         ...
 
@@ -72,40 +450,287 @@ class _LogLines:
     def __str__(self):
         """The formatted and ANSI-colored git log as a text string.
 
-        Suitable for dumping to the console. Used as the main text output method.
+        Suitable for dumping to the console.
         """
-        max_graf, max_sha1, max_time = self._max_widths
-        return "\n".join(
-            [line.pretty(max_graf, max_sha1, max_time) for line in self._lines]
-        )
+        return "\n".join(self.pretty_lines())
 
     @classmethod
-    def load(cls) -> "_LogLines":
+    def load(cls, args: List[str], repo_dir: Optional[str] = None) -> "_LogLines":
         """Return `_LogLines` object filled with the results of the git log requested.
 
-        Command-line parameters are passed through to the git log command.
+        `args` are passed through to the git log command, run in `repo_dir` when
+        provided. Relative times are computed here from the commit timestamps, all as
+        of the same moment, so cached output is never stale.
+        """
+        now = int(time.time())
+        raw_lines = cls.raw_lines(args, repo_dir)
+        return cls(_BaseLine.from_text(line, now) for line in raw_lines)
+
+    @classmethod
+    def from_raw_text(cls, text: str, now: int) -> "_LogLines":
+        """Return `_LogLines` object parsed from a chunk of raw git log output."""
+        return cls(_BaseLine.from_text(line, now) for line in text.splitlines())
+
+    @classmethod
+    def raw_lines(
+        cls, args: List[str], repo_dir: Optional[str] = None
+    ) -> Iterator[str]:
+        """Generate each raw line of the git log requested by `args`, in `repo_dir`.
+
+        Lines come from the cache when possible; otherwise each is produced as soon as
+        git writes it and the complete output is cached once git exits successfully.
+        `--no-cache` in `args` bypasses the cache and is not passed on to git.
         """
-        HASH, TIME, SUBJ, REFS = "%h", "%ar", "%s", "%d"
+        use_cache = "--no-cache" not in args
+        args = [arg for arg in args if arg != "--no-cache"]
+
+        # --- the output is the same however it is decorated, and the cache tracks the
+        # --- config that decides that, so only a miss needs to read it ---
+        git_dirs = _git_dirs(repo_dir) if use_cache else None
+        cache = None
+        if use_cache:
+            cache = _LogCache.for_args(
+                ["git", "log", "--graph"] + args, repo_dir, git_dirs
+            )
+        text = cache.get() if cache is not None else None
+        if text is not None:
+            yield from text.splitlines(keepends=True)
+            return
+
+        # --- `%d` has git match every ref against each commit it prints, so unless
+        # --- the refs to decorate with are chosen by `args` or the user's config, the
+        # --- field is left empty and only the commits actually printed are decorated
+        # --- here ---
+        decorate = not any(arg.startswith(DECORATION_OPTIONS) for arg in args)
+        decorate = decorate and not _decoration_configured(repo_dir)
+        if decorate and git_dirs is None:
+            git_dirs = _git_dirs(repo_dir)
+
+        HASH, TIMESTAMP, SUBJ = "%h", "%at", "%s"
+        REFS = "" if decorate else "%d"
+
+        fmt = "\x1f%s\x1f%s\x1f%s\x1f%s" % (HASH, TIMESTAMP, SUBJ, REFS)
+        cmd = ["git", "log", "--graph", "--pretty=tformat:%s" % fmt] + args
 
-        fmt = "\x1f%s\x1f%s\x1f%s\x1f%s" % (HASH, TIME, SUBJ, REFS)
-        cmd = ["git", "log", "--graph", "--pretty=tformat:%s" % fmt] + sys.argv[1:]
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, universal_newlines=True)
-        assert proc.stdout is not None
+        # --- a search the index can answer needs git only to format what it finds ---
+        searched = None
+        if any(arg.startswith(SEARCH_OPTIONS) for arg in args):
+            searched = _searched_lines(args, fmt, repo_dir)
 
-        return cls(_BaseLine.from_text(line) for line in proc.stdout.readlines())
+        # --- git is run under the bounds of any enclosing `runcmd.Limits`, and raises
+        # --- |RunCmdError| after its last line when it fails ---
+        raw_lines = searched
+        if raw_lines is None:
+            raw_lines = output_lines_of(_git_command(cmd[1:], repo_dir), query=True)
+        # --- read while git starts its walk ---
+        decorations = None
+        if decorate and git_dirs is not None:
+            decorations = _RefDecorations.load(git_dirs, repo_dir)
+        lines = []
+        try:
+            for line in raw_lines:
+                if decorations is not None and "\x1f" in line:
+                    abbrev = line.split("\x1f", 2)[1]
+                    line = "%s%s\n" % (line.rstrip("\n"), decorations.of(abbrev))
+                lines.append(line)
+                yield line
+        finally:
+            # --- a reader stopping early, as the pager does, ends git ---
+            if searched is None:
+                raw_lines.close()
+
+        if cache is not None:
+            cache.put("".join(lines))
+
+    def pretty_lines(
+        self, max_widths: Optional[Tuple[int, int, int]] = None, marked: bool = False
+    ) -> Iterator[str]:
+        """Generate each formatted and ANSI-colored line of the git log.
+
+        Used as the main text output method; lines are produced one at a time so the
+        whole log is never held as a single string. Columns are aligned to
+        `max_widths` when provided, as when this is one chunk of a longer log. With
+        `marked`, each column's padding is followed by its pad mark.
+        """
+        max_graf, max_sha1, max_time = max_widths or self.max_widths
+        for line in self._lines:
+            yield line.pretty(max_graf, max_sha1, max_time, marked)
 
     @property
-    def _max_widths(self) -> Tuple[int, int, int]:
+    def max_widths(self) -> Tuple[int, int, int]:
         """A (max_graf_width, max_sha1_width, max_time_width) 3-tuple.
 
         Contains the maximum string length of the graf, sha1, and time fields,
         respectively, across all the lines in this list. This is used to present these
         values in even columns.
         """
-        graf_widths, sha1_widths, time_widths = zip(
-            *[line.widths for line in self._lines]
+        max_graf = max_sha1 = max_time = 0
+        for line in self._lines:
+            graf_width, sha1_width, time_width = line.widths
+            if graf_width > max_graf:
+                max_graf = graf_width
+            if sha1_width > max_sha1:
+                max_sha1 = sha1_width
+            if time_width > max_time:
+                max_time = time_width
+        return max_graf, max_sha1, max_time
+
+
+class _LogCache:
+    """Least-recently-used cache of raw git log output, one file per query.
+
+    Entries live in `.git/githelpers/lawg-cache`, named for a hash of the query
+    arguments, the working directory, the terminal's color capability, the `GIT_CONFIG*`
+    environment, and a fingerprint of HEAD, every ref, and the repository, global, and
+    system config files. Any ref or config update changes the fingerprint, so a stale
+    entry is never read; it just ages out. Files pulled in by `include.path` are not
+    fingerprinted. Entries are touched on each hit and
+    the least-recently used are evicted once the directory grows past `SIZE_LIMIT`.
+    """
+
+    SIZE_LIMIT = 8 * 1024 * 1024
+
+    # -- queries whose result depends on the current time are never cached --
+    UNCACHEABLE_OPTIONS = (
+        "--after",
+        "--before",
+        "--max-age",
+        "--min-age",
+        "--since",
+        "--until",
+    )
+
+    # -- files other than refs that change what `git log` reports --
+    STATE_FILES = (
+        "HEAD",
+        "packed-refs",
+        "config",
+        "config.worktree",
+        "shallow",
+        "info/grafts",
+        "ORIG_HEAD",
+        "FETCH_HEAD",
+        "MERGE_HEAD",
+    )
+
+    def __init__(self, cache_dir: str, key: str):
+        self._cache_dir = cache_dir
+        self._path = os.path.join(cache_dir, key)
+
+    @classmethod
+    def for_args(
+        cls,
+        args: List[str],
+        repo_dir: Optional[str] = None,
+        git_dirs: Optional[Tuple[str, str]] = None,
+    ) -> Optional["_LogCache"]:
+        """Return the cache entry for the git command-line `args` run in `repo_dir`.
+
+        `repo_dir` defaults to the working directory, and its `git_dirs` are looked up
+        unless given. Returns |None| when the query cannot be cached, either because it
+        depends on the current time or because the directory is not in a repository.
+        """
+        if any(arg.startswith(cls.UNCACHEABLE_OPTIONS) for arg in args):
+            return None
+
+        git_dirs = git_dirs or _git_dirs(repo_dir)
+        if git_dirs is None:
+            return None
+        git_dir, common_dir = git_dirs
+
+        color = "%s:%s" % (sys.stdout.isatty(), os.environ.get("TERM", ""))
+        cwd = os.path.abspath(repo_dir) if repo_dir else os.getcwd()
+        config_env = sorted(
+            "%s=%s" % item
+            for item in os.environ.items()
+            if item[0].startswith("GIT_CONFIG")
         )
-        return (max(graf_widths), max(sha1_widths), max(time_widths))
+        key_parts = args + [cwd, color] + config_env
+        key_parts += cls._fingerprint(git_dir, common_dir)
+        key = hashlib.sha1("\0".join(key_parts).encode("utf-8")).hexdigest()
+
+        return cls(os.path.join(common_dir, "githelpers", "lawg-cache"), key)
+
+    def get(self) -> Optional[str]:
+        """Return the cached git log output, or |None| on a cache miss."""
+        try:
+            with open(self._path, encoding="utf-8") as f:
+                text = f.read()
+            # -- mark entry most-recently used --
+            os.utime(self._path)
+        except OSError:
+            return None
+        return text
+
+    def put(self, text: str):
+        """Store `text` as the output for this entry, evicting old entries as needed.
+
+        The cache is an optimization only, so failure to write it is ignored.
+        """
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            tmp_path = "%s.%d.tmp" % (self._path, os.getpid())
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self._path)
+            self._evict()
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Remove least-recently used entries until cache is within `SIZE_LIMIT`."""
+        entries = []
+        for entry in os.scandir(self._cache_dir):
+            st = entry.stat()
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.SIZE_LIMIT:
+                break
+            os.remove(path)
+            total -= size
+
+    @staticmethod
+    def _config_files() -> List[str]:
+        """Return the paths of the global and system config files git reads."""
+        home = os.path.expanduser("~")
+        xdg_config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.join(
+            home, ".config"
+        )
+        global_files = [
+            os.path.join(xdg_config_home, "git", "config"),
+            os.path.join(home, ".gitconfig"),
+        ]
+        if "GIT_CONFIG_GLOBAL" in os.environ:
+            global_files = [os.environ["GIT_CONFIG_GLOBAL"]]
+        return global_files + [os.environ.get("GIT_CONFIG_SYSTEM", "/etc/gitconfig")]
+
+    @classmethod
+    def _fingerprint(cls, git_dir: str, common_dir: str) -> List[str]:
+        """Return list of str identifying the current state of every ref and config.
+
+        Git writes a ref or config file by renaming a new file into place, so the
+        inode, size, and modification time of each file are enough to detect any update
+        without reading the files.
+        """
+        paths = [os.path.join(git_dir, name) for name in cls.STATE_FILES]
+        paths += [os.path.join(common_dir, name) for name in cls.STATE_FILES]
+        paths += cls._config_files()
+        for refs_dir in sorted({git_dir, common_dir}):
+            for dirpath, dirnames, filenames in os.walk(os.path.join(refs_dir, "refs")):
+                dirnames.sort()
+                paths.extend(os.path.join(dirpath, name) for name in sorted(filenames))
+
+        fingerprint = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            fingerprint.append(
+                "%s:%d:%d:%d" % (path, st.st_ino, st.st_size, st.st_mtime_ns)
+            )
+        return fingerprint
 
 
 class _BaseLine:
@@ -121,24 +746,35 @@ class _BaseLine:
 
     Note that some lines contain only the graphical ancestry-line characters. This gives
     rise to the need for two subtypes.
+
+    A full-history log can run to millions of lines, so line objects use `__slots__`
+    and compute the (ANSI-stripped) graf width once, when they are constructed.
     """
 
-    _graf: str
+    __slots__ = ("_graf", "_graf_len")
 
     ansi_regex = re.compile(r"\033\[[0-9;]*m")
-    months_regex = re.compile(r", [0-9]+ months?")
+
+    def __init__(self, graf: str):
+        # -- the same few graf strings recur on nearly every line, so share them --
+        self._graf = sys.intern(graf)
+        self._graf_len = (
+            len(self.ansi_regex.sub("", graf)) if "\033" in graf else len(graf)
+        )
 
     @classmethod
-    def from_text(cls, line: str) -> _Line:
+    def from_text(cls, line: str, now: int) -> _Line:
         """Factory method.
 
-        Return a `_Line` object initialized from the raw log line text in *line*.
+        Return a `_Line` object initialized from the raw log line text in *line*. The
+        relative time is computed from the commit timestamp as of epoch time *now*.
         """
         tokens = cls._condition_line(line).split("\x1f")
 
         # -- a full line has five tokens --
         if len(tokens) > 1:
-            graf, sha1, time, subj, refs = tokens
+            graf, sha1, timestamp, subj, refs = tokens
+            time = _relative_time(int(timestamp), now)
             return _FullLine(graf, sha1, time, subj, refs)
 
         # -- a "graf-only" line has only one --
@@ -146,29 +782,55 @@ class _BaseLine:
         return _GrafOnlyLine(graf)
 
     @classmethod
-    def _condition_line(cls, line: str) -> str:
-        """Return str `line` after removing extraneous information.
+    def record_from_text(cls, line: str) -> Dict[str, Any]:
+        """Return a JSON-ready dict of the fields in the raw log line text in *line*.
 
-        Undesired information includes ' ago' and the ', {n} months' substring in the
-        relative time for commits over a year old.
+        A graf-only line has |None| for every field but `graph`. `refs` is a list of
+        the decorations git reports, e.g. `["HEAD -> master", "tag: v1"]`.
         """
-        # --- delimiter \x1b is whitespace in Python 3, so be specific what to strip ---
-        line = line.rstrip(" \n")
-        # --- Replace (2 years ago) with (2 years) ---
-        line = line.replace(" ago", "")
-        # --- Replace (2 years, 5 months) with (2 years) ---
-        line = cls.months_regex.sub("", line)
-        return line
+        tokens = cls._condition_line(line).split("\x1f")
+        graph = cls.ansi_regex.sub("", tokens[0])
 
-    @property
-    def _graf_len(self):
-        """The length of the graf string after stripping any ANSI color codes."""
-        ansi_stripped_graf = self.ansi_regex.sub("", self._graf)
-        return len(ansi_stripped_graf)
+        if len(tokens) == 1:
+            return {
+                "graph": graph,
+                "sha": None,
+                "timestamp": None,
+                "subject": None,
+                "refs": None,
+                "classifier": None,
+            }
+
+        _, sha1, timestamp, subj, refs = tokens
+        return {
+            "graph": graph,
+            "sha": sha1,
+            "timestamp": int(timestamp),
+            "subject": subj,
+            "refs": refs.strip()[1:-1].split(", ") if refs else [],
+            "classifier": cls._classifier_of(subj),
+        }
+
+    @staticmethod
+    def _classifier_of(subj: str) -> Optional[str]:
+        """Return the "classifier:" prefix word of commit subject `subj`, if it has one.
+
+        A classifier is a single word followed by a colon, like "fix:" or "docs:".
+        """
+        words = subj.split(maxsplit=1)
+        if not words or not words[0].endswith(":"):
+            return None
+        return words[0]
+
+    @classmethod
+    def _condition_line(cls, line: str) -> str:
+        """Return str `line` after removing trailing whitespace."""
+        # --- delimiter \x1b is whitespace in Python 3, so be specific what to strip ---
+        return line.rstrip(" \n")
 
 
 class _FullLine(_BaseLine):
-    """ A single git log line, broken into five tokens:
+    """A single git log line, broken into five tokens:
 
     * *graf* - the graphical ancestry line characters
     * *sha1* - the commit SHA1 hash
@@ -179,21 +841,48 @@ class _FullLine(_BaseLine):
     Handles all the ANSI coloring and line formatting.
     """
 
+    __slots__ = ("_sha1", "_time", "_subj", "_refs")
+
+    # -- colors are baked in once here rather than interpolated on every line --
+    _template = (
+        "%s" + SHA1_COLOR + "%s" + RESET + "%s"
+        "  " + TIME_COLOR + "(%s)" + RESET + "%s"
+        "  %s%s"
+    )
+    # -- the same, with the pad mark `_pad_chunk()` widens after each pad --
+    _marked_template = "".join(
+        (
+            "%s" + SHA1_COLOR + "%s" + RESET + "%s" + SHA1_PAD_MARK,
+            "  " + TIME_COLOR + "(%s)" + RESET + "%s" + TIME_PAD_MARK,
+            "  %s%s",
+        )
+    )
+
     def __init__(self, graf: str, sha1: str, time: str, subj: str, refs: str):
-        self._graf = graf
+        super(_FullLine, self).__init__(graf)
         self._sha1 = sha1
         self._time = time
         self._subj = subj
         self._refs = refs
 
-    def pretty(self, max_graf: int, max_sha1: int, max_time: int) -> str:
-        """Return this line formatted and colored, ready for display on the console."""
+    def pretty(
+        self, max_graf: int, max_sha1: int, max_time: int, marked: bool = False
+    ) -> str:
+        """Return this line formatted and colored, ready for display on the console.
+
+        With `marked`, each pad is followed by its pad mark, for `_pad_chunk()`.
+        """
         sha1_pad = " " * (max_graf + max_sha1 - self._graf_len - len(self._sha1))
         time_pad = " " * (max_time - len(self._time))
-        return (
-            f"{self._graf}{self.sha1}{sha1_pad}"
-            f"  {self.time}{time_pad}"
-            f"  {self.subj}{self.refs}"
+        template = self._marked_template if marked else self._template
+        return template % (
+            self._graf,
+            self._sha1,
+            sha1_pad,
+            self._time,
+            time_pad,
+            self.subj,
+            self.refs,
         )
 
     @property
@@ -221,10 +910,9 @@ class _FullLine(_BaseLine):
         that classifier gets a distinct color.
         """
         subj = self._subj[:50]
-        words = subj.split()
-        if not words or not words[0].endswith(":"):
+        classifier = self._classifier_of(subj)
+        if classifier is None:
             return subj
-        classifier = words[0]
         remainder = subj[len(classifier) :]
         return f"{CLASSIFIER_COLOR}{classifier}{RESET}{remainder}"
 
@@ -248,18 +936,844 @@ class _FullLine(_BaseLine):
 class _GrafOnlyLine(_BaseLine):
     """A line that contains only the graphical ancestry-line characters."""
 
-    def __init__(self, graf: str):
-        self._graf = graf
+    __slots__ = ()
 
-    def pretty(self, max_graf: int, max_sha1: int, max_time: int) -> str:
+    def pretty(
+        self, max_graf: int, max_sha1: int, max_time: int, marked: bool = False
+    ) -> str:
         """Return this line formatted and colored, ready for display on the console."""
-        # -- the max-width arguments are unused for a graf-only line --
+        # -- the arguments are unused for a graf-only line, which has no padding --
         del max_graf
         del max_sha1
         del max_time
+        del marked
         return self._graf
 
     @property
     def widths(self) -> Tuple[int, int, int]:
         """The (graf_width, sha1_width, time_width) 3-tuple for this line."""
         return self._graf_len, 0, 0
+
+
+class _Graph:
+    """The graph `git log --graph` draws beside the commits of a log chosen here.
+
+    A port of the layout in git's `graph.c`, less its colors, so the graph comes out
+    exactly as git would draw it. Commits are passed to `rows()` in log order, each with
+    those of its parents that are in the log too.
+    """
+
+    PADDING, PRE_COMMIT, COMMIT, POST_MERGE, COLLAPSING = range(5)
+
+    # --- edge drawn to each parent of a merge, from the first parent's layout on ---
+    MERGE_CHARS = "/|\\"
+
+    def __init__(self):
+        self._state = self._prev_state = self.PADDING
+        self._commit = ""
+        self._parents: List[str] = []
+        # --- column of each line of descent before and after the current commit ---
+        self._columns: List[str] = []
+        self._new_columns: List[str] = []
+        # --- new column each character position of a row is bound for, -1 if none ---
+        self._mapping: List[int] = []
+        self._old_mapping: List[int] = []
+        self._width = 0
+        self._commit_index = self._prev_commit_index = 0
+        self._expansion_row = 0
+        self._merge_layout = 0
+        self._edges_added = self._prev_edges_added = 0
+
+    def rows(self, sha: str, parents: List[str]) -> Iterator[Tuple[str, str]]:
+        """Generate (graf, sha) pair for each row drawn for commit `sha`.
+
+        `sha` is empty for each row other than the commit's own: those that make room
+        for an octopus merge before it, and those that branch to its parents and move
+        lines between columns after it. Each graf is padded to the width of the rows
+        of the commit, as git pads them.
+        """
+        self._commit, self._parents = sha, parents
+        self._prev_commit_index = self._commit_index
+        self._update_columns()
+        self._expansion_row = 0
+        # --- the rows of the last commit still count as the previous state ---
+        self._state = self.PRE_COMMIT if self._needs_pre_commit_row else self.COMMIT
+
+        output_row = {
+            self.PRE_COMMIT: self._pre_commit_row,
+            self.COMMIT: self._commit_row,
+            self.POST_MERGE: self._post_merge_row,
+            self.COLLAPSING: self._collapsing_row,
+        }
+        while self._state != self.PADDING:
+            is_commit_row = self._state == self.COMMIT
+            graf = output_row[self._state]()
+            yield graf.ljust(self._width), sha if is_commit_row else ""
+
+    @property
+    def _columns_with_commit(self) -> List[str]:
+        """The current columns, with the commit in a new last one when in none."""
+        if self._commit in self._columns:
+            return self._columns
+        return self._columns + [self._commit]
+
+    @staticmethod
+    def _at(mapping: List[int], i: int) -> int:
+        """Return the column position `i` of `mapping` is bound for, -1 past its end."""
+        return mapping[i] if i < len(mapping) else -1
+
+    def _collapsing_row(self) -> str:
+        """Return a row moving each line one column toward its place after the commit.
+
+        Lines only ever move left. One line crossing others is drawn with "_".
+        """
+        old_mapping = self._mapping
+        mapping = [-1] * len(old_mapping)
+        horizontal_edge = horizontal_edge_target = -1
+        for i, target in enumerate(old_mapping):
+            if target < 0:
+                continue
+            if target * 2 == i:
+                mapping[i] = target
+                continue
+            if mapping[i - 1] < 0:
+                mapping[i - 1] = target
+                edge = i
+            elif mapping[i - 1] == target:
+                continue
+            else:
+                mapping[i - 2] = target
+                edge = i - 1
+            if horizontal_edge == -1:
+                horizontal_edge, horizontal_edge_target = edge, target
+                for j in range(target * 2 + 3, i - 2, 2):
+                    mapping[j] = target
+        self._old_mapping = list(mapping)
+        if mapping[-1] < 0:
+            mapping.pop()
+
+        row = []
+        used_horizontal = False
+        for i, target in enumerate(mapping):
+            if target < 0:
+                row.append(" ")
+            elif target * 2 == i:
+                row.append("|")
+            elif target == horizontal_edge_target and i != horizontal_edge - 1:
+                # --- only the first segment carries on into the next row ---
+                if i != target * 2 + 3:
+                    mapping[i] = -1
+                used_horizontal = True
+                row.append("_")
+            else:
+                if used_horizontal and i < horizontal_edge:
+                    mapping[i] = -1
+                row.append("/")
+
+        self._mapping = mapping
+        if self._is_mapping_correct:
+            self._set_state(self.PADDING)
+        return "".join(row)
+
+    def _commit_row(self) -> str:
+        """Return the row of the commit itself.
+
+        Lines to the right of a merge that adds columns are drawn with "\\", as they
+        shift right to make room for its edges, and so is one still slanting from the
+        merge before. A line still moving left from the last row is drawn with "/".
+        """
+        row = []
+        seen_this = False
+        for i, column in enumerate(self._columns_with_commit):
+            if column == self._commit:
+                seen_this = True
+                row.append("*")
+                if len(self._parents) > 2 and self._dashed_parents > 0:
+                    row.append("-" * (2 * self._dashed_parents - 1) + ".")
+            elif seen_this and self._edges_added > 1:
+                row.append("\\")
+            elif seen_this and self._edges_added == 1:
+                row.append("\\" if self._follows_merge_edge(i) else "|")
+            elif self._was_moving_left(i):
+                row.append("/")
+            else:
+                row.append("|")
+            row.append(" ")
+
+        if len(self._parents) > 1:
+            self._set_state(self.POST_MERGE)
+        elif self._is_mapping_correct:
+            self._set_state(self.PADDING)
+        else:
+            self._set_state(self.COLLAPSING)
+        return "".join(row)
+
+    @property
+    def _dashed_parents(self) -> int:
+        """Number of parents of an octopus merge joined by the dashes of its row."""
+        return len(self._parents) + self._merge_layout - 3
+
+    def _follows_merge_edge(self, i: int) -> bool:
+        """True when column `i` was drawn with "\\" on the row after the last commit."""
+        if self._prev_state != self.POST_MERGE:
+            return False
+        return self._prev_edges_added > 0 and self._prev_commit_index < i
+
+    def _insert_into_new_columns(self, sha: str, commit_index: int):
+        """Give line of descent to `sha` a column after the commit, unless it has one.
+
+        `commit_index` is the column of the commit when `sha` is one of its parents,
+        and -1 when `sha` is already in a column of its own.
+        """
+        if sha in self._new_columns:
+            i = self._new_columns.index(sha)
+        else:
+            i = len(self._new_columns)
+            self._new_columns.append(sha)
+
+        num_parents = len(self._parents)
+        if num_parents > 1 and commit_index > -1 and self._merge_layout == -1:
+            # --- the first parent of a merge decides whether its edges start from the
+            # --- column of the commit or one to the right of it ---
+            dist = commit_index - i
+            shift = 2 * dist - 3 if dist > 1 else 1
+            self._merge_layout = 0 if dist > 0 else 1
+            self._edges_added = num_parents + self._merge_layout - 2
+            mapping_index = self._width + (self._merge_layout - 1) * shift
+            self._width += 2 * self._merge_layout
+        elif self._edges_added > 0 and i == self._mapping[self._width - 2]:
+            # --- the last edge of a merge joins the line in the column next to it ---
+            mapping_index = self._width - 2
+            self._edges_added = -1
+        else:
+            mapping_index = self._width
+            self._width += 2
+        self._mapping[mapping_index] = i
+
+    @property
+    def _is_mapping_correct(self) -> bool:
+        """True when each line is in its column after the commit."""
+        return all(
+            target < 0 or target == i // 2 for i, target in enumerate(self._mapping)
+        )
+
+    @property
+    def _needs_pre_commit_row(self) -> bool:
+        """True when another row is needed to make room for an octopus merge."""
+        if len(self._parents) < 3 or self._commit_index >= len(self._columns) - 1:
+            return False
+        return self._expansion_row < 2 * self._dashed_parents
+
+    def _post_merge_row(self) -> str:
+        """Return the row after a merge, drawing an edge to each of its parents."""
+        row = []
+        seen_this = parent_seen = False
+        for i, column in enumerate(self._columns_with_commit):
+            if column == self._commit:
+                seen_this = True
+                layout = self._merge_layout
+                for j in range(len(self._parents)):
+                    row.append(self.MERGE_CHARS[layout])
+                    if layout < 2:
+                        layout += 1
+                    elif self._edges_added > 0 or j < len(self._parents) - 1:
+                        row.append(" ")
+                if self._edges_added == 0:
+                    row.append(" ")
+            elif seen_this:
+                row.append("\\ " if self._edges_added > 0 else "| ")
+            else:
+                row.append("|")
+                if self._merge_layout != 0 or i != self._commit_index - 1:
+                    row.append("_" if parent_seen else " ")
+            if column == self._parents[0]:
+                parent_seen = True
+
+        self._set_state(self.PADDING if self._is_mapping_correct else self.COLLAPSING)
+        return "".join(row)
+
+    def _pre_commit_row(self) -> str:
+        """Return a row widening the gap right of an octopus merge, to fit its edges."""
+        row = []
+        seen_this = False
+        for i, column in enumerate(self._columns):
+            if column == self._commit:
+                seen_this = True
+                row.append("|" + " " * self._expansion_row)
+            elif seen_this and self._expansion_row == 0:
+                after_merge = self._prev_state == self.POST_MERGE
+                row.append("\\" if after_merge and self._prev_commit_index < i else "|")
+            elif seen_this:
+                row.append("\\")
+            else:
+                row.append("|")
+            row.append(" ")
+
+        self._expansion_row += 1
+        if not self._needs_pre_commit_row:
+            self._set_state(self.COMMIT)
+        return "".join(row)
+
+    def _set_state(self, state: int):
+        """Move on to drawing rows of `state`, remembering the state left."""
+        self._prev_state, self._state = self._state, state
+
+    def _was_moving_left(self, i: int) -> bool:
+        """True when the line in column `i` was moving left on the row before."""
+        if self._prev_state != self.COLLAPSING:
+            return False
+        was_between = self._at(self._old_mapping, 2 * i + 1) == i
+        return was_between and self._at(self._mapping, 2 * i) < i
+
+    def _update_columns(self):
+        """Lay out the columns of the lines of descent after the current commit."""
+        self._columns, self._new_columns = self._new_columns, []
+        self._mapping = [-1] * (2 * (len(self._columns) + len(self._parents)))
+        self._width = 0
+        self._prev_edges_added, self._edges_added = self._edges_added, 0
+
+        for i, column in enumerate(self._columns_with_commit):
+            if column != self._commit:
+                self._insert_into_new_columns(column, -1)
+                continue
+            self._commit_index = i
+            self._merge_layout = -1
+            for parent in self._parents:
+                self._insert_into_new_columns(parent, i)
+            # --- a commit takes up a column even when none of its parents is shown ---
+            if not self._parents:
+                self._width += 2
+
+        while len(self._mapping) > 1 and self._mapping[-1] < 0:
+            self._mapping.pop()
+
+
+class _Pager:
+    """Scrollable view of a log whose raw lines are read only as they are scrolled to.
+
+    Lines are parsed and rendered a window at a time, with column widths fitted to the
+    lines in the window, so the cost of a view is that of the lines on screen.
+    """
+
+    def __init__(self, raw_lines: Iterator[str], now: int):
+        self._raw_lines = raw_lines
+        self._now = now
+        self._fetched: List[str] = []
+        self._exhausted = False
+        self._top = 0
+
+    def fetch(self, count: int) -> int:
+        """Read raw lines until `count` have been read or the log ends.
+
+        Returns the number read so far, which is less than `count` only at the end.
+        """
+        while len(self._fetched) < count and not self._exhausted:
+            line = next(self._raw_lines, None)
+            if line is None:
+                self._exhausted = True
+            else:
+                self._fetched.append(line)
+        return len(self._fetched)
+
+    def is_at_end(self, height: int) -> bool:
+        """|True| when a window of `height` lines shows the last line of the log."""
+        return self.fetch(self._top + height + 1) <= self._top + height
+
+    def scroll(self, delta: int, height: int):
+        """Move the top of the view by `delta` lines, keeping a window of `height` full.
+
+        Reads only as far into the log as the new window reaches.
+        """
+        available = self.fetch(max(self._top + delta, 0) + height)
+        self._top = max(min(self._top + delta, available - height), 0)
+
+    def window(self, height: int) -> List[str]:
+        """Return the colored lines of the window `height` lines tall at the top."""
+        self.fetch(self._top + height)
+        raw_lines = self._fetched[self._top : self._top + height]
+        log_lines = _LogLines(
+            _BaseLine.from_text(line, self._now) for line in raw_lines
+        )
+        return list(log_lines.pretty_lines())
+
+
+class _RefDecorations:
+    """The names git's `%d` decorates each commit with, read once from every ref.
+
+    Refs are read straight from `packed-refs` and the loose ref files and indexed by
+    the abbreviated hash `%h` prints; a commit's names are picked out and formatted
+    when it is asked for. So the cost of a log is reading the refs once, without
+    running git in the usual case, plus decorating the commits printed.
+    """
+
+    def __init__(
+        self, ref_lines: List[str], head_ref: str, loose: Dict[str, List[str]]
+    ):
+        self._ref_lines = ref_lines
+        self._head_ref = head_ref
+        self._loose = loose
+        self._hash_len = ref_lines[0].find(" ") if ref_lines else 0
+        self._indexes: Dict[int, Tuple[Dict[str, str], Dict[str, List[str]]]] = {}
+
+    @classmethod
+    def load(
+        cls, git_dirs: Tuple[str, str], repo_dir: Optional[str] = None
+    ) -> "_RefDecorations":
+        """Return the decorations of the repository having `git_dirs`.
+
+        Each ref is read as a "{sha} {refname}" line, as `git show-ref` prints it, and
+        a ref to an annotated tag is followed by a "{sha} {refname}^{}" line for the
+        commit it tags. `packed-refs` records that commit; only to peel a loose tag is
+        git run, in `repo_dir`.
+        """
+        git_dir, common_dir = git_dirs
+        packed_lines, tags_peeled = cls._packed_ref_lines(common_dir)
+        loose_refs = cls._loose_refs(common_dir)
+
+        loose_lines = []
+        for refname, value in sorted(loose_refs.items()):
+            sha = cls._resolve(value, loose_refs, packed_lines)
+            if sha:
+                loose_lines.append("%s %s" % (sha, refname))
+        to_peel = cls._tag_lines(loose_lines)
+        if not tags_peeled:
+            to_peel += cls._tag_lines(packed_lines)
+        loose_lines += cls._peeled_tag_lines(to_peel, repo_dir)
+
+        # --- a loose ref overrides any packed ref of the same name ---
+        loose: Dict[str, List[str]] = {}
+        for line in loose_lines:
+            sha, _, refname = line.partition(" ")
+            loose.setdefault(refname.replace("^{}", ""), []).append(sha)
+
+        try:
+            with open(os.path.join(git_dir, "HEAD")) as f:
+                head = f.read().strip()
+        except OSError:
+            head = ""
+        head_sha = cls._resolve(head, loose_refs, packed_lines)
+        if head_sha:
+            loose_lines.append("%s HEAD" % head_sha)
+        head_ref = head[5:] if head.startswith("ref: ") else ""
+        return cls(packed_lines + loose_lines, head_ref, loose)
+
+    def of(self, abbrev: str) -> str:
+        """Return the decoration of commit `abbrev` as `%d` formats it, e.g. " (HEAD)".
+
+        `abbrev` is the commit's hash as `%h` abbreviates it, which no other object's
+        hash begins with. Names are in git's order, the reverse of their refnames',
+        except that HEAD comes first, as "HEAD -> {branch}" in place of its branch.
+        """
+        line_of, lines_of = self._index(len(abbrev))
+        lines = lines_of.get(abbrev)
+        if lines is None:
+            line = line_of.get(abbrev)
+            if line is None:
+                return ""
+            lines = [line]
+
+        refnames = sorted(
+            {
+                refname
+                for sha, refname in (
+                    (
+                        line[: self._hash_len],
+                        line[self._hash_len + 1 :].replace("^{}", ""),
+                    )
+                    for line in lines
+                )
+                if sha in self._loose.get(refname, [sha])
+            }
+        )
+        names = []
+        head = "HEAD" in refnames
+        for refname in reversed(refnames):
+            if refname == self._head_ref and head:
+                names.insert(0, "HEAD -> %s" % self._short_name(refname))
+                head = False
+            elif refname.startswith(DECORATION_PREFIXES) or refname == "refs/stash":
+                names.append(self._short_name(refname))
+        if head:
+            names.insert(0, "HEAD")
+        return " (%s)" % ", ".join(names) if names else ""
+
+    def _index(self, length: int) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+        """Return (line_of, lines_of) pair indexing ref lines by first `length` digits.
+
+        Most commits have at most one ref, so `line_of` is built without a Python loop
+        over the refs and only the lines of commits having several are grouped into
+        `lines_of`. An index is built for each length of abbreviation asked for.
+        """
+        index = self._indexes.get(length)
+        if index is None:
+            ref_lines = self._ref_lines
+            prefixes = [line[:length] for line in ref_lines]
+            counts = Counter(prefixes)
+            lines_of: Dict[str, List[str]] = {}
+            for prefix, line in [
+                (prefix, line)
+                for prefix, line in zip(prefixes, ref_lines)
+                if counts[prefix] > 1
+            ]:
+                lines_of.setdefault(prefix, []).append(line)
+            index = self._indexes[length] = (dict(zip(prefixes, ref_lines)), lines_of)
+        return index
+
+    @staticmethod
+    def _loose_refs(common_dir: str) -> Dict[str, str]:
+        """Return dict mapping each loose ref to its file's content, a sha or "ref: ..."
+
+        Only refs that can decorate a commit are read.
+        """
+        loose_refs = {}
+        refs_dir = os.path.join(common_dir, "refs")
+        for dirpath, _, filenames in os.walk(refs_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                refname = "refs/" + os.path.relpath(path, refs_dir).replace(os.sep, "/")
+                if filename.endswith(".lock") or not (
+                    refname.startswith(DECORATION_PREFIXES) or refname == "refs/stash"
+                ):
+                    continue
+                try:
+                    with open(path) as f:
+                        loose_refs[refname] = f.read().strip()
+                except OSError:
+                    continue
+        return loose_refs
+
+    @staticmethod
+    def _packed_ref_lines(common_dir: str) -> Tuple[List[str], bool]:
+        """Return (ref_lines, tags_peeled) pair read from `packed-refs`.
+
+        A "^{sha}" line, recording the commit a tag peels to, becomes a
+        "{sha} {refname}^{}" line. `tags_peeled` is |True| when git recorded that for
+        every annotated tag, as it has since version 1.6.
+        """
+        try:
+            with open(os.path.join(common_dir, "packed-refs")) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return [], True
+        tags_peeled = bool(lines) and " peeled" in lines[0]
+        if lines and lines[0].startswith("#"):
+            lines = lines[1:]
+        ref_lines = [
+            "%s %s^{}" % (line[1:], lines[i - 1].partition(" ")[2])
+            if line[0] == "^"
+            else line
+            for i, line in enumerate(lines)
+        ]
+        return ref_lines, tags_peeled
+
+    @staticmethod
+    def _peeled_tag_lines(tag_lines: List[str], repo_dir: Optional[str]) -> List[str]:
+        """Return a "{sha} {refname}^{}" line for each of `tag_lines` that is annotated.
+
+        Asks git for the commit each tag peels to, all in one `cat-file` process.
+        """
+        if not tag_lines:
+            return []
+        _, out, _ = run(
+            _git_command(["cat-file", "--batch-check=%(objectname)"], repo_dir),
+            query=True,
+            input="".join(
+                "%s^{}\n" % line.partition(" ")[0] for line in tag_lines
+            ).encode("utf-8"),
+        )
+        return [
+            "%s %s^{}" % (peeled, line.partition(" ")[2])
+            for line, peeled in zip(tag_lines, str(out, encoding="utf-8").splitlines())
+            if peeled != line.partition(" ")[0] and " " not in peeled
+        ]
+
+    @staticmethod
+    def _resolve(
+        value: str, loose_refs: Dict[str, str], packed_lines: List[str]
+    ) -> str:
+        """Return the sha a ref file containing `value` points to, empty if unknown.
+
+        `value` is a sha, or "ref: {refname}" for a symbolic ref like HEAD, whose
+        target is looked up among `loose_refs`, then `packed_lines`.
+        """
+        for _ in range(5):
+            if not value.startswith("ref: "):
+                return value
+            target = value[5:]
+            suffix = " " + target
+            value = loose_refs.get(target) or next(
+                (
+                    line.partition(" ")[0]
+                    for line in packed_lines
+                    if line.endswith(suffix)
+                ),
+                "",
+            )
+        return ""
+
+    @staticmethod
+    def _short_name(refname: str) -> str:
+        """Return the name `%d` shows for `refname`, e.g. "tag: v1" or "master"."""
+        if refname.startswith("refs/tags/"):
+            return "tag: " + refname[10:]
+        if refname.startswith("refs/heads/"):
+            return refname[11:]
+        if refname.startswith("refs/remotes/"):
+            return refname[13:]
+        return refname
+
+    @staticmethod
+    def _tag_lines(ref_lines: List[str]) -> List[str]:
+        """Return those of `ref_lines` for a tag, which may be annotated."""
+        return [
+            line for line in ref_lines if " refs/tags/" in line and line[-3:] != "^{}"
+        ]
+
+
+class _Screen:
+    """Full-screen view of the terminal that rewrites only the lines that change.
+
+    Used as a context manager, it switches to the terminal's alternate screen with the
+    cursor hidden and line wrap off, restoring all three on exit.
+    """
+
+    def __init__(self, out: TextIO):
+        self._out = out
+        self._rows: List[str] = []
+        self._size: Optional[os.terminal_size] = None
+
+    def __enter__(self) -> "_Screen":
+        self._out.write("\033[?1049h\033[?25l\033[?7l")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._out.write("\033[?7h\033[?25h\033[?1049l")
+        self._out.flush()
+
+    def paint(self, lines: List[str]):
+        """Make the screen show `lines`, as many as fit, writing only what changed.
+
+        The whole screen is redrawn when the terminal has been resized.
+        """
+        size = os.get_terminal_size(self._out.fileno())
+        if size != self._size:
+            self._out.write("\033[H\033[2J")
+            self._rows, self._size = [], size
+        lines = lines[: size.lines or None]
+
+        updates = [
+            "\033[%d;1H%s\033[K" % (row + 1, line)
+            for row, line in enumerate(lines)
+            if row >= len(self._rows) or self._rows[row] != line
+        ]
+        if len(lines) < len(self._rows):
+            updates.append("\033[%d;1H\033[J" % (len(lines) + 1))
+        self._out.write("".join(updates))
+        self._out.flush()
+        self._rows = lines
+
+
+def _commit_rev(rev: str) -> str:
+    """Return `rev` with each revision it names peeled to a commit.
+
+    E.g. "v1..v2" becomes "v1^{commit}..v2^{commit}", so a tag names the commit it
+    tags rather than the tag object.
+    """
+    for dots in ("...", ".."):
+        if dots in rev:
+            return dots.join(_commit_rev(part or "HEAD") for part in rev.split(dots, 1))
+    if rev.startswith("^"):
+        return "^" + _commit_rev(rev[1:])
+    return rev + "^{commit}"
+
+
+def _decoration_configured(repo_dir: Optional[str] = None) -> bool:
+    """|True| when config of the repo at `repo_dir` changes how commits are decorated.
+
+    Such config, like `log.decorate=full`, is honored only by git's `%d`. `repo_dir`
+    defaults to the working directory.
+    """
+    # --- git exits 1 when no config matches, so only the output is telling ---
+    _, out, _ = run(
+        _git_command(
+            ["config", "--get-regexp", "--name-only", DECORATION_CONFIG], repo_dir
+        ),
+        query=True,
+    )
+    return out != b""
+
+
+def _git_command(args: List[str], repo_dir: Optional[str] = None) -> List[str]:
+    """Return the command line running git with `args` in the repo at `repo_dir`.
+
+    `repo_dir` defaults to the working directory.
+    """
+    return ["git"] + ([] if repo_dir is None else ["-C", repo_dir]) + args
+
+
+def _git_dirs(repo_dir: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """Return the (git_dir, common_dir) absolute paths of the repo at `repo_dir`.
+
+    `repo_dir` defaults to the working directory. Returns |None| when it is not in a
+    repository.
+    """
+    rc, out, _ = run(
+        _git_command(
+            ["rev-parse", "--path-format=absolute", "--git-dir", "--git-common-dir"],
+            repo_dir,
+        ),
+        query=True,
+    )
+    if rc != 0:
+        return None
+    git_dir, common_dir = str(out, encoding="utf-8").splitlines()
+    return git_dir, common_dir
+
+
+@functools.lru_cache(maxsize=None)
+def _plural(count: int, unit: str) -> str:
+    """Return e.g. "1 day" or "3 days" for `count` of `unit`."""
+    return "%d %s" % (count, unit if count == 1 else unit + "s")
+
+
+def _read_nonblocking(fd: int) -> bytes:
+    """Return the bytes waiting on non-blocking `fd`, empty when there are none."""
+    try:
+        return os.read(fd, 512)
+    except BlockingIOError:
+        return b""
+
+
+def _relative_time(timestamp: int, now: int) -> str:
+    """Return relative time since epoch `timestamp` as of `now`, e.g. "3 hours".
+
+    Follows the bucketing git uses for `%ar` exactly, less the " ago" suffix and the
+    ", {n} months" git adds to times between one and five years. Formatted buckets are
+    memoized, so a long log formats each distinct label only once.
+    """
+    diff = now - timestamp
+    if diff < 0:
+        return "in the future"
+    if diff < 90:
+        return _plural(diff, "second")
+    # -- minutes --
+    diff = (diff + 30) // 60
+    if diff < 90:
+        return _plural(diff, "minute")
+    # -- hours --
+    diff = (diff + 30) // 60
+    if diff < 36:
+        return _plural(diff, "hour")
+    # -- days from here on --
+    diff = (diff + 12) // 24
+    if diff < 14:
+        return _plural(diff, "day")
+    if diff < 70:
+        return _plural((diff + 3) // 7, "week")
+    if diff < 365:
+        return _plural((diff + 15) // 30, "month")
+    if diff < 1825:
+        return _plural((diff * 12 * 2 + 365) // (365 * 2) // 12, "year")
+    return _plural((diff + 183) // 365, "year")
+
+
+def _searched_lines(
+    args: List[str], fmt: str, repo_dir: Optional[str] = None
+) -> Optional[List[str]]:
+    """Return the raw lines of the log `args` select, found through the search index.
+
+    `fmt` is the format each commit is logged in.
+
+    Only a log of revisions, or `--all`, filtered by literal `--grep` and `--author`
+    patterns and perhaps limited to a number of commits, is found this way. |None| is
+    returned for any other, or when the repository has no index, so the caller can
+    run git instead. Git lists the commits in the range, in the order it would log
+    them, and formats those found; the graph joins each to the parents that match too.
+    """
+    try:
+        import sqlite3
+
+        from ..gitlib import Repo
+        from ..search import SearchIndex, SearchQuery
+    except ImportError:
+        return None
+
+    parsed = SearchQuery.from_args(args)
+    if parsed is None:
+        return None
+    query, other_args = parsed
+    revs: List[str] = []
+    max_count = None
+    for arg in other_args:
+        if re.match(r"-\d+$", arg):
+            max_count = int(arg[1:])
+        elif re.match(r"--max-count=\d+$", arg):
+            max_count = int(arg[len("--max-count=") :])
+        elif arg.startswith("-") and arg != "--all":
+            return None
+        else:
+            revs.append(arg)
+    all_refs = "--all" in revs
+    if not revs:
+        revs = ["HEAD"]
+    tip_revs = [_commit_rev(rev) for rev in revs if rev != "--all"]
+
+    rc, out, _ = run(
+        _git_command(
+            ["rev-parse"] + tip_revs + (["HEAD^{commit}"] if all_refs else []), repo_dir
+        ),
+        query=True,
+    )
+    shas = str(out, encoding="utf-8").split()
+    if rc != 0 or not all(re.match(r"\^?[0-9a-f]{40}$", s) for s in shas):
+        return None
+    tips = [sha for sha in shas if sha[0] != "^"]
+
+    with Repo(repo_dir):
+        index = SearchIndex.open()
+        if index is None:
+            return None
+        try:
+            ref_commits = index.update() if all_refs else []
+            index.add(tips)
+        except (RunCmdError, sqlite3.Error):
+            return None
+
+        # --- git walks the range from the commit-graph, reading no commit message;
+        # --- `--all` is passed as the commits the refs peel to, in the order git adds
+        # --- them, so it reads no tag object either ---
+        walk_revs: List[str] = []
+        for rev in revs:
+            walk_revs += ["HEAD"] + ref_commits if rev == "--all" else [rev]
+        rc, out, _ = run(
+            _git_command(["rev-list", "--topo-order", "--stdin"], repo_dir),
+            query=True,
+            input="".join("%s\n" % rev for rev in walk_revs).encode("utf-8"),
+        )
+        if rc != 0:
+            return None
+        try:
+            commits = index.search(query, str(out, encoding="utf-8").split())
+            commits = commits[:max_count]
+        except sqlite3.Error:
+            return None
+    if not commits:
+        return []
+
+    rc, out, _ = run(
+        _git_command(
+            ["log", "--no-walk=unsorted", "--stdin", "--pretty=tformat:%s" % fmt],
+            repo_dir,
+        ),
+        query=True,
+        input="".join("%s\n" % sha for sha, _ in commits).encode("utf-8"),
+    )
+    fields = str(out, encoding="utf-8").splitlines()
+    if rc != 0 or len(fields) != len(commits):
+        return None
+    graph = _Graph()
+    lines = []
+    for (sha, parents), fields_line in zip(commits, fields):
+        for graf, row_sha in graph.rows(sha, parents):
+            lines.append("%s%s\n" % (graf, fields_line if row_sha else ""))
+    return lines
@@ -3,7 +3,10 @@
 """Move the current branch (upward) to its immediate child.
 
 Exits with an error message if there is not exactly one direct child or if changes in
-the working directory would be lost.
+the working directory would be lost. When `fix --worktree` keeps 'fixit' in a worktree
+of its own beside the current one, 'fixit' is moved there instead, leaving the current
+worktree alone, and the worktree moved in is named. Run from any other worktree, the
+current branch is moved as usual.
 """
 
 from __future__ import print_function
@@ -11,13 +14,25 @@ from __future__ import print_function
 import sys
 
 from .exceptions import ExecutionError
-from ..gitlib import children_of_head, is_clean, is_git_repo, reset_hard_to
+from .fix import fixit_worktree
+from ..gitlib import (
+    Repo,
+    children_of_head,
+    is_clean,
+    is_git_repo,
+    reset_hard_to,
+)
 
 
 def main():
     """Entry point for 'next' script."""
     try:
-        _next()
+        # --- 'fixit' kept beside this worktree by `fix --worktree` moves there ---
+        path = fixit_worktree()
+        with Repo(path):
+            _next()
+        if path is not None:
+            print("fixit is checked out in %s" % path)
     except ExecutionError as e:
         print(e.message, file=sys.stderr)
         return e.return_code
@@ -3,7 +3,10 @@
 """Move the current branch (downward) to its parent commit.
 
 Exits with an error message if changes in the working directory would be lost or if the
-current commit would no longer be reachable.
+current commit would no longer be reachable. When `fix --worktree` keeps 'fixit' in a
+worktree of its own beside the current one, 'fixit' is moved there instead, leaving the
+current worktree alone, and the worktree moved in is named. Run from any other worktree,
+the current branch is moved as usual.
 """
 
 from __future__ import print_function
@@ -11,7 +14,9 @@ from __future__ import print_function
 import sys
 
 from .exceptions import ExecutionError
+from .fix import fixit_worktree
 from ..gitlib import (
+    Repo,
     head_is_independent,
     is_clean,
     is_git_repo,
@@ -23,7 +28,12 @@ from ..gitlib import (
 def main():
     """Entry point for 'prev' script."""
     try:
-        _prev()
+        # --- 'fixit' kept beside this worktree by `fix --worktree` moves there ---
+        path = fixit_worktree()
+        with Repo(path):
+            _prev()
+        if path is not None:
+            print("fixit is checked out in %s" % path)
     except ExecutionError as e:
         print(e.message, file=sys.stderr)
         return e.return_code
@@ -0,0 +1,139 @@
+# encoding: utf-8
+
+"""Move every local branch descended from an old base onto a new one.
+
+After a commit is amended on `fixit`, `restack <old-commit>` replays each branch built
+on the old commit, like `spike`, onto its replacement at HEAD. The history the branches
+share is replayed once, without touching the working tree, and the branches are moved
+in a single `git update-ref` transaction, so either every branch moves or none does.
+The working tree is updated only when the current branch is one of those moved.
+
+Exits with an error message if the working tree is dirty, a branch to move is checked
+out in another worktree, or a replayed commit conflicts, leaving every branch as it
+was.
+"""
+
+import sys
+from typing import List, Optional
+
+from .exceptions import ExecutionError
+from ..gitlib import (
+    ReplayError,
+    branches_containing,
+    current_branch_name,
+    full_hash_of,
+    is_clean,
+    is_git_repo,
+    read_tree_update,
+    ref_commit_hashes,
+    replay_onto,
+    update_refs,
+    worktree_branches,
+)
+from ..runcmd import RunCmdError
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for 'restack' script."""
+    args = sys.argv[1:] if argv is None else argv[1:]
+    if len(args) not in (1, 2):
+        print("usage: restack <old-base> [<new-base>]")
+        return 1
+
+    old_base, newbase = args[0], args[1] if len(args) == 2 else "HEAD"
+
+    try:
+        _restack(old_base, newbase)
+    except ExecutionError as e:
+        print(e.message, file=sys.stderr)
+        return e.return_code
+    return 0
+
+
+def _exit_if_checked_out_elsewhere(branch_names: List[str], orig_branch: str):
+    """Exit with error message when one of `branch_names` is checked out elsewhere.
+
+    Moving a branch checked out in another worktree would leave that worktree's index
+    and files describing the old commits.
+    """
+    worktrees = worktree_branches()
+    for name in branch_names:
+        if name != orig_branch and name in worktrees:
+            raise ExecutionError(
+                "Branch %s is checked out in worktree %s.\nAborting."
+                % (name, worktrees[name]),
+                7,
+            )
+
+
+def _exit_if_not_valid_in_context(old_base: str, newbase: str):
+    """Exit with error message when current state does not permit restack.
+
+    These conditions are:
+
+    * the current working directory is not in a Git repository
+    * `old_base` or `newbase` is not a revision in the repository
+    * the working directory is dirty
+
+    """
+    if not is_git_repo():
+        raise ExecutionError("Not in a Git repository.\nAborting.", 2)
+
+    for commitish in (old_base, newbase):
+        try:
+            full_hash_of("%s^{commit}" % commitish)
+        except RunCmdError:
+            raise ExecutionError("Unknown revision %s.\a" % commitish, 4)
+
+    if not is_clean():
+        raise ExecutionError("Workspace contains uncommitted changes.\nAborting.\a", 3)
+
+
+def _restack(old_base: str, newbase: str):
+    """Replay each local branch descended from `old_base` onto `newbase`."""
+    _exit_if_not_valid_in_context(old_base, newbase)
+
+    branch_refs = ["refs/heads/%s" % name for name in branches_containing(old_base)]
+    ref_hashes = ref_commit_hashes()
+    tips = {refname: ref_hashes[refname] for refname in branch_refs}
+
+    try:
+        rewritten = replay_onto(newbase, old_base, list(tips.values()))
+    except ReplayError as e:
+        if e.is_merge:
+            raise ExecutionError(
+                "Commit %s merges in a branch built on %s.\nAborting."
+                % (e.commit[:7], old_base),
+                6,
+            )
+        raise ExecutionError(
+            "Commit %s conflicts when replayed onto %s.\nAborting.\a"
+            % (e.commit[:7], newbase),
+            5,
+        )
+
+    # --- a branch already on `newbase`, like `fixit` itself, stays where it is ---
+    moves = [
+        (refname, rewritten[tip], tip)
+        for refname, tip in tips.items()
+        if rewritten.get(tip, tip) != tip
+    ]
+    if not moves:
+        print("No branch to restack onto %s." % newbase)
+        return
+
+    orig_branch = current_branch_name()
+    _exit_if_checked_out_elsewhere(
+        [refname[11:] for refname, _, _ in moves], orig_branch
+    )
+
+    update_refs(moves, "restack: %s onto %s" % (old_base, newbase))
+
+    for refname, new, old in moves:
+        if refname == "refs/heads/%s" % orig_branch:
+            read_tree_update(old, new)
+
+    print(
+        "Restacked %s onto %s."
+        % (", ".join(refname[11:] for refname, _, _ in moves), newbase)
+    )
@@ -0,0 +1,64 @@
+# encoding: utf-8
+
+"""Build the full-text index of commit messages `git lawg` searches.
+
+    usage: githelpers search-index [--remove]
+
+Indexes the message and author of every commit reachable from a ref, after which `git
+lawg --grep` and `--author` with literal patterns find their commits in the index
+rather than having git read the message of each commit in the range. Each search adds
+the commits made since, so the index need only be built once. With `--remove`, the
+index is deleted and searches go back to git.
+"""
+
+import sqlite3
+import sys
+from typing import List, Optional
+
+from .exceptions import ExecutionError
+from ..gitlib import is_git_repo
+from ..runcmd import RunCmdError
+from ..search import SearchIndex
+
+USAGE = "usage: githelpers search-index [--remove]"
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for 'githelpers search-index' subcommand."""
+    args = sys.argv[1:] if argv is None else argv[1:]
+    if args not in ([], ["--remove"]):
+        print(USAGE)
+        return 1
+
+    try:
+        if not is_git_repo():
+            raise ExecutionError("Not in a Git repository.\nAborting.", 2)
+        if args:
+            _remove()
+        else:
+            _build()
+    except ExecutionError as e:
+        print(e.message, file=sys.stderr)
+        return e.return_code
+    return 0
+
+
+def _build():
+    """Build the index of the current repository, or bring it up to date."""
+    try:
+        index = SearchIndex.build()
+    except sqlite3.Error as e:
+        raise ExecutionError(
+            "Could not build the search index, which needs SQLite with FTS5:\n%s\n"
+            "Aborting." % e,
+            4,
+        )
+    except RunCmdError as e:
+        raise ExecutionError("Could not build the search index:\n%s\nAborting." % e, 4)
+    print("Indexed %d commits." % len(index))
+
+
+def _remove():
+    """Remove the index of the current repository."""
+    SearchIndex.remove()
+    print("Removed the search index.")
@@ -0,0 +1,316 @@
+# encoding: utf-8
+
+"""Full-text index of commit messages and authors, answering `git lawg --grep`.
+
+`git log --grep` and `--author` have git inflate and match the message of every commit
+in the walk, however few match. `githelpers search-index` builds an SQLite FTS5 index
+of the subject, body, author, and date of every commit reachable from a ref, along
+with its parents, in `search-index.sqlite3` in the `githelpers` directory of the git
+common dir. A search then needs from git only the list of commits in the range, which
+it walks from the commit-graph without reading a message, and the formatting of the
+commits that match.
+
+The index is kept current from new ref tips: the commits reachable from them are
+indexed in a walk bounded by the tips indexed before, so each update costs only the
+new commits. It follows that the index holds every ancestor of each commit it holds.
+The commit each tip peels to is recorded with it, so that the commits of every ref can
+be listed without git reading a tag object.
+
+The trigram tokenizer finds any literal substring of at least three characters, as a
+`--grep` pattern without regular-expression characters is matched, and each commit it
+finds is checked against the pattern itself, for git's case sensitivity.
+
+The index is optional. It needs an SQLite built with FTS5, and `SearchIndex.open()`
+returns |None| when the repository has none, so callers can fall back to git.
+"""
+
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .gitlib import commit_messages, commits_of, git_common_dir, ref_hashes
+
+INDEX_VERSION = 1
+
+# -- shortest pattern the trigram tokenizer can look up --
+MIN_PATTERN_LENGTH = 3
+
+# -- characters special in the basic regular expressions `--grep` takes by default; a
+# -- pattern having none of them matches itself literally --
+REGEX_CHARS = frozenset(".[]*^$\\")
+
+SCHEMA = (
+    "CREATE TABLE commits (id INTEGER PRIMARY KEY, sha TEXT UNIQUE NOT NULL,"
+    " parents TEXT NOT NULL, time INTEGER NOT NULL, author TEXT NOT NULL,"
+    " date INTEGER NOT NULL, subject TEXT NOT NULL, body TEXT NOT NULL)",
+    "CREATE VIRTUAL TABLE messages USING fts5(author, subject, body,"
+    " content=commits, content_rowid=id, tokenize=trigram)",
+    "CREATE TABLE tips (sha TEXT PRIMARY KEY, commit_sha TEXT)",
+    "PRAGMA user_version = %d" % INDEX_VERSION,
+)
+
+
+class SearchQuery:
+    """The commit filters of a `git log` command line that the index can answer.
+
+    A commit matches when its message contains any of `greps`, or all of them when
+    `all_match`, and its author contains any of `authors`, as `git log` combines those
+    options. Each pattern is a literal string, compared ignoring case when
+    `ignore_case`.
+    """
+
+    def __init__(
+        self,
+        greps: List[str],
+        authors: List[str],
+        all_match: bool = False,
+        ignore_case: bool = False,
+    ):
+        self._greps = greps
+        self._authors = authors
+        self._all_match = all_match
+        self._ignore_case = ignore_case
+
+    @classmethod
+    def from_args(cls, args: List[str]) -> Optional[Tuple["SearchQuery", List[str]]]:
+        """Return (query, other_args) pair parsed from `git log` command-line `args`.
+
+        `other_args` are those of `args` that are not commit filters. Returns |None|
+        when `args` filter by no pattern, or by one the index cannot look up: a
+        regular expression, or a string shorter than MIN_PATTERN_LENGTH.
+        """
+        greps: List[str] = []
+        authors: List[str] = []
+        all_match = fixed = ignore_case = False
+        other_args: List[str] = []
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            if arg in ("--grep", "--author") and args:
+                arg = "%s=%s" % (arg, args.pop(0))
+            if arg.startswith("--grep="):
+                greps.append(arg[len("--grep=") :])
+            elif arg.startswith("--author="):
+                authors.append(arg[len("--author=") :])
+            elif arg == "--all-match":
+                all_match = True
+            elif arg in ("--fixed-strings", "-F"):
+                fixed = True
+            elif arg in ("--regexp-ignore-case", "-i"):
+                ignore_case = True
+            elif arg != "--basic-regexp":
+                other_args.append(arg)
+
+        patterns = greps + authors
+        if not patterns or any(len(p) < MIN_PATTERN_LENGTH for p in patterns):
+            return None
+        if not fixed and any(REGEX_CHARS.intersection(p) for p in patterns):
+            return None
+        return cls(greps, authors, all_match, ignore_case), other_args
+
+    @property
+    def match_expression(self) -> str:
+        """The FTS5 expression finding each commit that may match this query."""
+        terms = []
+        if self._greps:
+            operator = " AND " if self._all_match else " OR "
+            terms.append(
+                operator.join(
+                    "{subject body}:%s" % self._phrase(grep) for grep in self._greps
+                )
+            )
+        if self._authors:
+            terms.append(
+                " OR ".join(
+                    "author:%s" % self._phrase(author) for author in self._authors
+                )
+            )
+        return " AND ".join("(%s)" % term for term in terms)
+
+    def matches(self, author: str, subject: str, body: str) -> bool:
+        """Return |True| if a commit by `author` with `subject` and `body` matches."""
+        fold = str.lower if self._ignore_case else str
+
+        def contains(text: str, pattern: str) -> bool:
+            return fold(pattern) in fold(text)
+
+        if self._authors and not any(contains(author, a) for a in self._authors):
+            return False
+        if not self._greps:
+            return True
+        found = [contains(subject, g) or contains(body, g) for g in self._greps]
+        return all(found) if self._all_match else any(found)
+
+    @staticmethod
+    def _phrase(pattern: str) -> str:
+        """Return `pattern` quoted as an FTS5 string, matching it as a substring."""
+        return '"%s"' % pattern.replace('"', '""')
+
+
+class SearchIndex:
+    """Full-text index of the commits reachable from the refs of a repository.
+
+    Commits are only ever added, since a commit never changes. The ref tips the index
+    was last brought up to date with are recorded, each with the commit it peels to, to
+    bound the next update.
+    """
+
+    def __init__(self, db: sqlite3.Connection):
+        self._db = db
+
+    def __len__(self) -> int:
+        """Number of commits in the index."""
+        return self._db.execute("SELECT count(*) FROM commits").fetchone()[0]
+
+    @classmethod
+    def build(cls) -> "SearchIndex":
+        """Return the index of the current repository, created if need be, up to date.
+
+        An index of another version is replaced. Raises |sqlite3.Error| when SQLite
+        has no FTS5.
+        """
+        path = cls._path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = sqlite3.connect(path)
+        if db.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            db.close()
+            os.remove(path)
+            db = sqlite3.connect(path)
+            with db:
+                for statement in SCHEMA:
+                    db.execute(statement)
+        index = cls(db)
+        index.update()
+        return index
+
+    @classmethod
+    def open(cls) -> Optional["SearchIndex"]:
+        """Return the index of the current repository, |None| if it has none.
+
+        An index of another version, or one SQLite cannot read for want of FTS5, is
+        treated as none.
+        """
+        path = cls._path()
+        if not os.path.exists(path):
+            return None
+        try:
+            db = sqlite3.connect(path)
+            if db.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+                return None
+            db.execute("SELECT rowid FROM messages LIMIT 0")
+        except sqlite3.Error:
+            return None
+        return cls(db)
+
+    @classmethod
+    def remove(cls):
+        """Remove the index of the current repository, if it has one."""
+        try:
+            os.remove(cls._path())
+        except FileNotFoundError:
+            pass
+
+    def add(self, shas: Iterable[str]):
+        """Index each commit of `shas` not indexed yet, with its unindexed ancestors.
+
+        The walk is bounded by the ref tips indexed before, and git is not run at all
+        when each commit is indexed already.
+        """
+        new = [sha for sha in dict.fromkeys(shas) if not self._is_indexed(sha)]
+        if new:
+            self._index(new, [sha for sha in self._tips().values() if sha])
+
+    def search(
+        self, query: SearchQuery, commits: List[str]
+    ) -> List[Tuple[str, List[str]]]:
+        """Return (sha, parents) pair for each of `commits` that matches `query`.
+
+        Commits are in the order of `commits`, which must all be indexed. The parents
+        of each are those among `commits` that match too, the ones `git log --graph`
+        joins a commit to when filtering by pattern.
+        """
+        rows = self._db.execute(
+            "SELECT sha, commits.parents, commits.author, commits.subject, commits.body"
+            " FROM messages JOIN commits ON commits.id = messages.rowid"
+            " WHERE messages MATCH ?",
+            (query.match_expression,),
+        )
+        parents_of = {
+            sha: parents.split()
+            for sha, parents, author, subject, body in rows
+            if query.matches(author, subject, body)
+        }
+        matched = parents_of.keys() & set(commits)
+        return [
+            (sha, [parent for parent in parents_of[sha] if parent in matched])
+            for sha in commits
+            if sha in matched
+        ]
+
+    def update(self) -> List[str]:
+        """Return the commit each ref peels to, indexed along with their ancestors.
+
+        Commits are in the order `git log --all` adds them, that of the refnames, each
+        once. Only the refs that moved since the last update are walked from, down to
+        the commits of the ref tips indexed before.
+        """
+        ref_tips = list(ref_hashes().values())
+        indexed = self._tips()
+        new = sorted(set(ref_tips) - indexed.keys())
+        peeled = commits_of(new) if new else {}
+        known = {sha for sha in indexed.values() if sha}
+        tips = sorted(set(peeled.values()) - known)
+        if tips:
+            self._index(tips, known)
+
+        commit_of = {
+            sha: indexed[sha] if sha in indexed else peeled.get(sha) for sha in ref_tips
+        }
+        if commit_of.keys() != indexed.keys():
+            with self._db:
+                self._db.execute("DELETE FROM tips")
+                self._db.executemany(
+                    "INSERT INTO tips (sha, commit_sha) VALUES (?, ?)",
+                    commit_of.items(),
+                )
+        return list(dict.fromkeys(sha for sha in commit_of.values() if sha))
+
+    def _index(self, tips: List[str], known: Iterable[str]):
+        """Index the commits reachable from `tips` but not from the `known` commits."""
+        rows = []
+        revs = tips + ["^%s" % sha for sha in sorted(known)]
+        for sha, parents, time, author, date, message in commit_messages(revs):
+            subject, _, body = message.rstrip("\n").partition("\n")
+            rows.append(
+                (sha, " ".join(parents), time, author, date, subject, body.strip())
+            )
+        with self._db:
+            (last_id,) = self._db.execute("SELECT max(id) FROM commits").fetchone()
+            self._db.executemany(
+                "INSERT OR IGNORE INTO commits"
+                " (sha, parents, time, author, date, subject, body)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.execute(
+                "INSERT INTO messages (rowid, author, subject, body)"
+                " SELECT id, author, subject, body FROM commits WHERE id > ?",
+                (last_id or 0,),
+            )
+
+    def _is_indexed(self, sha: str) -> bool:
+        """Return |True| if commit `sha` is in the index."""
+        row = self._db.execute("SELECT 1 FROM commits WHERE sha = ?", (sha,))
+        return row.fetchone() is not None
+
+    @staticmethod
+    def _path() -> str:
+        """Return path of the index file for the current repository."""
+        return os.path.join(git_common_dir(), "githelpers", "search-index.sqlite3")
+
+    def _tips(self) -> Dict[str, Optional[str]]:
+        """Return dict mapping each ref tip last indexed to the commit it peels to.
+
+        A tip that peels to no commit maps to |None|.
+        """
+        return dict(self._db.execute("SELECT sha, commit_sha FROM tips"))
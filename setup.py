@@ -35,8 +35,10 @@ ENTRY_POINTS = {
         "drop = githelpers.scripts.drop:main",
         "fix = githelpers.scripts.fix:main",
         "git-lawg = githelpers.scripts.lawg:main",
+        "githelpers = githelpers.scripts.cli:main",
         "next = githelpers.scripts.next:main",
         "prev = githelpers.scripts.prev:main",
+        "restack = githelpers.scripts.restack:main",
     ]
 }
 
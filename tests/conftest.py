@@ -0,0 +1,214 @@
+# encoding: utf-8
+
+"""Fixtures shared across the unit test suite."""
+
+import random
+import subprocess
+from typing import List
+from zipfile import ZipFile
+
+import py
+import pytest
+
+from githelpers import runcmd
+
+TEST_REPO_ZIP = str(py.path.local(__file__).dirpath("test-repo.zip"))
+
+# --- shape of the generated large repo ---
+LARGE_REPO_COMMITS = 2000
+LARGE_REPO_BRANCHES = 150
+
+
+class SpawnLog(object):
+    """Record of each process spawned during a test and the bytes read from it.
+
+    Bytes are counted as read from the process' stdout and stderr, by `communicate()`
+    or by reading its stdout stream.
+    """
+
+    def __init__(self):
+        self.commands: List[List[str]] = []
+        self.bytes_read = 0
+
+    def __len__(self) -> int:
+        return len(self.commands)
+
+    def assert_within(self, max_spawns: int, max_bytes: int):
+        """Fail the test when more processes were spawned or bytes read than allowed."""
+        commands = "\n".join("  %s" % " ".join(cmd) for cmd in self.commands)
+        assert len(self) <= max_spawns, "%d processes spawned, budget is %d:\n%s" % (
+            len(self),
+            max_spawns,
+            commands,
+        )
+        assert self.bytes_read <= max_bytes, "%d bytes read, budget is %d:\n%s" % (
+            self.bytes_read,
+            max_bytes,
+            commands,
+        )
+
+    def reset(self):
+        """Forget the processes recorded so far."""
+        self.commands = []
+        self.bytes_read = 0
+
+
+@pytest.fixture
+def history_repo(new_test_repo):
+    """The test repo with a history of merges, an octopus merge among them, on master.
+
+    Commits whose subject contains "hit" are spread across the branches merged.
+    """
+    for args in (
+        ["checkout", "-q", "-b", "one", "master"],
+        ["commit", "-q", "--allow-empty", "-m", "one hit"],
+        ["commit", "-q", "--allow-empty", "-m", "one miss"],
+        ["checkout", "-q", "-b", "two", "master"],
+        ["commit", "-q", "--allow-empty", "-m", "two hit"],
+        ["checkout", "-q", "-b", "three", "master"],
+        ["commit", "-q", "--allow-empty", "-m", "three miss"],
+        ["commit", "-q", "--allow-empty", "-m", "three hit"],
+        ["checkout", "-q", "master"],
+        ["commit", "-q", "--allow-empty", "-m", "master hit"],
+        ["merge", "-q", "--no-ff", "-m", "octopus hit", "one", "two", "three"],
+        ["commit", "-q", "--allow-empty", "-m", "after miss"],
+        ["merge", "-q", "--no-ff", "-m", "merge spike hit", "spike"],
+        ["commit", "-q", "--allow-empty", "-m", "top hit"],
+    ):
+        runcmd.output_of(["git"] + args)
+    return new_test_repo
+
+
+@pytest.fixture
+def large_test_repo(request, large_test_repo_template, tmpdir):
+    """
+    Copy the generated large repo into a temporary directory, making that directory the
+    current working directory. Restore the original working directory after request.
+    """
+    test_repo_dir = tmpdir.join("large-repo")
+    large_test_repo_template.copy(test_repo_dir)
+    cwd = test_repo_dir.chdir()
+    request.addfinalizer(lambda: cwd.chdir())
+    return test_repo_dir
+
+
+@pytest.fixture(scope="session")
+def large_test_repo_template(tmpdir_factory):
+    """Generate a repo of LARGE_REPO_COMMITS commits and LARGE_REPO_BRANCHES branches.
+
+    The history is linear on `master`, with each other branch at a random commit of it,
+    except `topic`, which is checked out and has three commits of its own.
+    """
+    repo_dir = tmpdir_factory.mktemp("large-repo-template")
+    rnd = random.Random(42)
+    lines = []
+    for i in range(1, LARGE_REPO_COMMITS + 4):
+        ref = "master" if i <= LARGE_REPO_COMMITS else "topic"
+        lines += ["commit refs/heads/%s" % ref, "mark :%d" % i]
+        lines += ["committer T <t@example.com> %d +0000" % (1500000000 + i)]
+        lines += ["data %d" % len("commit %d" % i), "commit %d" % i]
+        if i == LARGE_REPO_COMMITS + 1:
+            lines.append("from :%d" % (LARGE_REPO_COMMITS - 10))
+        elif i > 1:
+            lines.append("from :%d" % (i - 1))
+        lines += ["M 644 inline file.txt", "data %d" % len(str(i)), str(i)]
+    for b in range(LARGE_REPO_BRANCHES - 2):
+        lines += ["reset refs/heads/b%03d" % b]
+        lines += ["from :%d" % rnd.randrange(1, LARGE_REPO_COMMITS - 20)]
+    stream = ("\n".join(lines) + "\n").encode("utf-8")
+
+    def git(*args, **kwargs):
+        subprocess.run(["git", "-C", str(repo_dir)] + list(args), check=True, **kwargs)
+
+    git("init", "-q")
+    git("fast-import", "--quiet", input=stream)
+    git("checkout", "-q", "topic")
+    return repo_dir
+
+
+@pytest.fixture(scope="module")
+def module_test_repo(request, tmpdir_factory):
+    """Extract the test repo into a temporary directory having module scope."""
+    test_repo_dir = tmpdir_factory.mktemp("test-repo")
+    ZipFile(TEST_REPO_ZIP).extractall(str(test_repo_dir))
+    return test_repo_dir
+
+
+@pytest.fixture
+def new_test_repo(request, tmpdir):
+    """
+    Extract the test repo into a temporary directory, making that temp
+    directory the current working directory. Restore the original current
+    working directory after request.
+    """
+    test_repo_dir = tmpdir.mkdir("test-repo")
+    zip_file = ZipFile(TEST_REPO_ZIP)
+    zip_file.extractall(str(test_repo_dir))
+    cwd = test_repo_dir.chdir()
+    request.addfinalizer(lambda: cwd.chdir())
+    return test_repo_dir
+
+
+@pytest.fixture
+def readonly_test_repo(request, module_test_repo):
+    """
+    Change the current working directory to the module scope test repo,
+    restoring the original working directory after the test.
+    """
+    cwd = module_test_repo.chdir()
+    request.addfinalizer(lambda: cwd.chdir())
+
+
+@pytest.fixture
+def spawns(monkeypatch):
+    """A `SpawnLog` recording every process spawned for the rest of the test.
+
+    Covers processes started through `runcmd` and those started directly with
+    `subprocess.Popen`, as `fsmonitor` does to start its watcher.
+    """
+    log = SpawnLog()
+
+    class RecordingPopen(subprocess.Popen):
+        def __init__(self, args, *posargs, **kwargs):
+            super().__init__(args, *posargs, **kwargs)
+            log.commands.append([args] if isinstance(args, str) else list(args))
+            if self.stdout is not None:
+                self.stdout = _CountingStream(self.stdout, log)
+
+        def communicate(self, *args, **kwargs):
+            # --- `communicate()` reads the raw pipes itself, so count what it returns
+            if isinstance(self.stdout, _CountingStream):
+                self.stdout = self.stdout.stream
+            out, err = super().communicate(*args, **kwargs)
+            log.bytes_read += len(out or b"") + len(err or b"")
+            return out, err
+
+    monkeypatch.setattr(subprocess, "Popen", RecordingPopen)
+    monkeypatch.setattr(runcmd, "Popen", RecordingPopen)
+    return log
+
+
+class _CountingStream(object):
+    """Stdout stream of a process, counting the bytes (or chars) read from it."""
+
+    def __init__(self, stream, log: SpawnLog):
+        self.stream = stream
+        self._log = log
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def __iter__(self):
+        for line in self.stream:
+            self._log.bytes_read += len(line)
+            yield line
+
+    def read(self, *args):
+        data = self.stream.read(*args)
+        self._log.bytes_read += len(data)
+        return data
+
+    def readline(self, *args):
+        line = self.stream.readline(*args)
+        self._log.bytes_read += len(line)
+        return line
@@ -0,0 +1,45 @@
+# encoding: utf-8
+
+"""Unit test suite for the githelpers.bitmap module."""
+
+import marshal
+
+import pytest
+
+from githelpers.bitmap import CHUNK_ROWS, Bitmap
+
+
+class DescribeBitmap(object):
+    def it_knows_which_rows_it_holds(self):
+        bitmap = Bitmap.from_rows([0, 3, CHUNK_ROWS + 1])
+        assert 3 in bitmap
+        assert CHUNK_ROWS + 1 in bitmap
+        assert 1 not in bitmap
+        assert 5 * CHUNK_ROWS not in bitmap
+
+    def it_can_combine_with_another_bitmap(self):
+        bitmap = Bitmap.from_rows([1, 2]) | Bitmap.from_rows([2, CHUNK_ROWS])
+        assert bitmap == Bitmap.from_rows([1, 2, CHUNK_ROWS])
+        assert len(bitmap) == 3
+
+    def it_round_trips_through_its_compressed_state(self, rows):
+        bitmap = Bitmap.from_rows(rows)
+        state = marshal.loads(marshal.dumps(bitmap.to_state()))
+        assert Bitmap.from_state(state) == bitmap
+
+    def it_stores_a_full_chunk_as_a_marker(self):
+        bitmap = Bitmap.from_rows(range(CHUNK_ROWS, 2 * CHUNK_ROWS))
+        assert bitmap.to_state() == {1: -1}
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture(
+        params=[
+            [],
+            [7, 9000],
+            list(range(0, 3 * CHUNK_ROWS, 3)),
+            list(range(CHUNK_ROWS + 5)),
+        ]
+    )
+    def rows(self, request):
+        return request.param
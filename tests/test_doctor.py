@@ -0,0 +1,68 @@
+# encoding: utf-8
+
+"""Unit test suite for the githelpers doctor subcommand."""
+
+from githelpers.gitlib import create_branch_at, git_path
+from githelpers.scripts.doctor import (
+    _check_commit_graph,
+    _check_fsmonitor,
+    _check_packed_refs,
+    _check_untracked_cache,
+    _index_extensions,
+    main,
+)
+from githelpers.runcmd import output_of
+
+
+class Describe_doctor(object):
+    def it_reports_the_missing_accelerators(self, new_test_repo, capsys):
+        assert main(["githelpers doctor"]) == 0
+
+        out = capsys.readouterr().out
+        assert "commit-graph       missing" in out
+        assert "untracked cache    missing" in out
+        assert "githelpers doctor --fix" in out
+
+    def it_adds_the_missing_accelerators_with_fix(self, new_test_repo, capsys):
+        for i in range(101):
+            create_branch_at("loose-%d" % i, "HEAD")
+        assert _check_packed_refs() == "105 loose refs"
+
+        assert main(["githelpers doctor", "--fix"]) == 0
+
+        assert "before (ms)" in capsys.readouterr().out
+        assert _check_commit_graph() is None
+        assert _check_packed_refs() is None
+        assert _check_untracked_cache() is None
+
+    def it_takes_a_false_core_fsmonitor_for_no_watcher(self, new_test_repo):
+        output_of(["git", "config", "core.fsmonitor", "false"])
+        assert _check_fsmonitor() is not None
+        output_of(["git", "config", "core.fsmonitor", "/usr/bin/watcher-hook"])
+        assert _check_fsmonitor() is None
+
+    def but_it_leaves_an_untracked_cache_disabled_by_config(
+        self, new_test_repo, capsys
+    ):
+        output_of(["git", "config", "core.untrackedCache", "false"])
+
+        assert main(["githelpers doctor", "--fix"]) == 0
+
+        out = capsys.readouterr().out
+        assert "disabled by core.untrackedCache" in out
+        assert "Adding untracked cache" not in out
+        assert _check_untracked_cache() is not None
+
+
+class Describe_index_extensions(object):
+    def it_finds_the_signature_of_each_extension(self, new_test_repo):
+        for length in range(1, 17):
+            new_test_repo.join("sub", "x" * length).write("x\n", ensure=True)
+        output_of(["git", "add", "sub"])
+        output_of(["git", "update-index", "--untracked-cache"])
+
+        assert _index_extensions(git_path("index"), 20) == [b"UNTR"]
+
+    def it_gives_up_on_a_version_4_index(self, new_test_repo):
+        output_of(["git", "update-index", "--index-version", "4"])
+        assert _index_extensions(git_path("index"), 20) is None
@@ -0,0 +1,141 @@
+# encoding: utf-8
+
+"""Unit test suite for the githelpers.fsmonitor module."""
+
+import errno
+import os
+import random
+import threading
+import time
+
+import pytest
+
+from githelpers import fsmonitor
+from githelpers.gitlib import git_dir, is_clean, working_tree_dir
+from githelpers.inotify import Inotify
+from githelpers.runcmd import output_of
+
+
+class Describe_changes_since(object):
+    def it_reports_the_paths_changed_since_a_token(self, watched_repo):
+        token, _ = fsmonitor.changes_since(git_dir(), fsmonitor.NO_TOKEN)
+        watched_repo.join("foobar.txt").write("changed\n")
+        watched_repo.join("newdir").mkdir().join("new.txt").write("new\n")
+
+        token, changed = fsmonitor.changes_since(git_dir(), token)
+
+        assert sorted(changed) == ["foobar.txt", "newdir", "newdir/new.txt"]
+        assert fsmonitor.changes_since(git_dir(), token)[1] == []
+
+    def it_reports_unknown_changes_for_a_token_it_did_not_issue(self, watched_repo):
+        token, changed = fsmonitor.changes_since(git_dir(), "githelpers:other:0")
+        assert token != fsmonitor.NO_TOKEN
+        assert changed is None
+
+    def it_issues_no_token_when_no_watcher_runs(self, new_test_repo):
+        assert fsmonitor.changes_since(git_dir(), "githelpers:x:0") == (
+            fsmonitor.NO_TOKEN,
+            None,
+        )
+
+
+class Describe_is_clean(object):
+    def it_agrees_with_git_status_as_the_worktree_changes(self, watched_repo):
+        rand = random.Random(46)
+        names = ["foobar.txt", "barbaz.txt", "new.txt", "sub/new.txt"]
+        originals = {
+            name: watched_repo.join(name).read()
+            for name in names
+            if watched_repo.join(name).check()
+        }
+        for _ in range(40):
+            name = rand.choice(names)
+            path = watched_repo.join(name)
+            action = rand.choice(["write", "restore", "remove"])
+            if action == "write":
+                path.write("%d\n" % rand.randrange(3), ensure=True)
+            elif action == "restore" and name in originals:
+                path.write(originals[name])
+            elif path.check():
+                path.remove()
+
+            porcelain = output_of(["git", "status", "--porcelain"])
+            assert is_clean() is (porcelain == "")
+
+    def it_runs_no_command_when_nothing_changed(self, watched_repo, spawns):
+        watched_repo.join("foobar.txt").write("changed\n")
+        assert is_clean() is False
+        spawns.reset()
+
+        assert is_clean() is False
+
+        assert spawns.commands == []
+
+    def it_rechecks_when_head_moves(self, watched_repo):
+        watched_repo.join("foobar.txt").write("changed\n")
+        assert is_clean() is False
+        output_of(["git", "commit", "-q", "-am", "change"])
+        assert is_clean() is True
+
+
+class Describe_run(object):
+    def it_stops_when_a_directory_cannot_be_watched(self, watch_fails, monkeypatch):
+        monkeypatch.setattr(fsmonitor.signal, "signal", lambda *args: None)
+        errors = []
+
+        def run():
+            try:
+                fsmonitor.run(working_tree_dir(), git_dir())
+            except OSError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + 5
+        while not fsmonitor.is_running(git_dir()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        watch_fails.mkdir("full")
+        thread.join(5)
+
+        assert [e.errno for e in errors] == [errno.ENOSPC]
+        assert not fsmonitor.is_running(git_dir())
+
+    def but_it_skips_a_directory_removed_before_it_is_watched(self, watch_fails):
+        watch_fails.mkdir("gone")
+        monitor_dir = os.path.join(git_dir(), "githelpers", "fsmonitor")
+        os.makedirs(monitor_dir)
+
+        watcher = fsmonitor._TreeWatcher(working_tree_dir(), monitor_dir)
+        watcher.close()
+
+        assert b"gone" not in watcher._dirs.values()
+
+
+# fixtures -------------------------------------------------------
+
+
+@pytest.fixture
+def watched_repo(request, new_test_repo):
+    """The new test repo, with a watcher journaling changes to its worktree."""
+    try:
+        fsmonitor.start(working_tree_dir(), git_dir())
+    except OSError:
+        pytest.skip("inotify is not available")
+    request.addfinalizer(lambda: fsmonitor.stop(git_dir()))
+    return new_test_repo
+
+
+@pytest.fixture
+def watch_fails(new_test_repo, monkeypatch):
+    """The new test repo, where directories "full" and "gone" cannot be watched."""
+    add_watch = Inotify.add_watch
+    errnos = {b"full": errno.ENOSPC, b"gone": errno.ENOENT}
+
+    def _add_watch(self, path, mask):
+        name = os.path.basename(os.fsencode(path))
+        if name in errnos:
+            raise OSError(errnos[name], "inotify_add_watch failed", path)
+        return add_watch(self, path, mask)
+
+    monkeypatch.setattr(Inotify, "add_watch", _add_watch)
+    return new_test_repo
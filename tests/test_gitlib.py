@@ -2,12 +2,14 @@
 
 """Unit test suite for the githelpers module."""
 
-from zipfile import ZipFile
+import subprocess
 
-import py
 import pytest
 
+from githelpers import gitlib, runcmd
 from githelpers.gitlib import (
+    Repo,
+    add_worktree,
     branch_exists,
     branch_hash,
     branch_hashes,
@@ -15,21 +17,64 @@ from githelpers.gitlib import (
     branches_containing,
     checkout,
     children_of_head,
+    commit_records,
+    commit_tree,
     create_branch_at,
     current_branch_name,
     delete_branch,
+    full_hash_of,
+    git_common_dir,
+    git_path,
+    has_merges,
     head,
     head_is_independent,
     independent_branch_hashes,
     is_clean,
     is_commit,
     is_git_repo,
+    is_reachable,
+    merge_tree,
     parent_revs_of,
+    preflight_replay,
+    ReplayError,
+    ref_commit_hashes,
+    replay_onto,
     reset_hard_to,
+    update_refs,
+    worktree_branches,
+    worktree_of,
 )
-
-
-TEST_REPO_ZIP = str(py.path.local(__file__).dirpath("test-repo.zip"))
+from githelpers.graph import CommitGraph
+from githelpers.runcmd import output_of
+from githelpers.scripts.install_hooks import main as install_hooks
+
+
+class DescribeRepo(object):
+    def it_directs_gitlib_calls_to_its_repository(self, module_test_repo, tmpdir):
+        cwd = tmpdir.chdir()
+        try:
+            assert is_git_repo() is False
+            with Repo(str(module_test_repo)):
+                assert is_git_repo() is True
+                assert current_branch_name() == "spike"
+            assert is_git_repo() is False
+        finally:
+            cwd.chdir()
+
+    def it_runs_git_with_its_path(self):
+        assert Repo("/a/b").git("status") == ["git", "-C", "/a/b", "status"]
+        assert Repo().git("status") == ["git", "status"]
+
+
+class Describe_add_worktree(object):
+    def it_checks_out_a_branch_in_a_linked_worktree(self, new_test_repo, tmpdir):
+        path = str(tmpdir.join("fixit-tree"))
+        add_worktree(path, "fixit", "99ec480")
+
+        with Repo(path):
+            assert current_branch_name() == "fixit"
+            assert head().startswith("99ec480")
+        assert current_branch_name() == "spike"
 
 
 class Describe_branch_exists(object):
@@ -69,6 +114,20 @@ class Describe_branches_containing(object):
         branch_names = branches_containing(commitish)
         assert branch_names == expected_value
 
+    def it_answers_from_the_commit_graph_index(self, indexed_test_repo):
+        assert branches_containing("27caec1") == ["feature/foobar", "master"]
+        assert branches_containing("2294d97") == ["spike"]
+
+    def it_answers_from_the_index_after_a_ref_moves(self, indexed_test_repo):
+        create_branch_at("scratch", "27caec1")
+        checkout("scratch")
+        indexed_test_repo.join("scratch.txt").write("scratch\n")
+        output_of(["git", "add", "scratch.txt"])
+        output_of(["git", "commit", "-q", "-m", "add scratch.txt"])
+
+        assert branches_containing("HEAD") == ["scratch"]
+        assert branches_containing("27caec1") == ["feature/foobar", "master", "scratch"]
+
     # fixtures -------------------------------------------------------
 
     @pytest.fixture(
@@ -99,6 +158,56 @@ class Describe_children_of_head(object):
         hashes = children_of_head()
         assert hashes == expected_value
 
+    def it_answers_from_the_hook_maintained_index(self, new_test_repo):
+        install_hooks(["githelpers install-hooks"])
+        checkout("99ec480")
+        delete_branch("feature/foobar")
+        delete_branch("master")
+        checkout("2294d97")
+        create_branch_at("scratch", "2294d97")
+        checkout("scratch")
+        new_test_repo.join("scratch.txt").write("scratch\n")
+        output_of(["git", "add", "scratch.txt"])
+        output_of(["git", "commit", "-q", "-m", "add scratch.txt"])
+        checkout("2294d97")
+
+        graph = CommitGraph.load()
+
+        assert graph is not None
+        assert graph.live_children_of(head()) == [full_hash_of("scratch")]
+        checkout("99ec480")
+        assert children_of_head() == ["2294d9797588a8a0f6aa95ef488cf872b36f2131"]
+
+    def but_it_skips_symbolic_ref_updates(self, new_test_repo):
+        install_hooks(["githelpers install-hooks"])
+        symref_update = "ref ref:refs/heads/spike ref:refs/heads/master HEAD\n"
+        hook = subprocess.run(
+            ["sh", git_path("hooks/reference-transaction"), "committed"],
+            input=symref_update[len("ref ") :].encode(),
+        )
+        with open(git_path("githelpers/graph-journal"), "a+") as f:
+            f.seek(0)
+            assert f.read() == ""
+            f.write(symref_update)
+
+        graph = CommitGraph.load()
+
+        assert hook.returncode == 0
+        assert graph is not None
+        assert "HEAD" not in graph._refs
+
+    def but_it_picks_out_HEAD_among_other_boundary_commits(self, new_test_repo):
+        head_sha1 = head()
+        output_of(["git", "checkout", "-q", "-b", "side", "HEAD~1"])
+        output_of(["git", "commit", "-q", "--allow-empty", "-m", "side"])
+        checkout("spike")
+        output_of(["git", "commit", "-q", "--allow-empty", "-m", "child"])
+        child_sha1 = head()
+        output_of(["git", "merge", "-q", "--no-ff", "-m", "merge side", "side"])
+        checkout(head_sha1)
+
+        assert children_of_head() == [child_sha1]
+
     # fixtures -------------------------------------------------------
 
     @pytest.fixture(
@@ -120,6 +229,36 @@ class Describe_children_of_head(object):
         return hashes
 
 
+class Describe_commit_records(object):
+    def it_lists_each_commit_parents_first(self, readonly_test_repo):
+        records = commit_records(["fixit..spike"])
+        assert [(sha[:7], message) for sha, _, _, _, message in records] == [
+            ("6604de2", "add barfoo\n"),
+            ("99ec480", "add barbaz.txt\n"),
+            ("2294d97", "branch off a bit\n"),
+        ]
+        sha, parents, tree, author_env, _ = records[0]
+        assert parents == [full_hash_of("fixit")]
+        assert tree == full_hash_of("%s^{tree}" % sha)
+        assert author_env["GIT_AUTHOR_DATE"].endswith(" -0800")
+
+
+class Describe_commit_tree(object):
+    def it_makes_a_commit_without_moving_a_ref(self, new_test_repo):
+        author_env = {
+            "GIT_AUTHOR_NAME": "A U Thor",
+            "GIT_AUTHOR_EMAIL": "author@example.com",
+            "GIT_AUTHOR_DATE": "1500000000 +0100",
+        }
+        sha = commit_tree("fixit^{tree}", [head()], "subject\n\nbody\n", author_env)
+
+        assert head() == "2294d9797588a8a0f6aa95ef488cf872b36f2131"
+        commit = output_of(["git", "cat-file", "commit", sha])
+        assert "\nparent %s\n" % head() in commit
+        assert "\nauthor A U Thor <author@example.com> 1500000000 +0100\n" in commit
+        assert commit.endswith("\n\nsubject\n\nbody\n")
+
+
 class Describe_create_branch_at(object):
     def it_creates_a_new_branch_at_commit_ref(self, new_test_repo):
         assert not branch_exists("foobar")
@@ -147,11 +286,41 @@ class Describe_delete_branch(object):
             delete_branch("spike")
 
 
+class Describe_git_common_dir(object):
+    def it_finds_the_shared_git_dir_of_a_linked_worktree(
+        self, new_test_repo, tmpdir, spawns
+    ):
+        path = str(tmpdir.join("fixit-tree"))
+        add_worktree(path, "fixit", "99ec480")
+        spawns.reset()
+
+        with Repo(path):
+            assert git_common_dir() == str(new_test_repo.join(".git").realpath())
+        assert spawns.commands == []
+
+
+class Describe_has_merges(object):
+    def it_reports_whether_a_commit_listed_is_a_merge(self, new_test_repo):
+        checkout("master")
+        assert has_merges(["master"]) is False
+        output_of(["git", "merge", "-q", "--no-ff", "-m", "merge spike", "spike"])
+        assert has_merges(["master"]) is True
+        assert has_merges(["spike..master^"]) is False
+
+
 class Describe_head_is_independent(object):
     def it_knows_whether_current_branch_is_independent(self, call_fixture):
         expected_value = call_fixture
         assert head_is_independent() == expected_value
 
+    def it_answers_from_the_commit_graph_index(self, indexed_test_repo):
+        checkout("master")
+        assert head_is_independent() is True
+        create_branch_at("twin", "master")
+        assert head_is_independent() is True
+        checkout("feature/foobar")
+        assert head_is_independent() is False
+
     # fixtures -------------------------------------------------------
 
     @pytest.fixture(
@@ -242,6 +411,39 @@ class Describe_is_git_repo(object):
         request.addfinalizer(lambda: cwd.chdir())
 
 
+class Describe_is_reachable(object):
+    def it_is_True_for_a_commit_on_a_branch(self, new_test_repo):
+        assert is_reachable("27caec1") is True
+
+    def it_is_False_for_a_commit_no_ref_reaches(self, new_test_repo):
+        checkout("spike")
+        reset_hard_to("99ec480")
+        assert is_reachable("2294d97") is False
+
+    def it_answers_from_the_commit_graph_index(self, indexed_test_repo):
+        checkout("spike")
+        reset_hard_to("99ec480")
+        assert is_reachable("27caec1") is True
+        assert is_reachable("2294d97") is False
+
+
+class Describe_merge_tree(object):
+    def it_returns_the_merged_tree(self, new_test_repo):
+        tree = merge_tree("master", "spike")
+        names = output_of(["git", "ls-tree", "--name-only", tree]).split()
+        assert {"bazfoo.txt", "foobaz.txt", "barbaz.txt"} <= set(names)
+        assert head() == "2294d9797588a8a0f6aa95ef488cf872b36f2131"
+
+    def it_returns_None_when_the_merge_conflicts(self, new_test_repo):
+        new_test_repo.join("barbaz.txt").write("conflicting\n")
+        output_of(["git", "commit", "-q", "-a", "-m", "change barbaz.txt"])
+        checkout("master")
+        new_test_repo.join("barbaz.txt").write("differently\n")
+        output_of(["git", "commit", "-q", "-a", "-m", "change barbaz.txt"])
+
+        assert merge_tree("master", "spike") is None
+
+
 class Describe_parent_revs_of(object):
     def it_returns_a_hash_for_each_parent_commit(self, call_fixture):
         commitish, expected_value = call_fixture
@@ -263,6 +465,62 @@ class Describe_parent_revs_of(object):
         return commitish, revs
 
 
+class Describe_preflight_replay(object):
+    def it_is_None_when_the_replay_would_succeed(self, new_test_repo):
+        assert preflight_replay("6604de2", "99ec480", ["master", "spike"]) is None
+
+    def it_reports_the_conflicting_commit_without_changing_anything(
+        self, new_test_repo
+    ):
+        new_test_repo.join("barbaz.txt").write("conflicting\n")
+        output_of(["git", "commit", "-q", "-a", "-m", "change barbaz.txt"])
+        new_test_repo.join("barbaz.txt").write("differently\n")
+        output_of(["git", "commit", "-q", "-a", "-m", "change barbaz.txt again"])
+        refs = ref_commit_hashes()
+
+        error = preflight_replay("spike~2", "spike~1", ["spike"])
+
+        assert error.commit == full_hash_of("spike")
+        assert ref_commit_hashes() == refs
+        assert is_clean()
+
+
+class Describe_ref_commit_hashes(object):
+    def it_maps_each_ref_to_its_commit(self, new_test_repo):
+        output_of(["git", "tag", "-a", "-m", "annotated", "v1", "99ec480"])
+        hashes = ref_commit_hashes()
+        assert hashes["refs/tags/v1"] == "99ec48014b47dc9f9cfe6fd325b281dbaed12d3f"
+        assert hashes["refs/heads/spike"] == "2294d9797588a8a0f6aa95ef488cf872b36f2131"
+
+
+class Describe_replay_onto(object):
+    def it_replays_each_shared_commit_once(self, new_test_repo):
+        refs = ref_commit_hashes()
+        rewritten = replay_onto("6604de2", "99ec480", ["master", "spike"])
+
+        assert sorted(sha[:7] for sha in rewritten) == [
+            "2294d97",
+            "27caec1",
+            "53a12ab",
+            "99ec480",
+        ]
+        assert parent_revs_of(rewritten[full_hash_of("27caec1")]) == [
+            full_hash_of("6604de2")
+        ]
+        assert ref_commit_hashes() == refs
+
+    def it_raises_when_a_commit_conflicts(self, new_test_repo):
+        new_test_repo.join("barbaz.txt").write("conflicting\n")
+        output_of(["git", "commit", "-q", "-a", "-m", "change barbaz.txt"])
+        new_test_repo.join("barbaz.txt").write("differently\n")
+        output_of(["git", "commit", "-q", "-a", "-m", "change barbaz.txt again"])
+
+        with pytest.raises(ReplayError) as e:
+            replay_onto("spike~2", "spike~1", ["spike"])
+        assert e.value.commit == full_hash_of("spike")
+        assert not e.value.is_merge
+
+
 class Describe_reset_hard_to(object):
     def it_resets_the_commit_and_working_tree(self, new_test_repo):
         barbaz = new_test_repo.join("barbaz.txt")
@@ -272,37 +530,73 @@ class Describe_reset_hard_to(object):
         assert head() == "0eafe04e11a41374a1bd11f2eb1776d9d44febb1"
 
 
-# shared fixtures ----------------------------------------------------
+class Describe_update_refs(object):
+    def it_moves_each_ref(self, new_test_repo):
+        spike, fixit = full_hash_of("spike"), full_hash_of("fixit")
+        update_refs(
+            [("refs/heads/fixit", spike, fixit), ("refs/heads/spike", fixit, spike)],
+            "swap",
+        )
+        assert (full_hash_of("fixit"), full_hash_of("spike")) == (spike, fixit)
 
+    def it_moves_no_ref_when_one_has_moved_on(self, new_test_repo):
+        spike, fixit = full_hash_of("spike"), full_hash_of("fixit")
+        with pytest.raises(runcmd.RunCmdError):
+            update_refs(
+                [
+                    ("refs/heads/fixit", spike, fixit),
+                    ("refs/heads/master", fixit, spike),
+                ],
+                "swap",
+            )
+        assert full_hash_of("fixit") == fixit
 
-@pytest.fixture(scope="module")
-def module_test_repo(request, tmpdir_factory):
-    """Extract the test repo into a temporary directory having module scope."""
-    test_repo_dir = tmpdir_factory.mktemp("test-repo")
-    ZipFile(TEST_REPO_ZIP).extractall(str(test_repo_dir))
-    return test_repo_dir
 
+class Describe_worktree_branches(object):
+    def it_maps_each_checked_out_branch_to_its_worktree(self, new_test_repo, tmpdir):
+        path = str(tmpdir.join("fixit-tree"))
+        add_worktree(path, "fixit", "fixit")
+        assert worktree_branches() == {"spike": str(new_test_repo), "fixit": path}
 
-@pytest.fixture
-def readonly_test_repo(request, module_test_repo):
-    """
-    Change the current working directory to the module scope test repo,
-    restoring the original working directory after the test.
-    """
-    cwd = module_test_repo.chdir()
-    request.addfinalizer(lambda: cwd.chdir())
+    def but_it_leaves_out_a_detached_worktree(self, new_test_repo):
+        checkout("spike~1")
+        assert worktree_branches() == {}
+
+
+class Describe_worktree_of(object):
+    def it_returns_the_worktree_a_branch_is_checked_out_in(self, new_test_repo, tmpdir):
+        path = str(tmpdir.join("fixit-tree"))
+        add_worktree(path, "fixit", "fixit")
+        assert worktree_of("fixit") == path
+        assert worktree_of("spike") == str(new_test_repo)
+
+    def it_is_None_for_a_branch_not_checked_out(self, new_test_repo):
+        assert worktree_of("fixit") is None
+
+    def it_is_None_once_the_worktree_is_deleted(self, new_test_repo, tmpdir):
+        path = tmpdir.join("fixit-tree")
+        add_worktree(str(path), "fixit", "fixit")
+        path.remove(rec=1)
+        assert worktree_of("fixit") is None
+
+
+# fixtures ---------------------------------------------------------
 
 
 @pytest.fixture
-def new_test_repo(request, tmpdir):
-    """
-    Extract the test repo into a temporary directory, making that temp
-    directory the current working directory. Restore the original current
-    working directory after request.
-    """
-    test_repo_dir = tmpdir.mkdir("test-repo")
-    zip_file = ZipFile(TEST_REPO_ZIP)
-    zip_file.extractall(str(test_repo_dir))
-    cwd = test_repo_dir.chdir()
-    request.addfinalizer(lambda: cwd.chdir())
-    return test_repo_dir
+def indexed_test_repo(new_test_repo, monkeypatch):
+    """A new test repo with a commit-graph index, where asking git directly fails."""
+    install_hooks(["githelpers install-hooks"])
+
+    def refusing_reachability_queries(run):
+        def wrapper(args, **options):
+            if {"--contains", "--independent", "--is-ancestor"} & set(args):
+                raise AssertionError("commit-graph index not used")
+            return run(args, **options)
+
+        return wrapper
+
+    for name in ("output_bytes_of", "output_of", "return_code_of"):
+        run = refusing_reachability_queries(getattr(runcmd, name))
+        monkeypatch.setattr(gitlib, name, run)
+    return new_test_repo
@@ -0,0 +1,41 @@
+# encoding: utf-8
+
+"""Unit test suite for the githelpers.inotify module."""
+
+import errno
+
+import pytest
+
+from githelpers.inotify import IN_CREATE, IN_ISDIR, Inotify
+
+
+class DescribeInotify(object):
+    def it_reads_each_event_on_a_watched_directory(self, inotify, tmpdir):
+        wd = inotify.add_watch(str(tmpdir), IN_CREATE)
+        tmpdir.join("a.txt").write("a")
+        tmpdir.mkdir("sub")
+
+        assert inotify.read_events() == [
+            (wd, IN_CREATE, b"a.txt"),
+            (wd, IN_CREATE | IN_ISDIR, b"sub"),
+        ]
+
+    def it_reads_no_events_when_there_are_none(self, inotify, tmpdir):
+        inotify.add_watch(str(tmpdir), IN_CREATE)
+        assert inotify.read_events() == []
+
+    def but_it_raises_when_a_directory_cannot_be_watched(self, inotify, tmpdir):
+        with pytest.raises(OSError) as e:
+            inotify.add_watch(str(tmpdir.join("gone")), IN_CREATE)
+        assert e.value.errno == errno.ENOENT
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture
+    def inotify(self, request):
+        try:
+            inotify = Inotify()
+        except OSError:
+            pytest.skip("inotify is not available")
+        request.addfinalizer(inotify.close)
+        return inotify
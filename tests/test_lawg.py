@@ -0,0 +1,540 @@
+# encoding: utf-8
+
+"""Unit test suite for the git-lawg script."""
+
+import io
+import os
+import pty
+import select
+import signal
+import sys
+
+import pytest
+
+from githelpers import runcmd
+from githelpers.runcmd import (
+    CancelToken,
+    Limits,
+    RunCmdCancelled,
+    RunCmdError,
+    output_of,
+)
+from githelpers.scripts.lawg import (
+    _BaseLine,
+    _git_dirs,
+    _Graph,
+    _LogCache,
+    _LogLines,
+    _pad_chunk,
+    _page,
+    _Pager,
+    _pager_keys,
+    pretty_log,
+    _RefDecorations,
+    _Screen,
+    _redraw_seconds,
+    _relative_time,
+    _render_chunk,
+    _searched_lines,
+    _watch,
+    _write_ndjson,
+    _write_parallel,
+    main,
+)
+from githelpers.refwatch import RefWatcher
+from githelpers.scripts import lawg
+from githelpers.search import SearchIndex
+
+
+class Describe_BaseLine(object):
+    def it_computes_the_relative_time_from_the_timestamp(self):
+        text = "* \x1f2294d97\x1f1422072728\x1fsubj\x1f"
+        line = _BaseLine.from_text(text, 1422072728 + 2 * 86400)
+        assert line.time == "\033[32m(2 days)\033[0m"
+
+    def it_leaves_the_subject_untouched(self):
+        text = "* \x1f2294d97\x1f1422072728\x1fundo fix from 2 years ago\x1f"
+        line = _BaseLine.from_text(text, 1422159128)
+        assert line.subj == "undo fix from 2 years ago"
+
+    def it_makes_a_graf_only_line_from_a_line_without_fields(self):
+        line = _BaseLine.from_text("|\\  \n", 1422159128)
+        assert line.pretty(4, 7, 8) == "|\\"
+
+    def it_parses_a_full_line_into_a_record(self):
+        text = (
+            "| * \x1f53a12ab\x1f1422070546\x1ffix: a bug\x1f (HEAD -> master, tag: v1)"
+        )
+        assert _BaseLine.record_from_text(text) == {
+            "graph": "| * ",
+            "sha": "53a12ab",
+            "timestamp": 1422070546,
+            "subject": "fix: a bug",
+            "refs": ["HEAD -> master", "tag: v1"],
+            "classifier": "fix:",
+        }
+
+    def it_parses_a_graf_only_line_into_a_record(self):
+        record = _BaseLine.record_from_text("|/\n")
+        assert record["graph"] == "|/"
+        assert record["sha"] is None
+
+
+class Describe_Graph(object):
+    def it_draws_a_merge_as_git_does(self):
+        commits = [("m", ["a", "b"]), ("b", ["c"]), ("a", ["c"]), ("c", [])]
+        assert self.rows(commits) == [
+            ("*   ", "m"),
+            ("|\\  ", ""),
+            ("| * ", "b"),
+            ("* | ", "a"),
+            ("|/  ", ""),
+            ("* ", "c"),
+        ]
+
+    def it_draws_an_octopus_merge_as_git_does(self):
+        commits = [
+            ("o", ["a", "b", "c"]),
+            ("c", ["r"]),
+            ("b", ["r"]),
+            ("a", ["r"]),
+            ("r", []),
+        ]
+        assert [graf for graf, _ in self.rows(commits)] == [
+            "*-.   ",
+            "|\\ \\  ",
+            "| | * ",
+            "| * | ",
+            "| |/  ",
+            "* / ",
+            "|/  ",
+            "* ",
+        ]
+
+    @staticmethod
+    def rows(commits):
+        graph = _Graph()
+        return [row for sha, parents in commits for row in graph.rows(sha, parents)]
+
+
+class Describe_LogCache(object):
+    def it_returns_None_on_a_cache_miss(self, cache_dir):
+        assert _LogCache(cache_dir, "f00ba5").get() is None
+
+    def it_returns_the_text_it_stored(self, cache_dir):
+        _LogCache(cache_dir, "f00ba5").put("* \x1fabc1234\x1f...\n")
+        assert _LogCache(cache_dir, "f00ba5").get() == "* \x1fabc1234\x1f...\n"
+
+    def it_evicts_least_recently_used_entries_over_the_size_limit(
+        self, cache_dir, monkeypatch
+    ):
+        monkeypatch.setattr(_LogCache, "SIZE_LIMIT", 25)
+        for key in ("a", "b"):
+            _LogCache(cache_dir, key).put("x" * 10)
+        os.utime(os.path.join(cache_dir, "a"), (1, 1))
+        os.utime(os.path.join(cache_dir, "b"), (2, 2))
+
+        _LogCache(cache_dir, "c").put("x" * 10)
+
+        assert sorted(os.listdir(cache_dir)) == ["b", "c"]
+
+    def it_does_not_cache_time_dependent_queries(self):
+        assert _LogCache.for_args(["-42", "--since=2.weeks"]) is None
+
+    def it_answers_a_hit_without_reading_the_config(self, new_test_repo, spawns):
+        raw_lines = list(_LogLines.raw_lines(["-5"]))
+        spawns.reset()
+
+        assert list(_LogLines.raw_lines(["-5"])) == raw_lines
+        assert [cmd[cmd.index("rev-parse")] for cmd in spawns.commands] == ["rev-parse"]
+
+    def it_misses_once_the_global_config_changes(
+        self, new_test_repo, tmpdir, monkeypatch
+    ):
+        monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(tmpdir.join("gitconfig")))
+        cache = _LogCache.for_args(["git", "log", "--graph", "-5"])
+        output_of(["git", "config", "--global", "log.decorate", "full"])
+        assert _LogCache.for_args(["git", "log", "--graph", "-5"])._path != cache._path
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture
+    def cache_dir(self, tmpdir):
+        return str(tmpdir.join("lawg-cache"))
+
+
+class Describe_LogLines(object):
+    def it_aligns_columns_across_all_its_lines(self, raw_text):
+        log_lines = _LogLines.from_raw_text(raw_text, 1422159128)
+        assert log_lines.max_widths == (4, 7, 8)
+
+    def it_renders_a_chunk_to_the_widths_of_the_whole_log(self, raw_text):
+        chunk = raw_text.splitlines(keepends=True)[1]
+        whole_log = list(_LogLines.from_raw_text(raw_text, 1422159128).pretty_lines())
+        widths, text = _render_chunk(chunk, 1422159128)
+        assert _pad_chunk(text, widths, (4, 7, 8)) == whole_log[1] + "\n"
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture
+    def raw_text(self):
+        return (
+            "* \x1f2294d97\x1f1422072728\x1fbranch off a bit\x1f (HEAD -> spike)\n"
+            "| * \x1f53a12ab\x1f1422070546\x1fadd bazfoo.txt\x1f (master)\n"
+            "|/\n"
+        )
+
+
+class Describe_Pager(object):
+    def it_reads_only_the_lines_it_shows(self, raw_lines):
+        pager = _Pager(raw_lines, 1000)
+        assert len(pager.window(3)) == 3
+        assert next(raw_lines) == "|\n"
+
+    def it_fits_the_columns_to_the_lines_in_the_window(self):
+        raw_lines = [
+            "| * \x1fabc1234\x1f1000\x1fa\x1f\n",
+            "* \x1fabc\x1f1000\x1fb\x1f\n",
+        ]
+        pager = _Pager(iter(raw_lines), 1000)
+        pager.scroll(1, 1)
+        assert pager.window(1) == [
+            _BaseLine.from_text(raw_lines[1], 1000).pretty(1, 3, 9)
+        ]
+
+    def it_keeps_the_window_full_when_scrolled_past_the_end(self, raw_lines):
+        pager = _Pager(raw_lines, 1000)
+        pager.scroll(100, 4)
+        assert pager.window(4)[-1].endswith("commit 9")
+        assert pager.is_at_end(4) is True
+        pager.scroll(-1, 4)
+        assert pager.is_at_end(4) is False
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture
+    def raw_lines(self):
+        lines = []
+        for i in range(10):
+            lines.extend(["* \x1f%07d\x1f1000\x1fcommit %d\x1f\n" % (i, i), "|\n"])
+        return iter(lines[:-1])
+
+
+class Describe_RefDecorations(object):
+    def it_decorates_each_commit_as_git_does(self, decorated_repo, git_decoration):
+        decorations = _RefDecorations.load(_git_dirs())
+        for abbrev in output_of(["git", "log", "--all", "--format=%h"]).split():
+            assert decorations.of(abbrev) == git_decoration(abbrev)
+
+    def it_shows_a_detached_HEAD_on_its_own(self, decorated_repo, git_decoration):
+        output_of(["git", "checkout", "-q", "--detach", "master"])
+        head = output_of(["git", "rev-parse", "--short", "HEAD"]).strip()
+        assert _RefDecorations.load(_git_dirs()).of(head) == git_decoration(head)
+
+    def it_leaves_the_log_as_git_formats_it(self, decorated_repo):
+        fmt = "--pretty=tformat:\x1f%h\x1f%at\x1f%s\x1f%d"
+        git_log = output_of(["git", "log", "--graph", fmt, "--all"])
+        assert "".join(_LogLines.raw_lines(["--all", "--no-cache"])) == git_log
+
+    @pytest.mark.parametrize(
+        "name, value",
+        (
+            ("log.decorate", "full"),
+            ("log.excludeDecoration", "refs/tags/*"),
+            ("log.initialDecorationSet", "all"),
+            ("extensions.refStorage", "files"),
+        ),
+    )
+    def but_it_leaves_decoration_to_git_when_configured(
+        self, decorated_repo, name, value
+    ):
+        output_of(["git", "config", name, value])
+        fmt = "--pretty=tformat:\x1f%h\x1f%at\x1f%s\x1f%d"
+        git_log = output_of(["git", "log", "--graph", fmt, "--all"])
+        assert "".join(_LogLines.raw_lines(["--all", "--no-cache"])) == git_log
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture
+    def decorated_repo(self, new_test_repo):
+        for args in (
+            ["tag", "v1", "master"],
+            ["tag", "-a", "-m", "annotated", "v2", "master"],
+            ["tag", "-a", "-m", "annotated", "v0", "spike~1"],
+            ["update-ref", "refs/remotes/origin/master", "master"],
+            ["symbolic-ref", "refs/remotes/origin/HEAD", "refs/remotes/origin/master"],
+            ["update-ref", "refs/stash", "spike"],
+            ["update-ref", "refs/notes/commits", "spike"],
+            ["pack-refs", "--all"],
+            ["update-ref", "refs/remotes/origin/master", "spike"],
+            ["tag", "-a", "-m", "annotated", "loose", "spike"],
+        ):
+            output_of(["git"] + args)
+        return new_test_repo
+
+    @pytest.fixture
+    def git_decoration(self):
+        return lambda rev: output_of(["git", "log", "-1", "--format=%d", rev]).rstrip()
+
+
+class Describe_Screen(object):
+    def it_rewrites_only_the_lines_that_changed(self, screen_file):
+        screen = _Screen(screen_file)
+        screen.paint(["a", "b", "c", "d"])
+        screen_file.seek(0)
+        screen_file.truncate()
+
+        screen.paint(["a", "B"])
+
+        assert screen_file.getvalue() == "\033[2;1HB\033[K\033[3;1H\033[J"
+
+    def it_redraws_everything_after_a_resize(self, screen_file, monkeypatch):
+        screen = _Screen(screen_file)
+        screen.paint(["a", "b"])
+        monkeypatch.setattr(
+            os, "get_terminal_size", lambda fd: os.terminal_size((9, 9))
+        )
+        screen_file.seek(0)
+        screen_file.truncate()
+
+        screen.paint(["a", "b"])
+
+        assert screen_file.getvalue() == (
+            "\033[H\033[2J\033[1;1Ha\033[K\033[2;1Hb\033[K"
+        )
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture
+    def screen_file(self, monkeypatch):
+        monkeypatch.setattr(
+            os, "get_terminal_size", lambda fd: os.terminal_size((80, 3))
+        )
+
+        class ScreenFile(io.StringIO):
+            def fileno(self):
+                return 1
+
+        return ScreenFile()
+
+
+class Describe_page(object):
+    def it_puts_back_the_signal_handling_it_replaced(self, new_test_repo, monkeypatch):
+        pty_fd, tty_fd = pty.openpty()
+        os_open = os.open
+        monkeypatch.setattr(
+            os,
+            "open",
+            lambda path, *args: tty_fd if path == "/dev/tty" else os_open(path, *args),
+        )
+        monkeypatch.setattr(
+            os, "get_terminal_size", lambda fd: os.terminal_size((80, 3))
+        )
+        monkeypatch.setattr(select, "select", self.interrupted)
+        handler = signal.signal(signal.SIGWINCH, signal.SIG_IGN)
+        try:
+            assert _page([]) == 0
+            assert signal.getsignal(signal.SIGWINCH) == signal.SIG_IGN
+            assert signal.set_wakeup_fd(-1) == -1
+        finally:
+            signal.signal(signal.SIGWINCH, handler)
+            os.close(pty_fd)
+
+    def but_it_refuses_to_run_with_jobs(self, new_test_repo, monkeypatch, capsys):
+        monkeypatch.setattr(sys, "argv", ["git-lawg", "--page", "--jobs=2"])
+        assert main() == 1
+        assert capsys.readouterr().out.startswith("usage: git-lawg")
+
+    @staticmethod
+    def interrupted(rlist, wlist, xlist):
+        raise KeyboardInterrupt
+
+
+class Describe_pager_keys(object):
+    def it_splits_a_read_into_the_keys_typed(self):
+        data = b"jj\033[Bq\033[6~\033[C\033"
+        assert list(_pager_keys(data)) == [
+            b"j",
+            b"j",
+            b"\033[B",
+            b"q",
+            b"\033[6~",
+            b"\033[C",
+            b"\033",
+        ]
+
+
+class Describe_pretty_log(object):
+    def it_runs_git_under_the_enclosing_limits(self, new_test_repo):
+        cancel = CancelToken()
+        cancel.cancel()
+        with Limits(cancel=cancel), pytest.raises(RunCmdCancelled):
+            list(pretty_log(["--no-cache"], str(new_test_repo)))
+
+    def it_raises_when_git_fails(self, new_test_repo):
+        with pytest.raises(RunCmdError):
+            list(pretty_log(["--no-cache", "no-such-rev"], str(new_test_repo)))
+
+
+class Describe_redraw_seconds(object):
+    def it_is_a_second_while_a_commit_shows_its_age_in_seconds(self):
+        raw_lines = ["|/\n", "* \x1f2294d97\x1f1000\x1fsubj\x1f\n"]
+        assert _redraw_seconds(raw_lines, 1089) == 1
+        assert _redraw_seconds(raw_lines, 1090) == 60
+
+
+class Describe_relative_time(object):
+    def it_matches_git_relative_date_buckets(self, call_fixture):
+        diff, expected_value = call_fixture
+        assert _relative_time(1422072728, 1422072728 + diff) == expected_value
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture(
+        params=[
+            (-1, "in the future"),
+            (0, "0 seconds"),
+            (1, "1 second"),
+            (89, "89 seconds"),
+            (90, "2 minutes"),
+            (60 * 89, "89 minutes"),
+            (3600 * 35, "35 hours"),
+            (3600 * 36, "2 days"),
+            (86400 * 13, "13 days"),
+            (86400 * 14, "2 weeks"),
+            (86400 * 70, "2 months"),
+            (86400 * 365, "1 year"),
+            (86400 * 700, "1 year"),
+            (86400 * 1825, "5 years"),
+            (86400 * 4400, "12 years"),
+        ]
+    )
+    def call_fixture(self, request):
+        return request.param
+
+
+class Describe_searched_lines(object):
+    @pytest.mark.parametrize(
+        "args",
+        (
+            ["--grep=hit"],
+            ["--grep=hit", "--all"],
+            ["--grep=HIT", "-i", "-2"],
+            ["--grep=hit", "spike", "two"],
+            ["--author=Steve", "--all"],
+        ),
+    )
+    def it_logs_the_commits_git_log_finds(self, history_repo, args):
+        SearchIndex.build()
+        fmt = "--pretty=tformat:\x1f%h\x1f%at\x1f%s\x1f%d"
+        git_log = output_of(["git", "log", "--graph", fmt] + args)
+
+        assert _searched_lines(args, fmt[len("--pretty=tformat:") :]) is not None
+        assert "".join(_LogLines.raw_lines(args + ["--no-cache"])) == git_log
+
+    def but_it_leaves_the_log_to_git_without_an_index(self, history_repo):
+        assert _searched_lines(["--grep=hit"], "%h") is None
+
+
+class Describe_watch(object):
+    def it_puts_back_the_signal_handling_it_replaced(self, new_test_repo, monkeypatch):
+        monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+        monkeypatch.setattr(RefWatcher, "open", self.interrupted)
+        handler = signal.signal(signal.SIGWINCH, signal.SIG_IGN)
+        try:
+            assert _watch([]) == 0
+            assert signal.getsignal(signal.SIGWINCH) == signal.SIG_IGN
+            assert signal.set_wakeup_fd(-1) == -1
+        finally:
+            signal.signal(signal.SIGWINCH, handler)
+
+    def but_it_refuses_to_run_without_a_terminal(self, new_test_repo, capsys):
+        assert _watch([]) == 1
+        assert "needs a terminal" in capsys.readouterr().err
+
+    @staticmethod
+    def interrupted(git_dirs):
+        raise KeyboardInterrupt
+
+
+class Describe_write_ndjson(object):
+    def it_flushes_each_record_as_it_is_written(self, new_test_repo, monkeypatch):
+        stdout = self.Stdout()
+        monkeypatch.setattr(sys, "stdout", stdout)
+
+        _write_ndjson(["--no-cache"])
+
+        assert stdout.flushed == stdout.getvalue().splitlines()
+        assert len(stdout.flushed) > 1
+
+    def but_it_ends_git_when_the_reader_stops(self, new_test_repo, monkeypatch):
+        procs = []
+        popen = runcmd.Popen
+
+        def spy(*args, **kwargs):
+            procs.append(popen(*args, **kwargs))
+            return procs[-1]
+
+        monkeypatch.setattr(runcmd, "Popen", spy)
+        monkeypatch.setattr(sys, "stdout", self.Stdout(closed_by_reader=True))
+
+        with pytest.raises(BrokenPipeError):
+            _write_ndjson(["--no-cache"])
+
+        assert procs[0].returncode is not None
+
+    class Stdout(io.StringIO):
+        """Stdout recording the lines written at each flush, or as a closed pipe."""
+
+        def __init__(self, closed_by_reader=False):
+            super().__init__()
+            self.closed_by_reader = closed_by_reader
+            self.flushed = []
+
+        def write(self, text):
+            if self.closed_by_reader:
+                raise BrokenPipeError
+            return super().write(text)
+
+        def flush(self):
+            self.flushed.extend(self.getvalue().splitlines()[len(self.flushed) :])
+
+
+class Describe_write_parallel(object):
+    def it_writes_the_log_the_serial_output_writes(
+        self, new_test_repo, monkeypatch, capsys
+    ):
+        monkeypatch.setattr(lawg, "CHUNK_SIZE", 2)
+        serial_log = "".join(line + "\n" for line in pretty_log([]))
+
+        _write_parallel([], 2)
+
+        assert capsys.readouterr().out == serial_log
+
+    def it_writes_a_log_read_from_the_cache(self, new_test_repo, monkeypatch, capsys):
+        monkeypatch.setattr(lawg, "CHUNK_SIZE", 2)
+        _write_parallel([], 2)
+        uncached_log = capsys.readouterr().out
+
+        _write_parallel([], 2)
+
+        assert capsys.readouterr().out == uncached_log
+
+    def but_it_stops_reading_git_when_the_reader_stops(self, history_repo, monkeypatch):
+        lines_read = []
+        raw_lines = _LogLines.raw_lines
+
+        def spy(args, repo_dir=None):
+            for line in raw_lines(args, repo_dir):
+                lines_read.append(line)
+                yield line
+
+        monkeypatch.setattr(lawg, "CHUNK_SIZE", 1)
+        monkeypatch.setattr(_LogLines, "raw_lines", spy)
+        stdout = Describe_write_ndjson.Stdout(closed_by_reader=True)
+        monkeypatch.setattr(sys, "stdout", stdout)
+
+        with pytest.raises(BrokenPipeError):
+            _write_parallel(["--no-cache"], 1)
+
+        assert len(lines_read) < len(list(raw_lines(["--no-cache"])))
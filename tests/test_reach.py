@@ -0,0 +1,72 @@
+# encoding: utf-8
+
+"""Unit test suite for the githelpers.reach module."""
+
+import pytest
+
+from githelpers.reach import CommitIndex
+
+# --- history with a merge, a fork, and a parent outside the index ---
+#
+#   f   e
+#   |   |
+#   d   |
+#   |\\  |
+#   b c |
+#   |/  |
+#   a---+
+#   |
+#   (z, not indexed)
+#
+PARENTS = {
+    "f": ("d",),
+    "e": ("a",),
+    "d": ("b", "c"),
+    "b": ("a",),
+    "c": ("a",),
+    "a": ("z",),
+}
+
+
+class DescribeCommitIndex(object):
+    def it_builds_the_same_index_with_or_without_numpy(self):
+        pytest.importorskip("numpy")
+        with_numpy = CommitIndex(PARENTS, use_numpy=True)
+        without_numpy = CommitIndex(PARENTS, use_numpy=False)
+        assert with_numpy._segment_of == without_numpy._segment_of
+        assert with_numpy._position == without_numpy._position
+        assert with_numpy._segment_parents == without_numpy._segment_parents
+
+    def it_collapses_linear_runs_into_segments(self):
+        index = CommitIndex(PARENTS, use_numpy=False)
+        assert index._segment_of[0] == index._segment_of[2]  # f and d
+        assert len(index._segment_parents) == 5
+
+    def it_knows_which_tips_each_commit_is_reachable_from(self, call_fixture):
+        use_numpy, sha, expected_value = call_fixture
+        index = CommitIndex(PARENTS, use_numpy=use_numpy)
+        reachability = index.reachability(["f", "e", "b", "d", "z"])
+        assert reachability.tips_reaching(sha) == expected_value
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture(
+        params=[
+            ("f", 0b00001),
+            ("d", 0b01001),
+            ("b", 0b01101),
+            ("c", 0b01001),
+            ("e", 0b00010),
+            ("a", 0b01111),
+            ("z", 0b00000),
+        ]
+    )
+    def call_fixture(self, request, use_numpy):
+        sha, expected_value = request.param
+        return use_numpy, sha, expected_value
+
+    @pytest.fixture(params=[False, True])
+    def use_numpy(self, request):
+        if request.param:
+            pytest.importorskip("numpy")
+        return request.param
@@ -0,0 +1,56 @@
+# encoding: utf-8
+
+"""Unit test suite for the githelpers.refwatch module."""
+
+import os
+
+import pytest
+
+from githelpers.gitlib import create_branch_at, delete_branch, git_common_dir
+from githelpers.refwatch import RefWatcher, _InotifyWatcher, _PollingWatcher
+from githelpers.runcmd import output_of
+
+
+class DescribeRefWatcher(object):
+    def it_chooses_the_watcher_for_the_platform(self, new_test_repo):
+        with RefWatcher.open([git_common_dir()]) as watcher:
+            assert isinstance(watcher, (_InotifyWatcher, _PollingWatcher))
+
+    def it_reports_a_new_branch(self, watcher):
+        create_branch_at("scratch", "HEAD")
+        assert watcher.wait(timeout=5) is True
+
+    def it_reports_a_commit(self, watcher, new_test_repo):
+        output_of(["git", "commit", "-q", "--allow-empty", "-m", "empty"])
+        assert watcher.wait(timeout=5) is True
+
+    def it_reports_a_deleted_branch_after_pack_refs(self, watcher):
+        output_of(["git", "pack-refs", "--all"])
+        assert watcher.wait(timeout=5) is True
+        delete_branch("fixit")
+        assert watcher.wait(timeout=5) is True
+
+    def it_ignores_changes_other_than_to_refs(self, watcher, new_test_repo):
+        new_test_repo.join("newfile.txt").write("new\n")
+        output_of(["git", "add", "newfile.txt"])
+        assert watcher.wait(timeout=0.3) is False
+
+    def it_stops_waiting_when_woken(self, watcher):
+        wake_r, wake_w = os.pipe()
+        os.write(wake_w, b"x")
+        try:
+            assert watcher.wait(timeout=5, wake_fds=[wake_r]) is False
+        finally:
+            os.close(wake_r)
+            os.close(wake_w)
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture(params=[_InotifyWatcher, _PollingWatcher])
+    def watcher(self, request, new_test_repo):
+        try:
+            watcher = request.param([git_common_dir()])
+        except OSError:
+            pytest.skip("inotify is not available")
+        request.addfinalizer(watcher.close)
+        return watcher
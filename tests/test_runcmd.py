@@ -0,0 +1,149 @@
+# encoding: utf-8
+
+"""Unit test suite for the githelpers.runcmd module."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from githelpers.gitlib import branch_names, checkout, is_clean
+from githelpers.runcmd import (
+    CancelToken,
+    Limits,
+    QueryPolicy,
+    RunCmdCancelled,
+    RunCmdError,
+    RunCmdOutputLimit,
+    RunCmdTimeout,
+    output_bytes_of,
+    output_lines_of,
+    output_of,
+    run,
+)
+
+
+class DescribeLimits(object):
+    def it_bounds_the_commands_run_by_gitlib(self, readonly_test_repo):
+        with Limits(max_output=10):
+            with pytest.raises(RunCmdOutputLimit):
+                branch_names()
+        assert branch_names() == ["feature/foobar", "fixit", "master", "spike"]
+
+    def it_shares_one_deadline_across_the_block(self):
+        with Limits(timeout=0.5):
+            run(["sleep", "0.3"])
+            with pytest.raises(RunCmdTimeout):
+                run(["sleep", "0.3"])
+
+    def it_applies_the_tighter_of_nested_limits(self):
+        with Limits(max_output=100):
+            with Limits(max_output=1000):
+                with pytest.raises(RunCmdOutputLimit):
+                    output_of(["head", "-c", "500", "/dev/zero"])
+
+
+class DescribeQueryPolicy(object):
+    def it_adds_its_options_and_environment_to_a_git_command(self):
+        policy = QueryPolicy(git_options=["--no-pager"], env={"LC_ALL": "C"})
+        args, env = policy.command(["git", "-C", "/a", "status"])
+        assert args == ["git", "--no-pager", "-C", "/a", "status"]
+        assert env["LC_ALL"] == "C"
+        assert env["PATH"] == os.environ["PATH"]
+
+    def it_leaves_other_commands_alone(self):
+        assert QueryPolicy.tuned().command(["ls", "-l"]) == (["ls", "-l"], None)
+
+    def it_keeps_queries_from_rewriting_the_index(self, new_test_repo):
+        index = new_test_repo.join(".git", "index")
+        new_test_repo.join("barbaz.txt").setmtime(time.time() + 60)
+        index_mtime = index.mtime()
+
+        assert is_clean() is True
+
+        assert index.mtime() == index_mtime
+        with QueryPolicy.user():
+            assert is_clean() is True
+        assert index.mtime() != index_mtime
+
+    def it_runs_only_queries_under_the_policy(self, new_test_repo, spawns):
+        is_clean()
+        checkout("master")
+        status_cmd, checkout_cmd = spawns.commands
+        assert "--no-optional-locks" in status_cmd
+        assert "--no-optional-locks" not in checkout_cmd
+
+
+class Describe_output_bytes_of(object):
+    def it_returns_the_undecoded_output(self):
+        assert output_bytes_of(["printf", "caf\\303\\251"]) == "café".encode("utf-8")
+
+    def it_raises_on_a_non_zero_return_code(self):
+        with pytest.raises(RunCmdError):
+            output_bytes_of(["false"])
+
+
+class Describe_output_lines_of(object):
+    def it_generates_each_line_as_it_is_written(self):
+        lines = output_lines_of(["sh", "-c", "echo foo; sleep 5; echo bar"])
+        start = time.monotonic()
+        assert next(lines) == "foo\n"
+        assert time.monotonic() - start < 2
+        lines.close()
+
+    def it_generates_a_last_line_without_its_newline(self):
+        assert list(output_lines_of(["printf", "a\\nb"])) == ["a\n", "b"]
+
+    def it_raises_on_a_non_zero_return_code(self):
+        with pytest.raises(RunCmdError):
+            list(output_lines_of(["sh", "-c", "echo foo; exit 3"]))
+
+    def it_kills_a_command_that_runs_past_its_deadline(self):
+        lines = output_lines_of(["sh", "-c", "echo foo; sleep 5"], timeout=0.2)
+        start = time.monotonic()
+        assert next(lines) == "foo\n"
+        with pytest.raises(RunCmdTimeout):
+            next(lines)
+        assert time.monotonic() - start < 2
+
+    def it_kills_a_command_when_cancelled(self):
+        cancel = CancelToken()
+        threading.Timer(0.1, cancel.cancel).start()
+        with pytest.raises(RunCmdCancelled):
+            with Limits(cancel=cancel):
+                list(output_lines_of(["sleep", "5"]))
+
+
+class Describe_run(object):
+    def it_returns_the_output_when_no_limit_is_hit(self):
+        assert run(["echo", "foo"], timeout=5, max_output=10) == (0, b"foo\n", b"")
+
+    def it_writes_input_to_the_command(self):
+        data = b"x" * 200000
+        assert run(["cat"], input=data) == (0, data, b"")
+        assert run(["cat"], input=data, timeout=5) == (0, data, b"")
+
+    def it_adds_env_to_the_environment_of_the_command(self):
+        rc, out, _ = run(["sh", "-c", "echo $FOO $HOME"], env={"FOO": "bar"})
+        assert out == ("bar %s\n" % os.environ["HOME"]).encode("utf-8")
+
+    def it_kills_a_command_that_runs_past_its_deadline(self):
+        start = time.monotonic()
+        with pytest.raises(RunCmdTimeout) as e:
+            run(["sleep", "5"], timeout=0.2)
+        assert time.monotonic() - start < 2
+        assert e.value._rc < 0
+
+    def it_kills_a_command_that_writes_too_much(self):
+        with pytest.raises(RunCmdOutputLimit) as e:
+            run(["cat", "/dev/zero"], max_output=100000)
+        assert len(e.value._out) >= 100000
+
+    def it_kills_a_command_when_cancelled(self):
+        cancel = CancelToken()
+        threading.Timer(0.1, cancel.cancel).start()
+        with pytest.raises(RunCmdCancelled):
+            run(["sleep", "5"], cancel=cancel)
+        with pytest.raises(RunCmdCancelled):
+            run(["echo", "foo"], cancel=cancel)
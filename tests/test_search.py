@@ -0,0 +1,85 @@
+# encoding: utf-8
+
+"""Unit test suite for the githelpers.search module."""
+
+import pytest
+
+from githelpers.runcmd import output_of
+from githelpers.search import SearchIndex, SearchQuery
+
+
+class Describe_SearchIndex(object):
+    def it_finds_the_commits_git_log_grep_finds(self, history_repo, in_range):
+        index = SearchIndex.build()
+        commits = in_range("--all")
+
+        found = [sha for sha, _ in index.search(self.query("--grep=hit"), commits)]
+
+        assert found == self.git_log_shas("--all", "--grep=hit")
+
+    def it_joins_each_match_to_the_parents_that_match_too(self, history_repo, in_range):
+        index = SearchIndex.build()
+        parents_of = dict(index.search(self.query("--grep=hit"), in_range("master")))
+
+        octopus = output_of(["git", "rev-parse", "master~3"]).strip()
+        hits = output_of(["git", "rev-parse", "master~4", "two", "three"]).split()
+        assert parents_of[octopus] == hits
+
+    def it_indexes_the_commits_made_since_it_was_built(self, history_repo, in_range):
+        SearchIndex.build()
+        output_of(["git", "commit", "-q", "--allow-empty", "-m", "later hit"])
+
+        index = SearchIndex.open()
+        index.update()
+        found = index.search(self.query("--grep=later"), in_range("master"))
+
+        assert [sha for sha, _ in found] == self.git_log_shas("-1", "master")
+
+    def it_is_not_there_until_it_is_built(self, new_test_repo):
+        assert SearchIndex.open() is None
+        SearchIndex.build()
+        assert SearchIndex.open() is not None
+        SearchIndex.remove()
+        assert SearchIndex.open() is None
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture
+    def in_range(self):
+        return lambda *revs: output_of(
+            ["git", "rev-list", "--topo-order"] + list(revs)
+        ).split()
+
+    @staticmethod
+    def git_log_shas(*args):
+        return output_of(
+            ["git", "log", "--topo-order", "--format=%H"] + list(args)
+        ).split()
+
+    @staticmethod
+    def query(*args):
+        return SearchQuery.from_args(list(args))[0]
+
+
+class Describe_SearchQuery(object):
+    def it_parses_the_filters_from_a_git_log_command_line(self):
+        query, other_args = SearchQuery.from_args(
+            ["-3", "--grep", "Fix", "--author=jane", "-i", "master"]
+        )
+
+        assert other_args == ["-3", "master"]
+        assert query.match_expression == '({subject body}:"Fix") AND (author:"jane")'
+        assert query.matches("Jane <j@x>", "fix the thing", "")
+        assert not query.matches("Jane <j@x>", "add the thing", "")
+
+    @pytest.mark.parametrize(
+        "args",
+        (["master"], ["--grep=ab"], ["--grep=a.*b"], ["--author=^jane"]),
+    )
+    def it_leaves_to_git_what_the_index_cannot_answer(self, args):
+        assert SearchQuery.from_args(args) is None
+
+    def but_it_answers_a_fixed_string_with_regex_characters(self):
+        query, _ = SearchQuery.from_args(["-F", "--grep=a.*b"])
+        assert query.matches("", "match a.*b literally", "")
+        assert not query.matches("", "a then b", "")
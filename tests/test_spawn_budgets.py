@@ -0,0 +1,185 @@
+# encoding: utf-8
+
+"""Budgets on the processes each helper spawns and the bytes it reads from them.
+
+Each case runs against the small zipped test repo and against a generated repo with a
+couple of thousand commits and 150 branches. A budget is the same for both, so a change
+that makes a helper scale with the size of history or the number of branches fails
+here rather than in a large repository. When a change legitimately needs another
+process, raise the budget in the same commit, so the cost is visible in review.
+"""
+
+import sys
+
+import pytest
+
+from githelpers import gitlib
+from githelpers.gitlib import checkout, create_branch_at, full_hash_of, reset_hard_to
+from githelpers.runcmd import output_of
+from githelpers.scripts import drop, fix, lawg, next as next_, prev, restack
+from githelpers.scripts.install_hooks import main as install_hooks
+
+
+class DescribeGitlibBudgets(object):
+    def it_keeps_each_query_within_its_budget(self, gitlib_fixture, spawns):
+        query, max_spawns, max_bytes = gitlib_fixture
+        spawns.reset()
+        query()
+        spawns.assert_within(max_spawns, max_bytes)
+
+    def it_answers_from_the_index_without_reading_history(self, repo, spawns):
+        install_hooks(["githelpers install-hooks"])
+        create_branch_at("scratch", "HEAD~1")
+        checkout("scratch")
+        gitlib.branches_containing("HEAD")
+        spawns.reset()
+
+        gitlib.children_of_head()
+        gitlib.head_is_independent()
+
+        # -- `rev-parse` of HEAD by each, `for-each-ref --contains` per child to see
+        # -- it is live, and `for-each-ref` to see the index is current --
+        spawns.assert_within(5, 12000)
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture(
+        params=[
+            # -- `rev-parse` of the commit, `for-each-ref` --
+            ("branches_containing", ("HEAD~1",), 2, 1000),
+            # -- `rev-parse` of HEAD, `show-ref --heads`, and `show-branch
+            # -- --independent`, which reads a hash per branch --
+            ("head_is_independent", (), 3, 20000),
+            # -- `status` when there is no cached state --
+            ("is_clean", (), 1, 0),
+            # -- `rev-parse` of the commit, `for-each-ref` --
+            ("is_reachable", ("HEAD~1",), 2, 1000),
+        ]
+    )
+    def gitlib_fixture(self, request, repo):
+        name, args, max_spawns, max_bytes = request.param
+        query = getattr(gitlib, name)
+        return lambda: query(*args), max_spawns, max_bytes
+
+
+class DescribeScriptBudgets(object):
+    def it_keeps_each_script_within_its_budget(self, script_fixture, spawns):
+        script, max_spawns, max_bytes = script_fixture
+        spawns.reset()
+        assert script() in (None, 0)
+        spawns.assert_within(max_spawns, max_bytes)
+
+    def it_drops_a_shared_commit_in_one_pass(self, shared_fixture, spawns):
+        dropped, branches = shared_fixture
+        spawns.reset()
+
+        assert drop.main(["drop", "--all", dropped]) == 0
+
+        # -- two commits replayed, however many branches share them: 9 queries, with
+        # -- `worktree list` for branches checked out elsewhere, then `commit-tree`,
+        # -- `merge-tree` and `commit-tree` per commit, `update-ref` and `read-tree` --
+        spawns.assert_within(17, 20000)
+        assert gitlib.branches_containing("scratch~1") == branches
+        assert not gitlib.is_reachable(dropped)
+
+    def it_restacks_shared_branches_in_one_pass(self, shared_fixture, spawns):
+        amended, branches = shared_fixture
+        create_branch_at("fixed", amended)
+        checkout("fixed")
+        output_of(["git", "commit", "-q", "--amend", "-m", "amended"])
+        spawns.reset()
+
+        assert restack.main(["restack", amended]) == 0
+
+        # -- two commits replayed, however many branches share them: 9 queries, with
+        # -- `worktree list` for branches checked out elsewhere, then `commit-tree`,
+        # -- `merge-tree` and `commit-tree` per commit, and `update-ref` --
+        spawns.assert_within(16, 20000)
+        assert gitlib.branches_containing("HEAD") == sorted(branches + ["fixed"])
+        assert not gitlib.is_reachable(amended)
+
+    def it_keeps_the_index_current_when_dropping(self, shared_fixture, spawns):
+        install_hooks(["githelpers install-hooks"])
+        dropped, branches = shared_fixture
+
+        assert drop.main(["drop", "--all", dropped]) == 0
+
+        spawns.reset()
+        assert gitlib.branches_containing("scratch~1") == branches
+        assert not gitlib.is_reachable(dropped)
+        # -- answered from the index, the drop's ref updates having been journaled --
+        assert not any("--contains" in " ".join(cmd) for cmd in spawns.commands)
+
+    # fixtures -------------------------------------------------------
+
+    @pytest.fixture
+    def shared_fixture(self, repo, capsys):
+        for name in ("scratch", "scratch-2", "scratch-3"):
+            _commit_on_new_branch(name, repo)
+        checkout("scratch")
+        reset_hard_to("scratch-3")
+        branches = ["scratch", "scratch-2", "scratch-3"]
+        for i in range(20):
+            branches.append("shared-%02d" % i)
+            create_branch_at(branches[-1], "HEAD~%d" % (i % 2))
+        return full_hash_of("HEAD~2"), sorted(branches)
+
+    @pytest.fixture(
+        params=[
+            # -- 2 to resolve the commit and see it is reachable, `status`, `rev-parse
+            # -- --abbrev-ref HEAD`, 1 to find its branch, 1 for its parent, `rev-list`
+            # -- for merges, `rev-parse` and `log` to preflight, the `rebase`, and
+            # -- `rev-parse --abbrev-ref HEAD` again --
+            ("drop", 11, 1000),
+            # -- `status`, `rev-parse --verify`, `show-ref`, `branch` when there is no
+            # -- fixit yet, `rev-parse --abbrev-ref HEAD`, `checkout` and `reset` --
+            ("fix", 7, 1000),
+            # -- `rev-parse` for the git dirs, `config` for decoration, and `log` --
+            ("lawg", 3, 1000),
+            # -- `status`, `rev-list` of the commits on top of HEAD, and `reset`; the
+            # -- git and common dirs, and whether there are linked worktrees to look
+            # -- for fixit in, are read from the git directory --
+            ("next", 3, 1000),
+            # -- `status`, 3 to see HEAD is not a branch tip, `rev-parse` of HEAD and of
+            # -- its parents, and `reset`; the bytes are `show-branch --independent`'s
+            # -- hash per branch --
+            ("prev", 7, 20000),
+        ]
+    )
+    def script_fixture(self, request, repo, monkeypatch, capsys):
+        name, max_spawns, max_bytes = request.param
+        if name == "next":
+            _commit_on_new_branch("scratch", repo)
+            create_branch_at("scratch-tip", "HEAD")
+            reset_hard_to("HEAD~1")
+        elif name == "prev":
+            create_branch_at("scratch", "HEAD~1")
+            checkout("scratch")
+        parent = full_hash_of("HEAD~1")
+        monkeypatch.setattr(sys, "argv", ["git-lawg", "-20"])
+        scripts = {
+            "drop": lambda: drop.main(["drop", "HEAD"]),
+            "fix": lambda: fix.main(["fix", parent]),
+            "lawg": lawg.main,
+            "next": next_.main,
+            "prev": prev.main,
+        }
+        return scripts[name], max_spawns, max_bytes
+
+
+# fixtures ---------------------------------------------------------
+
+
+@pytest.fixture(params=["new_test_repo", "large_test_repo"])
+def repo(request):
+    """Each of the small zipped test repo and the generated large repo, in turn."""
+    return request.getfixturevalue(request.param)
+
+
+def _commit_on_new_branch(branch_name, repo_dir):
+    """Check out new branch `branch_name` at HEAD and commit a new file to it."""
+    create_branch_at(branch_name, "HEAD")
+    checkout(branch_name)
+    repo_dir.join("%s.txt" % branch_name).write("%s\n" % branch_name)
+    output_of(["git", "add", "%s.txt" % branch_name])
+    output_of(["git", "commit", "-q", "-m", "add %s.txt" % branch_name])